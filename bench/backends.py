@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+'''Compares the memory footprint and throughput of the semanticnet storage backends.
+
+Each backend (and, for the compact backend, each attribute store) is measured in
+a fresh interpreter so that peak RSS is not polluted by the previous run. Example:
+
+    ./bench/backends.py --nodes 100000 --edges 1000000
+'''
+
+import argparse
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+def rss_mb():
+    # ru_maxrss is reported in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+def run(backend, num_nodes, num_edges, seed):
+    import semanticnet as sn
+
+    rnd = random.Random(seed)
+    pairs = [(rnd.randrange(num_nodes), rnd.randrange(num_nodes)) for _ in xrange(num_edges)]
+    base = rss_mb()
+
+    result = {"backend": backend}
+    backend, _, attr_store = backend.partition("/")
+    g = sn.DiGraph(backend=backend, attr_store=attr_store or "dict")
+
+    start = time.time()
+    ids = [g.add_node({"type": "AS", "label": str(i)}) for i in xrange(num_nodes)]
+    for src, dst in pairs:
+        g.add_edge(ids[src], ids[dst], {"type": "peer"})
+    result["build_s"] = time.time() - start
+    result["rss_mb"] = rss_mb() - base
+
+    # the first read pays for building any lazily maintained index
+    start = time.time()
+    g.neighbors(ids[0])
+    result["first_read_s"] = time.time() - start
+
+    probes = [ids[rnd.randrange(num_nodes)] for _ in xrange(10000)]
+    start = time.time()
+    for id_ in probes:
+        g.neighbors(id_)
+        g.predecessors(id_)
+    result["neighbors_s"] = time.time() - start
+
+    start = time.time()
+    for src, dst in pairs[:10000]:
+        g.get_edges_between(ids[src], ids[dst])
+    result["edges_between_s"] = time.time() - start
+
+    return result
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser("backends")
+    parser.add_argument("-n", "--nodes", type=int, default=20000)
+    parser.add_argument("-e", "--edges", type=int, default=200000)
+    parser.add_argument("-s", "--seed", type=int, default=42)
+    parser.add_argument("--backend", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.backend:
+        print(json.dumps(run(args.backend, args.nodes, args.edges, args.seed)))
+        sys.exit(0)
+
+    print("{} nodes, {} edges".format(args.nodes, args.edges))
+    print("{:<17} {:>10} {:>10} {:>15} {:>14} {:>18}".format(
+        "backend", "build (s)", "RSS (MB)", "first read (s)", "neighbors (s)", "edges_between (s)"))
+    for backend in ["networkx", "compact", "compact/columnar"]:
+        out = subprocess.check_output([sys.executable, __file__,
+            "--backend", backend, "-n", str(args.nodes), "-e", str(args.edges), "-s", str(args.seed)])
+        r = json.loads(out)
+        print("{:<17} {:>10.2f} {:>10.1f} {:>15.3f} {:>14.3f} {:>18.3f}".format(
+            r["backend"], r["build_s"], r["rss_mb"], r["first_read_s"], r["neighbors_s"],
+            r["edges_between_s"]))
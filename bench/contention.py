@@ -0,0 +1,106 @@
+#!/usr/bin/env python
+'''Measures the lock contention of ConcurrentDiGraph: producer threads insert
+synthetic connection records while reader threads query the graph. Example:
+
+    ./bench/contention.py --records 20000 --readers 2
+
+Each producer inserts its share of the records either one add_edge() at a time
+("calls"), taking the write lock for every node and edge, or in batches of
+--batch records ("batches"), taking it once per commit. The single-threaded
+DiGraph line is the baseline without any locking.
+'''
+
+import argparse
+import os
+import random
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import semanticnet as sn
+
+def records(num_records, num_hosts, seed):
+    rnd = random.Random(seed)
+    return [("10.0.{}.{}".format(*divmod(rnd.randrange(num_hosts), 256)),
+             "10.0.{}.{}".format(*divmod(rnd.randrange(num_hosts), 256)),
+             rnd.choice(["http", "dns", "ssh"]))
+            for _ in xrange(num_records)]
+
+def ingest_calls(g, hosts, share):
+    for src, dst, proto in share:
+        g.add_edge(hosts[src], hosts[dst], {"type": proto})
+
+def ingest_batches(g, hosts, share, size):
+    for start in xrange(0, len(share), size):
+        with g.batch() as batch:
+            for src, dst, proto in share[start:start + size]:
+                batch.add_edge(hosts[src], hosts[dst], {"type": proto})
+
+def read(g, hosts, stop, counts):
+    ids = hosts.values()
+    rnd = random.Random(0)
+    n = 0
+    while not stop:
+        g.neighbors(rnd.choice(ids))
+        g.get_nodes_by_attr("label", rnd.choice(hosts.keys()))
+        n += 1
+    counts.append(n)
+
+def run(cls, mode, data, num_producers, num_readers, batch_size):
+    g = cls()
+    g.index_nodes_by("label")
+    hosts = {}
+    for src, dst, proto in data:
+        for host in (src, dst):
+            if host not in hosts:
+                hosts[host] = g.add_node({"label": host})
+
+    stop, counts = [], []
+    readers = [threading.Thread(target=read, args=(g, hosts, stop, counts)) for _ in xrange(num_readers)]
+    for reader in readers:
+        reader.start()
+
+    shares = [data[i::num_producers] for i in xrange(num_producers)]
+    if mode == "calls":
+        target = lambda share: ingest_calls(g, hosts, share)
+    else:
+        target = lambda share: ingest_batches(g, hosts, share, batch_size)
+    producers = [threading.Thread(target=target, args=(share,)) for share in shares]
+
+    start = time.time()
+    for producer in producers:
+        producer.start()
+    for producer in producers:
+        producer.join()
+    elapsed = time.time() - start
+
+    stop.append(True)
+    for reader in readers:
+        reader.join()
+    assert g.edge_count() == len(data)
+    return elapsed, sum(counts)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser("contention")
+    parser.add_argument("-r", "--records", type=int, default=20000)
+    parser.add_argument("--hosts", type=int, default=2000)
+    parser.add_argument("--readers", type=int, default=2)
+    parser.add_argument("--batch", type=int, default=500)
+    parser.add_argument("-s", "--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    data = records(args.records, args.hosts, args.seed)
+    print("{} records, {} hosts, {} reader threads".format(args.records, args.hosts, args.readers))
+    print("{:<20} {:>10} {:>12} {:>14} {:>12}".format(
+        "graph", "producers", "ingest (s)", "records/s", "reads"))
+
+    elapsed, _ = run(sn.DiGraph, "calls", data, 1, 0, args.batch)
+    print("{:<20} {:>10} {:>12.2f} {:>14.0f} {:>12}".format(
+        "DiGraph", 1, elapsed, len(data) / elapsed, "-"))
+    for mode in ["calls", "batches"]:
+        for num_producers in [1, 2, 4, 8]:
+            elapsed, reads = run(sn.ConcurrentDiGraph, mode, data, num_producers, args.readers, args.batch)
+            print("{:<20} {:>10} {:>12.2f} {:>14.0f} {:>12}".format(
+                "Concurrent/" + mode, num_producers, elapsed, len(data) / elapsed, reads))
@@ -0,0 +1,91 @@
+#!/usr/bin/env python
+'''Compares the throughput of the JSON serializers semanticnet can use, among those
+installed (see semanticnet.available_serializers()), and of its binary format.
+Example:
+
+    ./bench/serializers.py --repeat 20 examples/sample/cc-*.json
+
+For each serializer, the graphs are saved with save_json() and loaded back with
+load_json(), then their documents encoded with dumps() and decoded with loads()
+alone. Times are the best of --repeat runs, and rates in MB of JSON per second, over
+the size of the file each serializer writes: "json" indents it, the others don't.
+The last line is save_binary() and load_binary(), with the size of the binary file.
+'''
+
+import argparse
+import glob
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import semanticnet as sn
+
+SAMPLES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "examples", "sample", "cc-*.json")
+
+def best_of(repeat, fn):
+    times = []
+    for _ in xrange(repeat):
+        start = time.time()
+        fn()
+        times.append(time.time() - start)
+    return min(times)
+
+def run_binary(graphs, repeat):
+    result = {"mb": 0.0, "save_s": 0.0, "load_s": 0.0}
+    for g in graphs:
+        fd, path = tempfile.mkstemp(suffix=".bin")
+        os.close(fd)
+        try:
+            result["save_s"] += best_of(repeat, lambda: g.save_binary(path))
+            result["load_s"] += best_of(repeat, lambda: sn.DiGraph().load_binary(path))
+            result["mb"] += os.path.getsize(path) / (1024.0 * 1024.0)
+        finally:
+            os.remove(path)
+    return result
+
+def run(name, graphs, repeat):
+    serializer = sn.get_serializer(name)
+    result = {"serializer": name, "mb": 0.0, "save_s": 0.0, "load_s": 0.0, "dumps_s": 0.0, "loads_s": 0.0}
+    for g in graphs:
+        fd, path = tempfile.mkstemp(suffix=".json")
+        os.close(fd)
+        try:
+            result["save_s"] += best_of(repeat, lambda: g.save_json(path, serializer=serializer))
+            result["load_s"] += best_of(repeat, lambda: sn.DiGraph().load_json(path, serializer=serializer))
+            with open(path) as f:
+                text = f.read()
+        finally:
+            os.remove(path)
+        result["mb"] += len(text) / (1024.0 * 1024.0)
+        document = serializer.loads(text)
+        result["dumps_s"] += best_of(repeat, lambda: serializer.dumps(document))
+        result["loads_s"] += best_of(repeat, lambda: serializer.loads(text))
+    return result
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser("serializers")
+    parser.add_argument("files", nargs="*", help="graphs saved by save_json(), the cc samples by default")
+    parser.add_argument("-r", "--repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    files = args.files or sorted(glob.glob(SAMPLES))
+    graphs = []
+    for filename in files:
+        g = sn.DiGraph()
+        g.load_json(filename)
+        graphs.append(g)
+    print("{} graphs, {} nodes, {} edges".format(len(graphs),
+        sum(g.node_count() for g in graphs), sum(g.edge_count() for g in graphs)))
+    print("{:<11} {:>9} {:>13} {:>13} {:>12} {:>12}".format(
+        "serializer", "size (MB)", "save_json (s)", "load_json (s)", "dumps (MB/s)", "loads (MB/s)"))
+    for name in sn.available_serializers():
+        r = run(name, graphs, args.repeat)
+        print("{:<11} {:>9.2f} {:>13.3f} {:>13.3f} {:>12.1f} {:>12.1f}".format(
+            r["serializer"], r["mb"], r["save_s"], r["load_s"],
+            r["mb"] / r["dumps_s"], r["mb"] / r["loads_s"]))
+    r = run_binary(graphs, args.repeat)
+    print("{:<11} {:>9.2f} {:>13.3f} {:>13.3f} {:>12} {:>12}".format(
+        "binary", r["mb"], r["save_s"], r["load_s"], "-", "-"))
@@ -2,6 +2,7 @@
 
 import argparse
 import semanticnet as sn
+from itertools import chain
 
 def set_invisible(g):
     for nid in g.get_node_ids():
@@ -64,8 +65,14 @@ if __name__ == "__main__":
     g = sn.DiGraph(json_file=args.asn_graph) # the JSON graph
     set_invisible(g) # set the nodes/edges to invisible initially
 
-    for nid, attrs in sorted(g.get_nodes().iteritems(), key=lambda n: n[1]['registration']
-            if 'registration' in n[1] else n[1]['label']):
+    # ASNs in order of registration, then the ones without a registration date by label
+    g.index_nodes_by('registration', kind="sorted")
+    g.index_nodes_by('label', kind="sorted")
+    ordered = chain(g.get_nodes_by_range('registration'),
+        (attrs for attrs in g.get_nodes_by_range('label') if 'registration' not in attrs))
+
+    for node in ordered:
+        nid = node['id']
         timeline_set_node_visible(g, nid)
         if nid in queue:
             for eid in queue[nid]:
@@ -89,23 +89,7 @@ def get_node(graph, field, log_entry, label=""):
     return node['id']
 
 def connect(graph, src, dst, attrs):
-    edges = graph.get_edges_between(src, dst)
-
-    if len(edges) != 0:
-        combine_edge_id = None
-        for id_, edge_attrs in edges.items():
-            if all(item in edge_attrs.items() for item in attrs.items()):
-                combine_edge_id = id_
-                break
-        if combine_edge_id != None:
-            if "raindance:space:activity" in edges[combine_edge_id]:
-                edges[combine_edge_id]["raindance:space:activity"] += .005
-            else:
-                edges[combine_edge_id]["raindance:space:activity"] = .005
-        else:
-            graph.add_edge(src, dst, attrs)
-    else:
-        graph.add_edge(src, dst, attrs)
+    graph.upsert_edge(src, dst, match=attrs, accumulate={"raindance:space:activity": .005})
 
 
 if __name__ == "__main__":
@@ -133,7 +117,7 @@ if __name__ == "__main__":
 
     for ip, items in data.items():
         graph.clear_node_cache()
-        graph.cache_nodes_by("label", build=False)
+        graph.index_nodes_by("label", unique=True, build=False)
         for item in items:
             src_ip_node = get_node(graph, 'id.orig_h', item)
             user_agent_node = get_node(graph, 'user_agent', item)
@@ -1,24 +1,10 @@
 #!/usr/bin/env python
 
-import json
 import semanticnet as sn
 import argparse
 import sys
 import os
 
-def attr_to_id(j, attr):
-    node_ids_to_attrs = {}
-    for node in j['nodes']:
-        if attr in node:
-            node_ids_to_attrs[node['id']] = node[attr]
-            node['id'] = node[attr]
-        else:
-            raise "attribute {} not in node {}".format(attr, node)
-    for edge in j['edges']:
-        edge['src'] = node_ids_to_attrs[edge['src']]
-        edge['dst'] = node_ids_to_attrs[edge['dst']]
-        edge['id'] = edge['src'] + "|" + edge['dst']
-
 if __name__ == "__main__":
     parser = argparse.ArgumentParser("diff.py")
     parser.add_argument('-a', '--attr', type=str,
@@ -48,21 +34,16 @@ if __name__ == "__main__":
         args.outfile += ".json"
 
     if args.attr:
-        a_obj = json.load(open(args.old_graph, 'r'))
-        b_obj = json.load(open(args.new_graph, 'r'))
-        print("Converting old graph...")
-        attr_to_id(a_obj, args.attr)
-        print("Converting new graph...")
-        attr_to_id(b_obj, args.attr)
+        # derive node and edge IDs from the attribute, so that both graphs agree on them
+        generator = sn.ContentIdGenerator(node_attrs=[args.attr], edge_attrs=[])
     else:
-        a_obj = args.old_graph
-        b_obj = args.new_graph
+        generator = None
 
-    A = sn.Graph() if args.undirected else sn.DiGraph()
-    A.load_json(a_obj)
+    A = sn.Graph(id_generator=generator) if args.undirected else sn.DiGraph(id_generator=generator)
+    A.load_json(args.old_graph, rekey=bool(args.attr))
 
-    B = sn.Graph() if args.undirected else sn.DiGraph()
-    B.load_json(b_obj)
+    B = sn.Graph(id_generator=generator) if args.undirected else sn.DiGraph(id_generator=generator)
+    B.load_json(args.new_graph, rekey=bool(args.attr))
 
     print("Performing diff...")
     if args.context:
@@ -70,17 +51,19 @@ if __name__ == "__main__":
     print
 
     D = sn.diff(A, B, args.context, args.modifications)
-    print("Nodes added: {}".format(len([n for n, attrs in D.get_nodes().items() if attrs['diffstatus'] == 'added'])))
-    print("Nodes removed: {}".format(len([n for n, attrs in D.get_nodes().items() if attrs['diffstatus'] == 'removed'])))
+    D.index_nodes_by('diffstatus')
+    D.index_edges_by('diffstatus')
+    print("Nodes added: {}".format(D.find_nodes(diffstatus='added').count()))
+    print("Nodes removed: {}".format(D.find_nodes(diffstatus='removed').count()))
 
     if args.modifications:
-        print("Nodes modified: {}".format(len([n for n, attrs in D.get_nodes().items() if attrs['diffstatus'] == 'modified'])))
+        print("Nodes modified: {}".format(D.find_nodes(diffstatus='modified').count()))
 
-    print("Edges added: {}".format(len([e for e, attrs in D.get_edges().items() if attrs['diffstatus'] == 'added'])))
-    print("Edges removed: {}".format(len([e for e, attrs in D.get_edges().items() if attrs['diffstatus'] == 'removed'])))
+    print("Edges added: {}".format(D.find_edges(diffstatus='added').count()))
+    print("Edges removed: {}".format(D.find_edges(diffstatus='removed').count()))
 
     if args.modifications:
-        print("Edges modified: {}".format(len([e for e, attrs in D.get_edges().items() if attrs['diffstatus'] == 'modified'])))
+        print("Edges modified: {}".format(D.find_edges(diffstatus='modified').count()))
 
     print("Writing results to {}".format(args.outfile))
     D.save_json(args.outfile)
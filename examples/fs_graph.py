@@ -24,7 +24,7 @@ if __name__ == "__main__":
         sys.exit(-1)
 
     start = sys.argv[1]
-    graph = sn.Graph()
+    graph = sn.Graph(id_kind="str")
 
     for root, dirs, files in os.walk(start, followlinks=True):
         print(root)
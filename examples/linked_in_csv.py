@@ -13,15 +13,12 @@ class Contact(object):
         self.company = company
         # self.title = title
 
-def add_node(graph, attrs):
-    try:
-        node = graph.get_node(attrs["label"])
-    except KeyError:
-        return graph.add_node(attrs, attrs["label"])
+def add_node(batch, attrs):
+    if batch.has_node(attrs["label"]):
+        return attrs["label"]
+    return batch.add_node(attrs, attrs["label"])
 
-    return node["id"]
-
-def process_contact(graph, contact):
+def process_contact(batch, contact):
     nodes = []
     
     # add all nodes
@@ -29,17 +26,17 @@ def process_contact(graph, contact):
         if val == "":
             continue
         if key == "name":
-            name_node = add_node(graph, {"label": val, "type": key, "depth": 0})
+            name_node = add_node(batch, {"label": val, "type": key, "depth": 0})
         else:
-            nodes.append(add_node(graph, {"label": val, "type": key}))
+            nodes.append(add_node(batch, {"label": val, "type": key}))
 
     # connect this contact's name node to every other node for this contact
     for node in nodes:
-        graph.add_edge(name_node, node, id_="{}-{}".format(name_node, node))
+        batch.add_edge(name_node, node, id_="{}-{}".format(name_node, node))
 
 def process_csv_file(graph, filename, limit):
     processed = 0
-    with open(filename, 'rU') as f:
+    with open(filename, 'rU') as f, graph.batch() as batch:
         reader = csv.DictReader(f, dialect="excel")
         for row in reader:
             contact = Contact(
@@ -48,7 +45,7 @@ def process_csv_file(graph, filename, limit):
                 # row["Job Title"]
             )
 
-            process_contact(graph, contact)
+            process_contact(batch, contact)
 
             processed += 1
 
@@ -64,12 +61,12 @@ if __name__ == "__main__":
     parser.add_argument('contact_list_filename')
     args = parser.parse_args()
 
-    graph = sn.Graph()
+    graph = sn.Graph(id_kind="str")
 
     process_csv_file(graph, args.contact_list_filename, args.limit)
 
     if args.intersection:
-        ugraph = sn.Graph()
+        ugraph = sn.Graph(id_kind="str")
         process_csv_file(ugraph, args.intersection, args.limit)
 
         g1 = graph.networkx_graph()
@@ -84,7 +81,7 @@ if __name__ == "__main__":
             if gi.degree(id_) <= 0:
                 gi.remove_node(id_)
 
-        graph = sn.Graph()
+        graph = sn.Graph(id_kind="str")
         graph.load_networkx_graph(gi)
 
     path = os.path.dirname(os.path.abspath(args.contact_list_filename))
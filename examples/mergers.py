@@ -50,7 +50,7 @@ if __name__ == "__main__":
     global max_amt
     max_amt = 0
 
-    g = sn.DiGraph()
+    g = sn.DiGraph(id_kind="str")
     process_csv_file(g, args.csv_file)
     scale_deal_amts(g)
     g.save_json("mergers.json")
@@ -10,14 +10,7 @@ def get_node(data, field):
     if field not in data:
         return None
 
-    field_value = str(data[field])
-
-    node = graph.get_nodes_by_attr("label", field_value, nosingleton=True)
-
-    if not node:
-        return graph.add_node({"label": field_value, "type": field})
-
-    return node["id"]
+    return graph.upsert_node(str(data[field]), {"type": field})
 
 def connect(graph, src, dst):
     if src != None and dst != None:
@@ -46,7 +39,7 @@ if __name__ == "__main__":
         sys.exit(0)
 
     graph = sn.Graph()
-    graph.cache_nodes_by("label") # all labels will be unique
+    graph.set_node_key("label") # all labels will be unique
 
     for match in search_results['matches']:
         ip_node = get_node(match, 'ip_str')
@@ -56,17 +49,7 @@ if __name__ == "__main__":
 
         if 'location' in match and 'country_name' in match['location']:
             country_name = match['location']['country_name']
-            country_node = graph.get_nodes_by_attr("label", country_name, nosingleton=True)
-            if not country_node:
-                country_node = graph.add_node({"type": "country_name",
-                    "label": country_name,
-                    "depth": 0
-                })
-            else:
-                try:
-                    country_node = country_node["id"]
-                except KeyError:
-                    country_node = None
+            country_node = graph.upsert_node(country_name, {"type": "country_name", "depth": 0})
         else:
             country_node = None
 
@@ -6,13 +6,8 @@ import semanticnet as sn
 import sys
 
 def add_edge_ifn(graph, src, dst):
-    # get the edges between src and dst
-    edges = graph.get_edges_between(src, dst)
-    # if there are no edges, add one and return it
-    if not edges:
-        return graph.add_edge(src, dst)
-    # if there is, return the first edge's ID
-    return edges.items()[0][0]
+    # add an edge from src to dst, unless there already is one, and return its ID
+    return graph.upsert_edge(src, dst)
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser("ssv.py")
@@ -20,7 +15,7 @@ if __name__ == "__main__":
     parser.add_argument("output_filename", type=str)
     args = parser.parse_args()
 
-    g = sn.DiGraph()
+    g = sn.DiGraph(id_kind="str")
     with open(args.input_filename, "rU") as infile:
         reader = csv.reader(infile, delimiter=' ')
         for row in reader:
@@ -4,20 +4,16 @@ import json
 import os
 import semanticnet as sn
 
-def add_node(g, nid, attrs={}):
-    try:
-        return g.get_node(nid)['id']
-    except KeyError:
-        return g.add_node(attrs, id_=nid)
+def add_node(batch, nid, attrs={}):
+    if batch.has_node(nid):
+        return nid
+    return batch.add_node(attrs, id_=nid)
 
 def add_edge(g, src, dst, attrs={}):
-    edges = g.get_edges_between(src, dst)
-    if edges:
-        return edges.items()[0][0]
+    # link each pair of nodes once, whichever way round
+    g.upsert_edge(src, dst, data=attrs)
 
-    return g.add_edge(src, dst, attrs)
-
-def load_action(a, g):
+def load_action(a, batch):
     actions = []
     for action_type, data in a.iteritems():
         try:
@@ -26,61 +22,61 @@ def load_action(a, g):
             continue
         if variety != None:
             for v in variety:
-                actions.append(add_node(g, v, {'label': v, 'type': 'action'}))
+                actions.append(add_node(batch, v, {'label': v, 'type': 'action'}))
     return actions
 
-def load_asset(a, g):
+def load_asset(a, batch):
     assets = []
     for asset in a:
         variety = asset.get('variety')
         if variety != None:
-            assets.append(add_node(g, variety, {'label': variety, 'type': 'asset'}))
+            assets.append(add_node(batch, variety, {'label': variety, 'type': 'asset'}))
     return assets
 
 def connect_items(g, list1, list2, attrs={}):
     for item1 in list1:
         for item2 in list2:
             add_edge(g, item1, item2, attrs)
-    for item2 in list2:
-        for item1 in list1:
-            add_edge(g, item1, item2, attrs)
-
-if __name__ == "__main__":
-    parser = argparse.ArgumentParser("vcdb.py")
-    parser.add_argument("-i", "--input", type=str)
-    args = parser.parse_args()
-
-    vcdb_dir = os.environ['VCDB_DATA']
-    g = sn.Graph()
-    files = []
-    if args.input:
-        files.append(args.input)
-    else:
-        files = [ os.path.join(vcdb_dir, f) for f in os.listdir(vcdb_dir) if os.path.splitext(f)[1] == '.json' ]
 
-    for f in files:
-        j = json.load(open(f, 'rU'))
-        actions = load_action(j['action'], g)
+def load_file(g, f):
+    j = json.load(open(f, 'rU'))
+    # the nodes of each file go in one batch, committed even when we move on early
+    with g.batch() as batch:
+        actions = load_action(j['action'], batch)
         try:
-            assets = load_asset(j['asset']['assets'], g)
+            assets = load_asset(j['asset']['assets'], batch)
         except KeyError:
-            continue
+            return
         try:
             victim = add_node(
-                g,
+                batch,
                 j['victim']['victim_id'].encode('utf-8', 'ignore'),
                 {'label': j['victim']['victim_id'].encode('utf-8', 'ignore'), 'type': 'victim', 'depth': 0}
             )
         except KeyError:
             victim = None
 
-        connect_items(g, assets, actions)
+    connect_items(g, assets, actions)
 
-        if victim != None:
-            for asset in assets:
-                add_edge(g, victim, asset)
-            for action in actions:
-                add_edge(g, victim, action)
+    if victim != None:
+        for asset in assets:
+            add_edge(g, victim, asset)
+        for action in actions:
+            add_edge(g, victim, action)
 
-    g.save_json("vcdb.json")
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser("vcdb.py")
+    parser.add_argument("-i", "--input", type=str)
+    parser.add_argument("-w", "--workers", type=int, default=None, help="number of processes (default: one per CPU)")
+    args = parser.parse_args()
 
+    files = []
+    if args.input:
+        files.append(args.input)
+    else:
+        vcdb_dir = os.environ['VCDB_DATA']
+        files = [ os.path.join(vcdb_dir, f) for f in os.listdir(vcdb_dir) if os.path.splitext(f)[1] == '.json' ]
+
+    # nodes are named by their labels, so the files' graphs merge by node ID
+    g = sn.parallel_build(files, load_file, workers=args.workers, graph=sn.Graph(id_kind="str"), key=None)
+    g.save_json("vcdb.json")
@@ -1,19 +1,21 @@
 import networkx as nx
-from semanticnet import Graph
+from semanticnet import FrozenGraph, Graph, GraphException
+from views import AdjacencyView
 
 class DiGraph(Graph):
 
-    def __init__(self, verbose=False, json_file=""):
-        # don't pass in json_file so it doesn't call load_json() twice
-        super(DiGraph, self).__init__(verbose, "")
-        self._g = nx.MultiDiGraph()
-        if json_file:
-            self.load_json(json_file)
+    directed = True
+
+    def __init__(self, verbose=False, json_file="", backend="networkx", id_kind="auto",
+            id_generator=None, attr_store="dict"):
+        super(DiGraph, self).__init__(verbose, json_file, backend, id_kind, id_generator,
+            attr_store)
 
     def remove_node(self, id_):
         '''Removes node id_.'''
         id_ = self._extract_id(id_)
         if self._g.has_node(id_):
+            self._write()
             # for DiGraph, remove predecessors AND successors
             for successor in self._g.successors(id_):
                 # need to iterate over items() (which copies the dict) because we are
@@ -24,11 +26,34 @@ class DiGraph(Graph):
                 for edge in self._g.edge[predecessor][id_].items():
                     self.remove_edge(self._g.edge[predecessor][id_][edge[0]]["id"])
 
-            self._remove_node_from_cache(id_)
+            self._node_indexes.discard(id_)
             self._g.remove_node(id_)
         else:
             raise GraphException("Node ID not found.")
 
+    @property
+    def pred(self):
+        '''A live, read-only mapping of node ID -> view of its predecessors, like
+        Graph.adj.'''
+        return AdjacencyView(self, "pred")
+
     def predecessors(self, id_):
-        return dict([(nid, self.get_node(nid)) for nid in self._g.predecessors(id_)])
+        if self.backend != "networkx":
+            return self._nodes_by_handle(self._g.predecessor_handles(self._handle_of(id_)))
+        return dict(self.pred[id_].iteritems())
+
+    def freeze(self):
+        '''Same as Graph.freeze(), returning a FrozenDiGraph.'''
+        return self._freeze_as(FrozenDiGraph)
+
+    def predecessor_handles(self, handle):
+        '''Returns the handles of the predecessors of the node with the given handle.'''
+        self._require_handles()
+        self._node_id_of_handle(handle)
+        return self._g.predecessor_handles(handle)
 
+class FrozenDiGraph(FrozenGraph, DiGraph):
+    '''An immutable snapshot of a DiGraph, as returned by DiGraph.freeze(). See
+    FrozenGraph.'''
+    def copy(self):
+        return self._copy_as(DiGraph)
@@ -2,7 +2,19 @@ import networkx as nx
 import json
 import uuid
 import copy
-from itertools import chain
+from itertools import chain, islice, izip
+from collections import Mapping
+from backends import ATTR_STORES, BACKENDS
+from cow import CopyOnWrite
+from coalesce import COUNT, EdgeCoalescer, expanded_id
+from ids import ID_KINDS, ID_GENERATORS, IdGenerator, random_uuid4
+from interning import Interner, memory_report
+from binary import BinaryGraphReader, BinaryGraphWriter
+from jsonstream import JsonGraphReader, JsonGraphWriter
+from serializers import get_serializer
+from indexes import INDEX_KINDS, IndexSet, IndexView, index_name
+from query import Query
+from views import AdjacencyView, EdgeView, NodeView
 
 class GraphException(Exception):
     """Generic Semantic Graph Exception"""
@@ -23,32 +35,195 @@ class ReservedAttributeException(GraphException):
     def __str__(self):
         return repr(self.msg)
 
+class UniqueIndexException(GraphException):
+    '''An exception for when an item would share the key of a unique index with another.'''
+    def __init__(self, index_name, key):
+        self.index_name = index_name
+        self.key = key
+        msg = 'Another item already has {} = {}.'.format(self.index_name, self.key)
+        GraphException.__init__(self, msg)
+
+    def __str__(self):
+        return repr(self.msg)
+
+class FrozenGraphException(GraphException):
+    '''An exception for when the user attempts to change a FrozenGraph.'''
+    def __init__(self):
+        GraphException.__init__(self, 'Frozen graphs can not be changed, see Graph.copy().')
+
+    def __str__(self):
+        return repr(self.msg)
+
+def _project(attrs, names):
+    '''Returns the attributes of attrs named in names.'''
+    return dict((name, attrs[name]) for name in names if name in attrs)
+
+def _has_reserved(data, reserved):
+    '''Returns True if any of the reserved attribute names is a key of data.'''
+    for r in reserved:
+        if r in data:
+            return True
+    return False
+
 class Event(object):
     def __init__(self, timecode, name, attributes):
         self.timecode = timecode
         self.name = name
         self.attributes = attributes
 
-class CacheMeta(object):
-    def __init__(self, get_func, get_items_func, cache_func, cache):
-        self.get_func = get_func
-        self.get_items_func = get_items_func
-        self.cache_func = cache_func
-        self.cache = cache
+class Batch(object):
+    '''Buffers node and edge insertions for a graph, and applies them all at once
+    when committed. Obtained from Graph.batch(), normally as a context manager:
+
+        with g.batch() as batch:
+            a = batch.add_node({"type": "A"})
+            b = batch.add_node({"type": "B"})
+            batch.add_edge(a, b, {"type": "normal"})
+
+    IDs are assigned immediately, so edges may refer to nodes added earlier in the
+    same batch. Reserved attributes and edge endpoints are checked at commit, before
+    anything is written, so a batch which fails to commit leaves the graph untouched.
+    Attribute values are not copied.
+    '''
+    def __init__(self, graph):
+        self.graph = graph
+        self.discard()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.commit()
+        else:
+            self.discard()
+
+    def add_node(self, data={}, id_=None):
+        '''Same as Graph.add_node(), but deferred until the batch is committed.'''
+        if id_ == None:
+            id_ = self.graph._new_node_id(data)
+        else:
+            id_ = self.graph._given_id(id_)
+        self._nodes.append((id_, dict(data)))
+        self._node_ids.add(id_)
+        return id_
 
-class Graph(object):
-    '''A simple Graph structure which lets you focus on the data.'''
+    def add_edge(self, src, dst, data={}, id_=None):
+        '''Same as Graph.add_edge(), but deferred until the batch is committed.'''
+        src = self.graph._extract_id(src)
+        dst = self.graph._extract_id(dst)
+        if id_ == None:
+            id_ = self.graph._new_edge_id(src, dst, data)
+        else:
+            id_ = self.graph._given_id(id_)
+        self._edges.append((src, dst, dict(data), id_))
+        return id_
 
-    def __init__(self, verbose=False, json_file=""):
-        self._g = nx.MultiGraph()
-        self._edges = {}
+    def add_nodes(self, nodes):
+        '''Same as Graph.add_nodes(), but deferred until the batch is committed.'''
+        return self._add_nodes(nodes, dict)
 
-        self._node_cache = {}
-        self._edge_cache = {}
-        self._cache_meta = {
-            "node": CacheMeta(self.get_node, self.get_nodes, self._cache_node, self._node_cache),
-            "edge": CacheMeta(self.get_edge, self.get_edges, self._cache_edge, self._edge_cache)
-        }
+    def add_edges(self, edges):
+        '''Same as Graph.add_edges(), but deferred until the batch is committed.'''
+        self._add_edges(edges, dict)
+
+    def _add_nodes(self, nodes, copy_attrs):
+        if isinstance(nodes, Mapping):
+            for id_, data_orig in nodes.iteritems():
+                data = copy_attrs(data_orig)
+                data.pop('id', None)
+                self.add_node(data, id_)
+        else:
+            ids = []
+            for data_orig in nodes:
+                data = copy_attrs(data_orig)
+                ids.append(self.add_node(data, data.pop('id', None)))
+            return ids
+
+    def _add_edges(self, edges, copy_attrs):
+        if isinstance(edges, Mapping):
+            for id_, attrs_orig in edges.iteritems():
+                attrs = copy_attrs(attrs_orig)
+                src = attrs.pop('src', None)
+                dst = attrs.pop('dst', None)
+                attrs.pop('id', None)
+                self.add_edge(src, dst, attrs, id_)
+        else:
+            for tup in edges:
+                # make sure the tuple is of the correct form
+                if len(tup) != 3 and len(tup) != 4:
+                    raise GraphException('Given tuple {} is of the wrong form.'.format(tup))
+                data = copy_attrs(tup[2])
+                for r in self.graph.attr_reserved:
+                    data.pop(r, None)
+                self.add_edge(tup[0], tup[1], data, tup[3] if len(tup) == 4 else None)
+
+    def has_node(self, id_):
+        '''Returns True if node id_ is in the graph, or pending in this batch.'''
+        id_ = self.graph._extract_id(id_)
+        return id_ in self._node_ids or self.graph._g.has_node(id_)
+
+    def commit(self):
+        '''Applies every pending insertion to the graph, and empties the batch.'''
+        nodes, edges = self._nodes, self._edges
+        self.discard()
+        self.graph._commit_batch(nodes, edges)
+
+    def discard(self):
+        '''Drops every pending insertion.'''
+        self._nodes = []
+        self._node_ids = set()
+        self._edges = []
+
+class Graph(object):
+    '''A simple Graph structure which lets you focus on the data.
+
+    The optional backend parameter selects how the graph is stored. The default,
+    "networkx", keeps everything in a networkx MultiGraph. "compact" keeps the
+    topology in packed arrays indexed by dense integers, which needs far less
+    memory for graphs with millions of edges.
+
+    The optional id_kind parameter declares what the node and edge IDs are: "uuid",
+    "str" or "int". IDs given to any method are then converted directly to that
+    kind, instead of being probed for a UUID on every call. The default, "auto",
+    turns any string that parses as a UUID into a UUID, and leaves every other ID
+    alone. New IDs are generated to match the declared kind.
+
+    The optional id_generator parameter picks how new IDs are created when none is
+    given: "random" UUIDs (the default), a "counter" (the default for id_kind
+    "int"), time-ordered "ulid"s, or "content" hashes of the attributes. An
+    IdGenerator instance, such as a configured ContentIdGenerator, works too.
+
+    The optional attr_store parameter selects how the compact backend keeps node and
+    edge attributes: a "dict" per item (the default), or "columnar", with one typed
+    column per attribute name. Columnar attributes need several times less memory
+    when many items share the same attribute names, and get_node(), get_edge() and
+    friends return dict-like views onto the columns.
+    '''
+
+    directed = False
+
+    def __init__(self, verbose=False, json_file="", backend="networkx", id_kind="auto",
+            id_generator=None, attr_store="dict"):
+        try:
+            self._extract_id, self._export_id, self._generated_id = ID_KINDS[id_kind]
+        except KeyError:
+            raise GraphException("Unknown id_kind '{}'. Choose one of: {}".format(
+                id_kind, ", ".join(sorted(ID_KINDS))))
+        self.id_kind = id_kind
+        self._id_generator = self._new_id_generator(id_generator)
+
+        self.backend = backend
+        self.attr_store = attr_store
+        self._g = self._new_backend()
+        self._edges = self._new_edge_table()
+
+        self._node_indexes = IndexSet()
+        self._edge_indexes = IndexSet()
+        self._node_key = None
+        self._coalescer = None
+        self._interner = None
+        self._cow = None
         
         self.meta = {}
         self.timeline = []
@@ -59,106 +234,92 @@ class Graph(object):
         if json_file:
             self.load_json(json_file)
 
+    def _new_backend(self):
+        '''Instantiate an empty storage graph for self.backend.'''
+        try:
+            undirected_cls, directed_cls = BACKENDS[self.backend]
+        except KeyError:
+            raise GraphException("Unknown backend '{}'. Choose one of: {}".format(
+                self.backend, ", ".join(sorted(BACKENDS))))
+        if self.attr_store not in ATTR_STORES:
+            raise GraphException("Unknown attr_store '{}'. Choose one of: {}".format(
+                self.attr_store, ", ".join(ATTR_STORES)))
+        if self.backend == "networkx":
+            if self.attr_store != "dict":
+                raise GraphException("attr_store '{}' needs the compact backend.".format(self.attr_store))
+            return directed_cls() if self.directed else undirected_cls()
+        return directed_cls(self.attr_store) if self.directed else undirected_cls(self.attr_store)
+
+    def _new_edge_table(self):
+        '''Returns the edge ID -> attributes lookup for self._g. The compact backend
+        indexes edges by ID itself, so we only keep our own dict for networkx.'''
+        if self.backend == "networkx":
+            return {}
+        return self._g.edge_attrs
+
     def _create_uuid(self):
         '''Create a random UUID for a new node or edge. Checks for collisions.'''
-        id_ = uuid.uuid4()
+        id_ = random_uuid4()
         while self._g.has_node(id_) or id_ in self._edges:
-            id_ = uuid.uuid4()
+            id_ = random_uuid4()
         return id_
 
-    def _extract_id(self, id_):
-        '''Parse a UUID out of the string id_.'''
-        if id_.__class__.__name__ == 'UUID':
-            return id_
-
-        # convert to a UUID if possible
+    def _new_id_generator(self, id_generator):
+        if isinstance(id_generator, IdGenerator):
+            return id_generator
+        if id_generator is None:
+            id_generator = "counter" if self.id_kind == "int" else "random"
         try:
-            id_ = uuid.UUID(id_)
-        # if it's not a UUID, just return what was sent
-        except:
-            pass
-
-        return id_
-
-    def _cache_item(self, item_type, attr_name, attr_values):
-        # if we have not cached anything by this attr before,
-        # create an empty dict for it
-        if attr_name not in self._cache_meta[item_type].cache:
-            self._cache_meta[item_type].cache[attr] = {}
-
-        # if we haven't seen this attr value before, make an empty list for it
-        if attr_values[attr_name] not in self._cache_meta[item_type].cache[attr_name]:
-            self._cache_meta[item_type].cache[attr_name][attr_values[attr_name]] = []
-
-        # add it to the cache
-        self._cache_meta[item_type].cache[attr_name][attr_values[attr_name]].append(attr_values)
-
-    def _cache_node(self, attr, node):
-        '''Cache a node in self._node_cache'''
-        self._cache_item("node", attr, node)
-
-    def _cache_edge(self, attr, edge):
-        '''Cache an edge in self._edge_cache'''
-        self._cache_item("edge", attr, edge)
-
-    def _cache_new(self, item_type, attrs):
-        for key in self._cache_meta[item_type].cache:
-            if key in attrs:
-                self._cache_meta[item_type].cache_func(key, attrs)
-
-    def _cache_new_node(self, attrs):
-        '''Checks a new node's attributes and caches it if we are caching by one or more
-        of its attributes.'''
-        self._cache_new("node", attrs)
-
-    def _cache_new_edge(self, attrs):
-        '''Checks a new edge's attributes and caches it if we are caching by one or more
-        of its attributes.'''
-        self._cache_new("edge", attrs)
-
-    def _remove_item_from_cache(self, item_type, id_):
-        item = self._cache_meta[item_type].get_func(id_)
-        for attr, val in item.iteritems():
-            try:
-                self._cache_meta[item_type].cache[attr][val].remove(item)
-            except KeyError:
-                pass
-
-    def _remove_node_from_cache(self, id_):
-        '''Removes node id_ from all places it occurs in the cache, if anywhere.'''
-        self._remove_item_from_cache("node", id_)
-
-    def _remove_edge_from_cache(self, id_):
-        '''Removes edge id_ from all places it occurs in the cache, if anywhere.'''
-        self._remove_item_from_cache("edge", id_)
-
-    def _update_item_cache(self, item_type, id_, attr_name):
-        # if we are not caching by this attribute, there is nothing to do
-        if attr_name not in self._cache_meta[item_type].cache:
-            return
-
-        # remove any nodes that are in the wrong place in the cache
-        for key, nodes in self._cache_meta[item_type].cache[attr_name].items():
-            for node in nodes:
-                if key not in node:
-                    self._cache_meta[item_type].cache[attr_name][key].remove(node)
-                    break # should only happen once
+            return ID_GENERATORS[id_generator]()
+        except KeyError:
+            raise GraphException("Unknown id_generator '{}'. Choose one of: {}".format(
+                id_generator, ", ".join(sorted(ID_GENERATORS))))
 
-        self._cache_meta[item_type].cache_func(attr_name, self._cache_meta[item_type].get_func(id_))
+    def _new_node_id(self, data):
+        return self._generated_id(self._id_generator.node_id(self, data))
 
-    def _update_node_cache(self, id_, attr_name):
-        '''Update the cache for the given node with ID id_ and attribute attr_name
+    def _new_edge_id(self, src, dst, data):
+        return self._generated_id(self._id_generator.edge_id(self, src, dst, data))
 
-        IMPORTANT: Assumes that the attribute has already been set with the new value!
-        '''
-        self._update_item_cache("node", id_, attr_name)
+    def _given_id(self, id_):
+        id_ = self._extract_id(id_)
+        self._id_generator.seen(id_)
+        return id_
 
-    def _update_edge_cache(self, id_, attr_name):
-        '''Update the cache for the given edge with ID id_ and attribute attr_name
-
-        IMPORTANT: Assumes that the attribute has already been set with the new value!
-        '''
-        self._update_item_cache("edge", id_, attr_name)
+    @property
+    def _node_cache(self):
+        '''The node indexes, in the shape of the dicts of lists of attributes which the
+        attribute caches used to be.'''
+        return dict((name, IndexView(index, self._g.node.__getitem__))
+            for name, index in self._node_indexes.indexes.iteritems())
+
+    @property
+    def _edge_cache(self):
+        '''The edge indexes, in the same shape as _node_cache.'''
+        return dict((name, IndexView(index, self._edges.__getitem__))
+            for name, index in self._edge_indexes.indexes.iteritems())
+
+    def _check_unique(self, indexes, id_, attrs, attr_name=None):
+        '''Raises UniqueIndexException if item id_, with the attributes attrs, would
+        clash with another item in one of the unique indexes.'''
+        index = indexes.conflict(id_, attrs, attr_name)
+        if index is not None:
+            raise UniqueIndexException(index_name(index.attrs), index.key(attrs))
+
+    def _check_unique_attr(self, indexes, id_, attrs, attr_name, value):
+        if indexes.unique:
+            attrs = dict(attrs)
+            attrs[attr_name] = value
+            self._check_unique(indexes, id_, attrs, attr_name)
+
+    def _reindex(self):
+        '''Rebuilds every index from scratch, e.g. after the storage graph was replaced.'''
+        for indexes, items in [(self._node_indexes, self._g.node), (self._edge_indexes, self._edges)]:
+            for index in indexes.indexes.itervalues():
+                index.clear()
+                for id_, attrs in items.iteritems():
+                    index.add(id_, attrs)
+                index.complete = True
 
     def log(self, line):
         '''Print the message line to standard output.'''
@@ -185,14 +346,25 @@ class Graph(object):
         '''
         self._check_reserved_attrs(data)
         if id_ == None:
-            id_ = self._create_uuid()
+            id_ = self._new_node_id(data)
         else:
-            id_ = self._extract_id(id_)
+            id_ = self._given_id(id_)
 
         data['id'] = id_ # add the ID to the attributes
-        self.log("add_node " + str(data) + " = " + str(id_))
+        if self._interner is not None:
+            data = self._interner.attrs(data)
+        if self.verbose:
+            self.log("add_node " + str(data) + " = " + str(id_))
+        if self._node_indexes.unique:
+            # adding an existing node updates its attributes
+            attrs = dict(self._g.node[id_]) if self._g.has_node(id_) else {}
+            attrs.update(data)
+            self._check_unique(self._node_indexes, id_, attrs)
+        self._own_node(id_)
         self._g.add_node(id_, data)
-        self._cache_new_node(data)
+        if self._node_indexes:
+            # index what the backend stored, which may live outside of data
+            self._node_indexes.insert(id_, self._g.node[id_])
         return id_
 
     def add_nodes(self, nodes):
@@ -220,27 +392,16 @@ class Graph(object):
         where with this option, the unique IDs will be generated automatically,
         and it will return a list of the IDs in the respective order given.
         '''
-        if type(nodes) is dict:
-            for id_, data_orig in nodes.items():
-                # copy the attributes so they don't
-                # get deleted from the source data
-                data = copy.deepcopy(data_orig)
-                del data['id']
-                self.add_node(data, id_)
-        elif type(nodes) is list:
-            ids = []
-            for data_orig in nodes:
-                data = copy.deepcopy(data_orig)
-                id_ = data.get('id')
-                if id_ != None:
-                    del data['id']
-                ids.append(self.add_node(data, id_))
-            return ids
+        # copy the attributes so they don't
+        # get modified in the source data
+        with self.batch() as batch:
+            return batch._add_nodes(nodes, copy.deepcopy)
 
     def remove_node(self, id_):
         '''Removes node id_.'''
         id_ = self._extract_id(id_)
         if self._g.has_node(id_):
+            self._write()
             # remove all edges incident on this node
             for neighbor in self._g.neighbors(id_):
                 # need to iterate over items() (which copies the dict) because we are
@@ -248,7 +409,7 @@ class Graph(object):
                 for edge in self._g.edge[id_][neighbor].items():
                     # edge[0] is the edge's ID
                     self.remove_edge(self._g.edge[id_][neighbor][edge[0]]["id"])
-            self._remove_node_from_cache(id_)
+            self._node_indexes.discard(id_)
             self._g.remove_node(id_)
         else:
             raise GraphException("Node ID not found.")
@@ -270,28 +431,232 @@ class Graph(object):
         dst = self._extract_id(dst)
 
         if id_ == None:
-            id_ = self._create_uuid()
+            if self._coalescer is not None:
+                return self._coalesce_edge(src, dst, data)
+            id_ = self._new_edge_id(src, dst, data)
         else:
-            id_ = self._extract_id(id_)
+            id_ = self._given_id(id_)
+
+        if self.backend != "networkx":
+            # resolve both endpoints once, then stay on handles
+            src_handle = self._g.node_handle(src)
+            dst_handle = self._g.node_handle(dst)
+            if src_handle is None or dst_handle is None:
+                raise GraphException("Node ID not found.")
+            return self._add_edge_by_handle(src_handle, dst_handle, src, dst, data, id_)
 
         if self._g.has_node(src) and self._g.has_node(dst):
-            self.log("add_edge " + str(src) + ", " + str(dst) + ", " + str(data) + " = " + str(id_))
-            self._g.add_edge(src, dst, id_,
-                dict(chain(
-                    data.items(),
-                    {
-                        "id": id_,
-                        "src": src,
-                        "dst": dst
-                    }.items())
-                )
-            )
+            if self.verbose:
+                self.log("add_edge " + str(src) + ", " + str(dst) + ", " + str(data) + " = " + str(id_))
+            attrs = self._interner.attrs(data) if self._interner is not None else dict(data)
+            attrs["id"] = id_
+            attrs["src"] = src
+            attrs["dst"] = dst
+            if self._edge_indexes.unique:
+                self._check_unique(self._edge_indexes, id_, attrs)
+            self._own_edge(src, dst, id_)
+            self._g.add_edge(src, dst, id_, attrs)
             self._edges[id_] = self._g.edge[src][dst][id_]
-            self._cache_new_edge(self._edges[id_])
+            if self._edge_indexes:
+                self._edge_indexes.insert(id_, self._edges[id_])
             return id_
         else:
             raise GraphException("Node ID not found.")
 
+    def upsert_edge(self, src, dst, match={}, accumulate={}, data={}):
+        '''Finds an edge from src to dst (either way round for an undirected Graph) whose
+        attributes include all of match, or adds one if there is none. Returns its ID.
+
+        For every attribute name in accumulate, an existing edge has the given amount added
+        to its value (or to 0, if it has none yet), while a new edge starts with the amount
+        itself. A new edge also gets the attributes in data and in match. For instance,
+        this adds an edge of type "http" once, then increases its activity on every call:
+
+            g.upsert_edge(src, dst, match={"type": "http"}, accumulate={"activity": 0.005})
+
+        Edges are found with an index over src, dst and the attributes of match, which is
+        created the first time a set of attributes is matched on, so that each further call
+        costs the same whatever the number of edges between src and dst.
+        '''
+        src = self._extract_id(src)
+        dst = self._extract_id(dst)
+        names = sorted(match)
+        id_ = self._find_parallel_edge(tuple(["src", "dst"] + names),
+            (src, dst) + tuple(match[name] for name in names))
+        if id_ is not None:
+            edge = self._edges[id_]
+            for name, amount in accumulate.iteritems():
+                self.set_edge_attribute(id_, name, edge.get(name, 0) + amount)
+            return id_
+
+        attrs = dict(data)
+        attrs.update(match)
+        attrs.update(accumulate)
+        return self.add_edge(src, dst, attrs)
+
+    def _find_parallel_edge(self, attrs, key):
+        '''Returns the ID of an edge whose values for the attributes attrs, which start
+        with src and dst, are key (either way round for an undirected Graph), or None.
+        The index over attrs is created if needed.'''
+        index = self._edge_indexes.get(attrs)
+        if index is None or not index.complete:
+            self.index_edges_by(attrs)
+            index = self._edge_indexes.get(attrs)
+
+        id_ = index.get(key)
+        if id_ is None and not self.directed:
+            id_ = index.get((key[1], key[0]) + key[2:])
+        return id_
+
+    def coalesce_edges(self, identity=(), aggregate=()):
+        '''Switches the graph to coalescing mode, where parallel edges are stored as one.
+
+        From then on, add_edge() (without an ID), add_edges() and batches merge an edge
+        into an existing edge between the same nodes (either way round for an undirected
+        Graph) with the same values for every attribute in identity. The stored edge
+        keeps the attributes of the first edge, and counts the merged edges in its
+        "count" attribute. Every attribute in aggregate, which must be numeric, holds the
+        sum of the values of the merged edges, and attr:min and attr:max hold their
+        smallest and largest value. Edges to merge may not hold "count" or these
+        attributes themselves: they raise a ReservedAttributeException. For instance, this stores a single edge per type of
+        connection between two hosts, with the total number of bytes sent:
+
+            g.coalesce_edges(identity=["type"], aggregate=["bytes"])
+
+        Edges already in the graph are merged the same way. Edges lacking an identity
+        attribute are never merged, and edges added with an explicit ID are stored as
+        given. Parallel edges are found with an index over src, dst and the identity
+        attributes. Passing identity=None switches coalescing off; stored edges stay
+        merged. save_json(expand=True) writes the merged edges back out one by one.
+        '''
+        if identity is None:
+            self._coalescer = None
+            return
+        for attr in tuple(identity) + tuple(aggregate):
+            self._check_reserved_attrs(attr)
+        coalescer = EdgeCoalescer(identity, aggregate)
+        for attr in tuple(identity) + tuple(aggregate):
+            if attr in coalescer.reserved:
+                raise ReservedAttributeException(attr)
+        self.index_edges_by(coalescer.index_attrs)
+        self._coalescer = coalescer
+
+        # merge the edges added so far into the first of their parallel edges
+        index = self._edge_indexes.get(coalescer.index_attrs)
+        kept = set()
+        for id_ in list(self._edges):
+            edge = self._edges[id_]
+            key = coalescer.key(edge["src"], edge["dst"], edge)
+            parallel = [] if key is None else index.ids(key)
+            if key is not None and not self.directed:
+                parallel += index.ids((key[1], key[0]) + key[2:])
+            target = next((other for other in parallel if other in kept), None)
+            if target is None:
+                kept.add(id_)
+                if COUNT not in edge:
+                    for name, value in coalescer.start(edge).iteritems():
+                        if name not in edge:
+                            self.set_edge_attribute(id_, name, value)
+            else:
+                attrs = dict(edge)
+                self.remove_edge(id_)
+                self._merge_edge(target, attrs)
+
+    def _check_coalesced_attrs(self, data):
+        '''Raises a ReservedAttributeException if the attributes data of an edge to
+        coalesce hold one which the coalesced edge keeps for itself, such as "count".'''
+        for name in self._coalescer.reserved:
+            if name in data:
+                raise ReservedAttributeException(name)
+
+    def _merge_edge(self, id_, data):
+        for name, value in self._coalescer.merge(self._edges[id_], data).iteritems():
+            self.set_edge_attribute(id_, name, value)
+
+    def _coalesce_edge(self, src, dst, data, id_=None):
+        '''Merges the edge from src to dst with the attributes data into a parallel
+        edge, or adds it (with the ID id_, if given) if there is none. Returns the ID of
+        the stored edge.'''
+        coalescer = self._coalescer
+        self._check_coalesced_attrs(data)
+        key = coalescer.key(src, dst, data)
+        target = None
+        if key is not None:
+            target = self._find_parallel_edge(coalescer.index_attrs, key)
+        if target is not None:
+            self._merge_edge(target, data)
+            return target
+        attrs = coalescer.start(data)
+        if id_ is None:
+            id_ = self._new_edge_id(src, dst, attrs)
+        return self.add_edge(src, dst, attrs, id_)
+
+    def _add_edge_by_handle(self, src_handle, dst_handle, src, dst, data, id_):
+        if self.verbose:
+            self.log("add_edge " + str(src) + ", " + str(dst) + ", " + str(data) + " = " + str(id_))
+        attrs = self._interner.attrs(data) if self._interner is not None else dict(data)
+        attrs["id"] = id_
+        attrs["src"] = src
+        attrs["dst"] = dst
+        if self._edge_indexes.unique:
+            self._check_unique(self._edge_indexes, id_, attrs)
+        self._write()
+        self._g.add_edge_by_handle(src_handle, dst_handle, id_, attrs)
+        if self._edge_indexes:
+            self._edge_indexes.insert(id_, self._edges[id_])
+        return id_
+
+    def _require_handles(self):
+        if self.backend == "networkx":
+            raise GraphException("Node handles are only available with the compact backend.")
+
+    def _handle_of(self, id_):
+        handle = self._g.node_handle(self._extract_id(id_))
+        if handle is None:
+            raise GraphException("Node ID not found.")
+        return handle
+
+    def _node_id_of_handle(self, handle):
+        try:
+            return self._g.node_attrs(handle)["id"]
+        except KeyError:
+            raise GraphException("Node handle {} not found.".format(handle))
+
+    def get_node_handle(self, id_):
+        '''Returns the handle of node id_: a small integer which identifies the node
+        for as long as it is in the graph. Handles are only available with the compact
+        backend.
+
+        Bulk loaders can look handles up once and then use the *_by_handle methods,
+        which skip ID parsing and hashing entirely.
+        '''
+        self._require_handles()
+        return self._handle_of(id_)
+
+    def get_node_id(self, handle):
+        '''Returns the ID of the node with the given handle.'''
+        self._require_handles()
+        return self._node_id_of_handle(handle)
+
+    def add_edge_by_handle(self, src, dst, data={}, id_=None):
+        '''Same as add_edge(), except that src and dst are node handles, as returned
+        by get_node_handle(). Returns the ID of the new edge.'''
+        self._require_handles()
+        self._check_reserved_attrs(data)
+        src_id = self._node_id_of_handle(src)
+        dst_id = self._node_id_of_handle(dst)
+        if id_ == None:
+            id_ = self._new_edge_id(src_id, dst_id, data)
+        else:
+            id_ = self._given_id(id_)
+        return self._add_edge_by_handle(src, dst, src_id, dst_id, data, id_)
+
+    def neighbor_handles(self, handle):
+        '''Returns the handles of the neighbors of the node with the given handle.'''
+        self._require_handles()
+        self._node_id_of_handle(handle)
+        return self._g.neighbor_handles(handle)
+
     def add_edges(self, edges):
         '''Adds the edges in the parameter edges, where edges is EITHER:
 
@@ -314,54 +679,114 @@ class Graph(object):
         WARNING: If either 'src' or 'dst' is missing from an edge's attributes,
         it will be silently ignored!
         '''
-        if type(edges) is list:
-            def _remove_reserved(tup, key):
-                if key in tup[2]:
-                    del tup[2][key]
+        # copy the attributes, in case they contain references
+        # to data the user doesn't want modified
+        with self.batch() as batch:
+            batch._add_edges(edges, copy.deepcopy)
+
+    def batch(self):
+        '''Returns a Batch, which buffers insertions into this graph and applies them
+        all at once when committed. See Batch for details.'''
+        return Batch(self)
+
+    def bulk_load(self, nodes=[], edges=[]):
+        '''Adds nodes and edges, given in any of the forms accepted by add_nodes() and
+        add_edges(), in a single batch. Unlike those methods, attribute values are not
+        copied. Returns the IDs of the nodes when they are given as a list.
+        '''
+        with self.batch() as batch:
+            ids = batch.add_nodes(nodes)
+            batch.add_edges(edges)
+        return ids
+
+    def _commit_batch(self, nodes, edges):
+        if self._coalescer is not None and edges:
+            # edges may merge into each other, so they are added one by one once the
+            # nodes are in, after checking them all
+            for src, dst, data, id_ in edges:
+                self._check_reserved_attrs(data)
+                self._check_coalesced_attrs(data)
+            self._commit_batch(nodes, [])
+            for src, dst, data, id_ in edges:
+                self._coalesce_edge(src, dst, data, id_)
+            return
 
-            for tup in edges:
-                # make sure the tuple is of the correct form
-                if len(tup) != 3 and len(tup) != 4:
-                    raise GraphException('Given tuple {} is of the wrong form.'.format(tup))
+        # validate everything before writing anything
+        reserved = self.attr_reserved
+        new_ids = set()
+        for id_, data in nodes:
+            if _has_reserved(data, reserved):
+                self._check_reserved_attrs(data)
+            data['id'] = id_
+            new_ids.add(id_)
+        has_node = self._g.has_node
+        for src, dst, data, id_ in edges:
+            if _has_reserved(data, reserved):
+                self._check_reserved_attrs(data)
+            if not ((src in new_ids or has_node(src)) and (dst in new_ids or has_node(dst))):
+                raise GraphException("Node ID not found.")
+            data["id"] = id_
+            data["src"] = src
+            data["dst"] = dst
+        if self._node_indexes.unique:
+            self._check_batch_unique(self._node_indexes, nodes)
+        if self._edge_indexes.unique:
+            self._check_batch_unique(self._edge_indexes, [(id_, data) for src, dst, data, id_ in edges])
+
+        if self.verbose:
+            self.log("batch of {} nodes, {} edges".format(len(nodes), len(edges)))
+
+        self._write()
+        cow = self._cow
+        if cow is not None:
+            for id_, data in nodes:
+                cow.node(self._g, id_)
+            for src, dst, data, id_ in edges:
+                cow.edge(self._g, self._edges, src, dst, id_)
+
+        if self._interner is not None:
+            intern = self._interner.attrs
+            nodes = [(id_, intern(data)) for id_, data in nodes]
+            edges = [(src, dst, intern(data), id_) for src, dst, data, id_ in edges]
+
+        add_node = self._g.add_node
+        for id_, data in nodes:
+            add_node(id_, data)
+
+        if self.backend == "networkx":
+            add_edge = self._g.add_edge
+            for src, dst, data, id_ in edges:
+                add_edge(src, dst, id_, data)
+                self._edges[id_] = self._g.edge[src][dst][id_]
+        else:
+            node_handle = self._g.node_handle
+            self._g.add_edges_by_handle(
+                (node_handle(src), node_handle(dst), id_, data) for src, dst, data, id_ in edges
+            )
 
-                # make a deep copy, in case the tuple contains references
-                # to data the user doesn't want modified
-                tup = copy.deepcopy(tup)
-
-                # remove reserved attributes from data
-                for r in self.attr_reserved:
-                    _remove_reserved(tup, r)
-
-                self.add_edge(*tup)
-        elif type(edges) is dict:
-            for id_, orig_attrs in edges.items():
-                # copy the attributes so we don't remove the reserved
-                # attributes from the edges!
-                attrs = copy.deepcopy(orig_attrs)
-                try:
-                    # extract and remove the reserved attributes
-                    src = attrs.get('src')
-                    dst = attrs.get('dst')
-                    attr_id = attrs.get('id')
-                    if src != None:
-                        del attrs['src']
-                    if dst != None:
-                        del attrs['dst']
-                    if attr_id != None:
-                        del attrs['id']
-
-                    self.add_edge(src, dst, attrs, id_)
-                except KeyError:
-                    continue
+        # update the indexes in one pass over the new items
+        if self._node_indexes:
+            for id_, data in nodes:
+                self._node_indexes.insert(id_, self._g.node[id_])
+        if self._edge_indexes:
+            for src, dst, data, id_ in edges:
+                self._edge_indexes.insert(id_, self._edges[id_])
+
+    def _check_batch_unique(self, indexes, items):
+        index, key = indexes.batch_conflict(items)
+        if index is not None:
+            raise UniqueIndexException(index_name(index.attrs), key)
 
     def remove_edge(self, id_):
         '''Removes edge id_.'''
         id_ = self._extract_id(id_)
         if id_ in self._edges:
             edge = self._edges[id_]
+            self._own_bundle(edge["src"], edge["dst"])
+            self._edge_indexes.discard(id_)
             self._g.remove_edge(edge["src"], edge["dst"], id_)
-            self._remove_edge_from_cache(id_)
-            del self._edges[id_]
+            if self.backend == "networkx":
+                del self._edges[id_]
         else:
             raise GraphException("Node ID not found.")
 
@@ -369,6 +794,7 @@ class Graph(object):
         map(self.remove_edge, ids)
 
     def set_graph_attribute(self, attr_name, value):
+        self._write()
         self._g.graph[attr_name] = value
 
     def get_graph_attribute(self, attr_name):
@@ -380,18 +806,68 @@ class Graph(object):
 
         if self._g.has_node(id_):
             self._check_reserved_attrs(attr_name)
-            self._g.node[id_][attr_name] = value
-            self._update_node_cache(id_, attr_name)
+            self._own_node(id_)
+            attrs = self._g.node[id_]
+            if self._interner is not None:
+                attr_name, value = self._intern_attr(attr_name, value)
+            self._check_unique_attr(self._node_indexes, id_, attrs, attr_name, value)
+            attrs[attr_name] = value
+            self._node_indexes.update(id_, attr_name, attrs)
         else:
             raise GraphException("Node id not found, can't set attribute.")
 
+    @property
+    def nodes(self):
+        '''A live, read-only view of the nodes: a mapping of node ID -> attributes, and a
+        set of node IDs. It copies nothing, and follows every change to the graph.'''
+        return NodeView(self)
+
+    @property
+    def edges(self):
+        '''A live, read-only view of the edges, like Graph.nodes.'''
+        return EdgeView(self)
+
+    @property
+    def adj(self):
+        '''A live, read-only mapping of node ID -> view of its neighbors (its successors
+        for a DiGraph), each a mapping of neighbor ID -> attributes like Graph.nodes.'''
+        return AdjacencyView(self, "adj")
+
+    def iter_nodes(self, data=False):
+        '''Iterates over the node IDs, or over (ID, attributes) pairs if data is True,
+        without copying anything. The graph must not change during the iteration.'''
+        if data:
+            return self._g.node.iteritems()
+        return iter(self._g.node)
+
+    def iter_edges(self, data=False):
+        '''Same as iter_nodes(), for edges.'''
+        if data:
+            return self._edges.iteritems()
+        return iter(self._edges)
+
+    def node_count(self):
+        return len(self._g.node)
+
+    def edge_count(self):
+        return len(self._edges)
+
     def get_nodes(self):
-        '''Returns a dict of all nodes in the graph, keyed by their unique ID.'''
-        return dict([ (id_, self._g.node[id_]) for id_ in self._g.nodes() ])
+        '''Returns a dict of all nodes in the graph, keyed by their unique ID. The dict is
+        a copy: see Graph.nodes for a view which is not.'''
+        return dict(self.iter_nodes(data=True))
+
+    def get_node_attribute_values(self, attr_name):
+        '''Returns a dict mapping the ID of every node with the attribute attr_name to
+        its value. With attr_store="columnar", only that attribute's column is read.'''
+        if self.backend != "networkx":
+            return dict(self._g.node_attr_values(attr_name))
+        return dict((id_, attrs[attr_name]) for id_, attrs in self._g.node.iteritems()
+            if attr_name in attrs)
 
     def get_node_ids(self):
         '''Returns a list of the IDs of all nodes in the graph.'''
-        return self._g.nodes()
+        return list(self.iter_nodes())
 
     def get_node(self, id_):
         '''Get the node with the given ID.'''
@@ -410,6 +886,120 @@ class Graph(object):
         self.add_node(data, id_=id_)
         return self.get_node(id_) # return the attributes, instead of the ID
 
+    def intern_attributes(self, values=()):
+        '''Makes the nodes and edges added from now on share their attribute names, and
+        the string values of the attributes in values, with the other nodes and edges.
+
+        Attribute names, and values such as a type or a country code, are few but
+        repeated on every node or edge; load_json() in particular creates a new string
+        for each of them. Interning keeps one string per distinct name or value instead,
+        at the cost of a lookup per attribute when adding or setting it. Values of
+        attributes with many distinct values, such as labels, are best left out. Calling
+        this again adds attributes to values; passing None switches interning off.
+        See memory_report() for what it saves.
+        '''
+        if values is None:
+            self._interner = None
+            return
+        if self._interner is None:
+            self._interner = Interner()
+        self._interner.values.update(values)
+
+    def _intern_attr(self, attr_name, value):
+        interner = self._interner
+        attr_name = interner.intern(attr_name)
+        if attr_name in interner.values:
+            value = interner.intern(value)
+        return attr_name, value
+
+    def memory_report(self):
+        '''Returns a dict of attribute name -> number of bytes saved by sharing the
+        name, and its string values, between nodes and edges, rather than keeping a
+        string per node or edge. See intern_attributes().'''
+        return memory_report(chain(self._g.node.itervalues(), self._edges.itervalues()),
+            skip=self.attr_reserved)
+
+    def set_node_key(self, attr):
+        '''Declares attr as the natural key of the nodes, such as "label": no two nodes may
+        then share a value of attr, and upsert_node() finds nodes by it. A unique index over
+        attr is created for this, see index_nodes_by(); if two nodes already share a value,
+        a UniqueIndexException is raised and the key is left as it was. Passing None
+        forgets the key, but keeps the index.
+        '''
+        if attr is not None:
+            self.index_nodes_by(attr, unique=True)
+        self._node_key = attr
+
+    def _node_key_index(self):
+        if self._node_key is None:
+            raise GraphException("Nodes have no key, see set_node_key().")
+        index = self._node_indexes.get(self._node_key)
+        if index is None or not index.unique or not index.complete:
+            # the index was cleared or replaced since the key was declared
+            self.index_nodes_by(self._node_key, unique=True)
+            index = self._node_indexes.get(self._node_key)
+        return index
+
+    def get_node_by_key(self, key_value):
+        '''Returns the node whose key (see set_node_key()) is key_value.'''
+        id_ = self._node_key_index().get(key_value)
+        if id_ is None:
+            raise GraphException("No node with {} = {}.".format(self._node_key, key_value))
+        return self._g.node[id_]
+
+    def upsert_node(self, key_value, attrs={}, id_=None, update=False):
+        '''Returns the ID of the node whose key (see set_node_key()) is key_value, adding it
+        with the attributes attrs (and the ID id_, if given) if there is none. If update is
+        True, an existing node is given the attributes attrs as well.
+
+        This replaces looking the node up with get_nodes_by_attr(), and adding it if it is
+        missing, with a single lookup in the key's index.
+        '''
+        found = self._node_key_index().get(key_value)
+        if found is None:
+            data = dict(attrs)
+            data[self._node_key] = key_value
+            return self.add_node(data, id_)
+        if update:
+            for attr_name, value in attrs.iteritems():
+                self.set_node_attribute(found, attr_name, value)
+        return found
+
+    def upsert_nodes(self, nodes, update=False):
+        '''Same as upsert_node() for many nodes at once, given as a dict of key value ->
+        attributes, or as a list of (key value, attributes) pairs. The new nodes are added
+        in a single batch, see batch(). Returns a dict of key value -> node ID.
+        '''
+        self._write() # so that index stays ours
+        index = self._node_key_index()
+        if isinstance(nodes, Mapping):
+            nodes = nodes.iteritems()
+
+        ids = {}
+        pending = [] # (key value, attributes) of the nodes to add, in order
+        pending_attrs = {}
+        for key_value, attrs in nodes:
+            if key_value in pending_attrs:
+                if update:
+                    pending_attrs[key_value].update(attrs)
+                continue
+            found = index.get(key_value)
+            if found is None:
+                data = dict(attrs)
+                data[self._node_key] = key_value
+                pending.append((key_value, data))
+                pending_attrs[key_value] = data
+            else:
+                if update:
+                    for attr_name, value in attrs.iteritems():
+                        self.set_node_attribute(found, attr_name, value)
+                ids[key_value] = found
+
+        with self.batch() as batch:
+            for key_value, data in pending:
+                ids[key_value] = batch.add_node(data)
+        return ids
+
     def has_node(self, id_):
         id_ = self._extract_id(id_)
         return self._g.has_node(id_)
@@ -434,8 +1024,16 @@ class Graph(object):
         '''Returns all edges in the graph.'''
         return self._edges
 
+    def get_edge_attribute_values(self, attr_name):
+        '''Returns a dict mapping the ID of every edge with the attribute attr_name to
+        its value. With attr_store="columnar", only that attribute's column is read.'''
+        if self.backend != "networkx":
+            return dict(self._g.edge_attr_values(attr_name))
+        return dict((id_, attrs[attr_name]) for id_, attrs in self._edges.iteritems()
+            if attr_name in attrs)
+
     def get_edge_ids(self):
-        return [ id_ for id_ in self._edges ]
+        return list(self.iter_edges())
 
     def get_edge(self, id_):
         '''Returns edge id_.'''
@@ -450,6 +1048,17 @@ class Graph(object):
         src = self._extract_id(src)
         dst = self._extract_id(dst)
         edges_src_dst = {}
+
+        if self.backend != "networkx":
+            src_handle = self._g.node_handle(src)
+            dst_handle = self._g.node_handle(dst)
+            if src_handle is not None and dst_handle is not None:
+                edges = self._g.edge_attrs_between(src_handle, dst_handle)
+                if self.directed:
+                    edges += self._g.edge_attrs_between(dst_handle, src_handle)
+                edges_src_dst = dict((attrs["id"], attrs) for attrs in edges)
+            return edges_src_dst
+
         if self._g.has_node(src) and self._g.has_node(dst):
             if self._g.has_edge(src, dst):
                 edges_src_dst = dict(edges_src_dst.items() + self._g.edge[src][dst].items())
@@ -474,8 +1083,15 @@ class Graph(object):
         id_ = self._extract_id(id_)
         if id_ in self._edges:
             self._check_reserved_attrs(attr_name)
-            self._edges[id_][attr_name] = value
-            self._update_edge_cache(id_, attr_name)
+            attrs = self._edges[id_]
+            if self._cow is not None:
+                self._own_edge(attrs["src"], attrs["dst"], id_)
+                attrs = self._edges[id_]
+            if self._interner is not None:
+                attr_name, value = self._intern_attr(attr_name, value)
+            self._check_unique_attr(self._edge_indexes, id_, attrs, attr_name, value)
+            attrs[attr_name] = value
+            self._edge_indexes.update(id_, attr_name, attrs)
         else:
             raise GraphException("Edge id '" + str(id_) + "' not found!")
 
@@ -501,24 +1117,58 @@ class Graph(object):
     def add_event(self, timecode, name, attributes):
         self.timeline.append(Event(timecode, name, attributes))
 
-    def _cache_by(self, item_type, attr, build):
-        # If we ARE already caching by this value, do nothing
-        if attr in self._cache_meta[item_type].cache:
+    def _index_by(self, indexes, items, attr, kind, unique, build):
+        name = index_name(attr)
+        current = indexes.get(name)
+        if current is not None and current.kind == kind and current.unique == unique \
+                and (current.complete or not build):
             return
 
-        # If we ARE NOT not already caching by this value, initialize the dict for it.
-        # This is also done in _cache_node/edge(), but this is needed for cases
-        # where the user decides to start caching by an attribute, and they haven't
-        # added any nodes/edges with that attribute yet
-        if attr not in self._cache_meta[item_type].cache:
-            self._cache_meta[item_type].cache[attr] = {}
+        if kind not in INDEX_KINDS:
+            raise GraphException("Unknown index kind '{}'. Choose one of: {}".format(
+                kind, ", ".join(sorted(INDEX_KINDS))))
+        index = INDEX_KINDS[kind](name if type(name) is tuple else (name,), unique)
 
-        if not build:
-            return
+        if build:
+            for id_, attrs in items.iteritems():
+                if index.conflicts(id_, attrs):
+                    raise UniqueIndexException(name, index.key(attrs))
+                index.add(id_, attrs)
+        else:
+            index.complete = len(items) == 0
+        indexes.add(name, index)
+
+    def index_nodes_by(self, attr, kind="hash", unique=False, build=True):
+        '''Tells SemanticNet to index nodes by the given attribute attr, so that they can be
+        looked up with get_nodes_by_attr(). The index is kept up to date as nodes are added,
+        removed or changed, at a constant cost per change.
+
+        attr may also be a tuple of attributes, such as ("type", "cc"), for a composite index:
+        nodes are then looked up by the tuple of their values, and nodes lacking any of the
+        attributes are left out.
 
-        for id_, item_attrs in self._cache_meta[item_type].get_items_func().items():
-            if attr in item_attrs:
-                self._cache_meta[item_type].cache_func(attr, item_attrs)
+        If unique is True, no two nodes may share a value: adding or changing a node in a way
+        which would break this raises a UniqueIndexException, and leaves the graph untouched.
+
+        Optionally, if the user wishes to tell SemanticNet to start indexing NEW nodes, but not
+        to build the index from the existing nodes, they may set the 'build' flag to False.
+
+        kind is "hash" for exact lookups, "sorted" to also look nodes up by range of values
+        with get_nodes_by_range(), or "text" to also look them up by prefix or substring with
+        get_nodes_by_prefix() and get_nodes_by_substring().
+
+        Indexing by the same attribute again with the same options does nothing, unless the
+        index was left incomplete and build is True; with other options, the index is rebuilt.
+        '''
+        self._write()
+        self._index_by(self._node_indexes, self._g.node, attr, kind, unique, build)
+
+    def index_edges_by(self, attr, kind="hash", unique=False, build=True):
+        '''Tells SemanticNet to index edges by the given attribute attr, so that they can be
+        looked up with get_edges_by_attr(). See index_nodes_by() for the options.
+        '''
+        self._write()
+        self._index_by(self._edge_indexes, self._edges, attr, kind, unique, build)
 
     def cache_nodes_by(self, attr, build=True):
         '''Tells SemanticNet to cache nodes by the given attribute attr.
@@ -528,8 +1178,10 @@ class Graph(object):
 
         Optinally, if the user wishes to tell SemanticNet to start caching NEW nodes of type attr, but not
         to build a cache from the existing nodes, they may set the 'build' flag to False.
+
+        This is the same as index_nodes_by(attr, build=build).
         '''
-        self._cache_by("node", attr, build)
+        self.index_nodes_by(attr, build=build)
 
     def cache_edges_by(self, attr, build=True):
         '''Tells SemanticNet to cache edges by the given attribute attr.
@@ -539,47 +1191,53 @@ class Graph(object):
 
         Optinally, if the user wishes to tell SemanticNet to start caching NEW edges of type attr, but not
         to build a cache from the existing edges, they may set the 'build' flag to False.
+
+        This is the same as index_edges_by(attr, build=build).
         '''
-        self._cache_by("edge", attr, build)
+        self.index_edges_by(attr, build=build)
 
-    def _clear_item_cache(self, item_type, attr):
+    def _clear_item_cache(self, indexes, attr):
         if attr == "":
-            for key, val in self._cache_meta[item_type].cache.items():
-                del self._cache_meta[item_type].cache[key]
-        elif attr in self._node_cache:
-            self._cache_meta[item_type].cache[attr] = {}
+            indexes.clear()
+        elif indexes.get(index_name(attr)) is not None:
+            index = indexes.get(index_name(attr))
+            index.clear()
+            index.complete = False
 
     def clear_node_cache(self, attr=""):
         '''Delete the node cache. If attr is given, delete the cache for that attribute.'''
-        self._clear_item_cache("node", attr)
+        self._write()
+        self._clear_item_cache(self._node_indexes, attr)
 
     def clear_edge_cache(self, attr=""):
         '''Delete the edge cache. If attr is given, delete the cache for that attribute.'''
-        self._clear_item_cache("edge", attr)
+        self._write()
+        self._clear_item_cache(self._edge_indexes, attr)
 
-    def _get_items_by_attr(self, item_type, attr, val, nosingleton):
-        items = self._cache_meta[item_type].cache.get(attr)
+    def _get_items_by_attr(self, indexes, items, attr, val, nosingleton):
+        index = indexes.get(index_name(attr))
 
         # if the attribute doesn't exist, return an empty dict
-        if items == None:
+        if index == None:
             return {}
 
         # if no value was specified for the attribute, return the whole dict
         # of items keyed by attr
         if val == None:
-            return items
+            return dict(IndexView(index, items.__getitem__).iteritems())
 
         # if there are no items with the given attribute and value, return an empty list
-        if val not in items:
+        ids = index.ids(val)
+        if not ids:
             return []
 
         # if user set nosingleton to true, and there is only a single node with this value,
         # just return the node, rather than a singleton list
-        if nosingleton and len(items[val]) == 1:
-            return items[val][0]
+        if nosingleton and len(ids) == 1:
+            return items[ids[0]]
 
         # otherwise, return all nodes with the attribute attr and the value val
-        return items[val]
+        return [items[id_] for id_ in ids]
 
     def get_nodes_by_attr(self, attr, val=None, nosingleton=False):
         '''Gets all nodes with the given attribute attr and value val.
@@ -592,8 +1250,10 @@ class Graph(object):
         the method will only return that single node, rather than a singleton list. This is useful,
         for instance, if the user knows all nodes with attributes of a certain type will be unique,
         and wishes to simply use attr as the node key.
+
+        For a composite index, attr is the tuple of attributes, and val the tuple of their values.
         '''
-        return self._get_items_by_attr("node", attr, val, nosingleton)
+        return self._get_items_by_attr(self._node_indexes, self._g.node, attr, val, nosingleton)
 
     def get_edges_by_attr(self, attr, val=None, nosingleton=False):
         '''Gets all edges with the given attribute attr and value val.
@@ -606,63 +1266,253 @@ class Graph(object):
         the method will only return that single edge, rather than a singleton list. This is useful,
         for instance, if the user knows all edges with attributes of a certain type will be unique,
         and wishes to simply use attr as the edge key.
+
+        For a composite index, attr is the tuple of attributes, and val the tuple of their values.
+        '''
+        return self._get_items_by_attr(self._edge_indexes, self._edges, attr, val, nosingleton)
+
+    def _index_of_kind(self, indexes, item_type, attr, kinds):
+        index = indexes.get(index_name(attr))
+        if index is None or index.kind not in kinds:
+            raise GraphException("{}s are not indexed by {} with a {} index, see index_{}s_by().".format(
+                item_type.capitalize(), index_name(attr), kinds[0], item_type))
+        return index
+
+    def _get_items_by_range(self, indexes, items, item_type, attr, gt, gte, lt, lte, reverse, limit):
+        index = self._index_of_kind(indexes, item_type, attr, ("sorted", "text"))
+
+        bounds = {"reverse": reverse}
+        if gt is not None:
+            bounds.update(low=gt, low_inclusive=False)
+        elif gte is not None:
+            bounds.update(low=gte)
+        if lt is not None:
+            bounds.update(high=lt, high_inclusive=False)
+        elif lte is not None:
+            bounds.update(high=lte)
+
+        ids = index.range(**bounds)
+        if limit is not None:
+            ids = islice(ids, limit)
+        return [items[id_] for id_ in ids]
+
+    def get_nodes_by_range(self, attr, gt=None, gte=None, lt=None, lte=None, reverse=False, limit=None):
+        '''Gets the nodes whose attribute attr is greater than gt (or than or equal to gte) and
+        lower than lt (or than or equal to lte), as a list ordered by attr. Bounds left as None
+        are not checked, so that get_nodes_by_range(attr) lists every node with attr in order.
+
+        If reverse is True, the nodes come in decreasing order of attr. If limit is given, at
+        most limit nodes are returned, so that the top k nodes are found with
+        get_nodes_by_range(attr, reverse=True, limit=k).
+
+        Nodes must have been indexed with index_nodes_by(attr, kind="sorted") (or "text"),
+        otherwise a GraphException is raised. Nodes sharing a value come in the order they were indexed.
+        '''
+        return self._get_items_by_range(self._node_indexes, self._g.node, "node", attr,
+            gt, gte, lt, lte, reverse, limit)
+
+    def get_edges_by_range(self, attr, gt=None, gte=None, lt=None, lte=None, reverse=False, limit=None):
+        '''Same as get_nodes_by_range(), for edges indexed with
+        index_edges_by(attr, kind="sorted").'''
+        return self._get_items_by_range(self._edge_indexes, self._edges, "edge", attr,
+            gt, gte, lt, lte, reverse, limit)
+
+    def get_nodes_by_prefix(self, attr, prefix):
+        '''Gets the nodes whose attribute attr is a string starting with prefix, as a list
+        ordered by attr. This finds, for instance, all the paths under a directory, or all
+        the URLs of a host.
+
+        Nodes must have been indexed with index_nodes_by(attr, kind="text"), otherwise a
+        GraphException is raised.
+        '''
+        index = self._index_of_kind(self._node_indexes, "node", attr, ("text",))
+        return [self._g.node[id_] for id_ in index.prefix(prefix)]
+
+    def get_nodes_by_substring(self, attr, substring):
+        '''Gets the nodes whose attribute attr is a string containing substring, as a list
+        in no particular order.
+
+        Nodes must have been indexed with index_nodes_by(attr, kind="text"), otherwise a
+        GraphException is raised. Looking up a string of 3 characters or more only checks
+        the values sharing all of its 3 character substrings; shorter strings are looked
+        up in every distinct value.
+        '''
+        index = self._index_of_kind(self._node_indexes, "node", attr, ("text",))
+        return [self._g.node[id_] for id_ in index.substring(substring)]
+
+    def get_edges_by_prefix(self, attr, prefix):
+        '''Same as get_nodes_by_prefix(), for edges indexed with
+        index_edges_by(attr, kind="text").'''
+        index = self._index_of_kind(self._edge_indexes, "edge", attr, ("text",))
+        return [self._edges[id_] for id_ in index.prefix(prefix)]
+
+    def get_edges_by_substring(self, attr, substring):
+        '''Same as get_nodes_by_substring(), for edges indexed with
+        index_edges_by(attr, kind="text").'''
+        index = self._index_of_kind(self._edge_indexes, "edge", attr, ("text",))
+        return [self._edges[id_] for id_ in index.substring(substring)]
+
+    def find_nodes(self, conditions={}, **kwargs):
+        '''Returns a Query over the nodes matching all of the given conditions, which may be
+        passed as keyword arguments, or as a dict for attribute names which are not valid
+        Python identifiers:
+
+            g.find_nodes(type="AS", cc="DE", registration__gte="2010")
+
+        A condition attr=value tests for equality. A suffix __ne, __lt, __lte, __gt, __gte,
+        __in (for a list of values), __startswith or __contains (for strings) tests otherwise.
+        Nodes lacking attr never match.
+
+        The query is lazy: iterating over it yields the attributes of the matching nodes,
+        its ids() method their IDs, and its count() method their number. It uses the
+        indexes created by index_nodes_by() whenever they help, and scans every node
+        otherwise, see Query.
         '''
-        return self._get_items_by_attr("edge", attr, val, nosingleton)
+        return Query(lambda: self._node_indexes, lambda: self._g.node, dict(conditions, **kwargs))
+
+    def find_edges(self, conditions={}, **kwargs):
+        '''Same as find_nodes(), for edges. The indexes created by index_edges_by() are used
+        whenever they help.'''
+        return Query(lambda: self._edge_indexes, lambda: self._edges, dict(conditions, **kwargs))
 
     def neighbors(self, id_):
-        return dict([(nid, self.get_node(nid)) for nid in self._g.neighbors(id_)])
+        if self.backend != "networkx":
+            return self._nodes_by_handle(self._g.neighbor_handles(self._handle_of(id_)))
+        return dict(self.adj[id_].iteritems())
 
-    def _get_export_id_str(self, id_):
-        if id_.__class__.__name__ == "UUID":
-            return id_.hex
-        return id_
+    def _nodes_by_handle(self, handles):
+        return dict(self._g.node_items(handles))
 
     def _hexify_attrs(self, attrs):
         for key, val in attrs.iteritems():
             if key in ['src', 'dst', 'id']:
-                attrs[key] = self._get_export_id_str(attrs[key])
+                attrs[key] = self._export_id(attrs[key])
         return attrs
 
-    def save_json(self, filename):
-        '''Exports the graph to a JSON file for use in the Gaia visualizer.'''
+    def save_json(self, filename, expand=False, compact=False, serializer="json"):
+        '''Exports the graph to a JSON file for use in the Gaia visualizer.
+
+        If expand is True and the graph coalesces edges (see coalesce_edges()), every
+        stored edge is written out as the number of edges merged into it, see
+        EdgeCoalescer.expand(). The first one keeps the ID of the stored edge.
+
+        Nodes and edges are encoded and written one at a time, straight from the stored
+        attributes, see JsonGraphWriter, so saving takes little memory beyond the graph
+        itself. The keys of each node and edge come in the order of the stored dict.
+        With the networkx backend, edges are written in the order of the adjacency of
+        their sources, as save_json() has always written them. If compact is True, the
+        file is not indented. serializer names the JSON module to encode with, see
+        get_serializer(): those other than the default, "json", write compact files.
+        '''
+        serializer = self._get_serializer(serializer)
         with open(filename, 'w') as outfile:
-            graph = dict()
-            graph["meta"] = self.meta
-            graph["nodes"] = [ dict(chain(self._g.node[id_].items(), {"id": self._get_export_id_str(id_)}.items())) for id_ in self._g.nodes() ]
-            graph["edges"] = [
-                dict(
-                    chain(
-                        self._g.edge[i][j][key].items(),
-                        { "src": self._get_export_id_str(i), "dst": self._get_export_id_str(j), "id": self._get_export_id_str(key)}.items()
-                    )
-                )
-                for i, j in self._g.edges()
-                for key in self._g.edge[i][j]
-            ]
-            graph["timeline"] = [ [c.timecode, c.name, self._hexify_attrs( c.attributes )] for c in self.timeline ]
-            json.dump(graph, outfile, indent=True)
-
-    def load_json(self, j):
-        '''Generates a graph from the given JSON file j. j may be the filename string, or a JSON object.'''
+            JsonGraphWriter(outfile, compact, serializer=serializer).write(self.meta,
+                self._iter_saved_nodes(), self._iter_exported_edges(expand), self._iter_saved_events())
+
+    def _get_serializer(self, name):
+        try:
+            return get_serializer(name)
+        except ValueError as e:
+            raise GraphException(str(e))
+
+    # The attribute dicts are written as stored, without copies: they hold the IDs under
+    # "id", "src" and "dst", which the writers encode as _export_id() would, UUIDs as hex.
+    # Only the rows of a column store (see ColumnStore) are turned into dicts.
+
+    def _iter_saved_nodes(self):
+        for id_, attrs in self._g.node.iteritems():
+            yield attrs if type(attrs) is dict else dict(attrs)
+
+    def _iter_exported_edges(self, expand):
+        for id_, attrs in self._iter_saved_edges(expand):
+            yield attrs if type(attrs) is dict else dict(attrs)
+
+    def _iter_saved_events(self):
+        for c in self.timeline:
+            yield [c.timecode, c.name, self._hexify_attrs(c.attributes)]
+
+    def _iter_saved_edges(self, expand):
+        if not expand or self._coalescer is None:
+            return self._iter_stored_edges()
+        return self._iter_expanded_edges()
+
+    def _iter_stored_edges(self):
+        '''Iterates over the (ID, attributes) of every edge. With the networkx backend,
+        they come in the order of the adjacency of the storage graph, which is the order
+        save_json() has always written them in.'''
+        if self.backend != "networkx":
+            return self._edges.iteritems()
+        return self._iter_adjacent_edges()
+
+    def _iter_adjacent_edges(self):
+        seen = set()
+        for src, row in self._g.adj.iteritems():
+            for dst, bundle in row.iteritems():
+                if dst not in seen:
+                    for item in bundle.iteritems():
+                        yield item
+            if not self.directed:
+                # undirected edges are in the rows of both of their ends
+                seen.add(src)
+
+    def _iter_expanded_edges(self):
+        for id_, attrs in self._iter_stored_edges():
+            for n, expanded in enumerate(self._coalescer.expand(attrs)):
+                if n:
+                    expanded["id"] = self._generated_id(expanded_id(id_, n))
+                yield expanded["id"], expanded
+
+    def load_json(self, j, rekey=False, trusted=False, serializer="json"):
+        '''Generates a graph from the given JSON file j. j may be the filename string, or a JSON object.
+
+        If rekey is True, the node and edge IDs in j are discarded, and new ones are created
+        by the graph's ID generator. With a ContentIdGenerator, this makes graphs built by
+        different runs comparable with sn.diff().
+
+        If trusted is True, j is taken to be a graph saved by save_json(), and loaded in
+        bulk, see _load_trusted(), without the checks add_node() and add_edge() make:
+        reserved attributes, unique indexes, or edges given twice, for instance. The dicts
+        of j become the attributes of the nodes and edges.
+
+        serializer names the JSON module to decode the file with, see get_serializer().
+        '''
+        self._write()
         if type(j) is str:
-            jfile = open(j, 'r')
-            graph = json.load(jfile)
+            with open(j, 'r') as jfile:
+                graph = self._get_serializer(serializer).load(jfile)
         else:
             graph = j
 
         self.meta = graph["meta"]
         self.timeline = graph["timeline"]
 
-        for node in graph["nodes"]:
-            id_ = self._extract_id(node.get("id"))
-            if id_ != None:
-                del node["id"]
-            self.add_node(node, id_)
+        if trusted and not rekey and self._cow is None and self._coalescer is None:
+            self._load_trusted(graph["nodes"], graph["edges"])
+            return
 
-        for edge in graph["edges"]:
-            src = self._extract_id(edge["src"])
-            dst = self._extract_id(edge["dst"])
-            id_ = self._extract_id(edge["id"]) if edge["id"] != None else self._create_uuid()
+        # convert each ID column in one pass
+        nodes = graph["nodes"]
+        node_ids = map(self._extract_id, [node.get("id") for node in nodes])
+        edges = graph["edges"]
+        srcs = map(self._extract_id, [edge["src"] for edge in edges])
+        dsts = map(self._extract_id, [edge["dst"] for edge in edges])
+        edge_ids = map(self._extract_id, [edge["id"] for edge in edges])
+
+        if rekey:
+            new_ids = {}
+            for node, id_ in izip(nodes, node_ids):
+                node.pop("id", None)
+                new_ids[id_] = self.add_node(node)
+            srcs = [new_ids[src] for src in srcs]
+            dsts = [new_ids[dst] for dst in dsts]
+            edge_ids = [None] * len(edges)
+        else:
+            for node, id_ in izip(nodes, node_ids):
+                if id_ != None:
+                    del node["id"]
+                self.add_node(node, id_)
+
+        for edge, src, dst, id_ in izip(edges, srcs, dsts, edge_ids):
             self.add_edge(
                 src,
                 dst,
@@ -670,10 +1520,270 @@ class Graph(object):
                         if (item[0] != "src" and item[0] != "dst" and item[0] != "id")] ),
                 id_
             )
-            self._g.edge[src][dst][id_]["id"] = id_
+
+    def _load_trusted(self, nodes, edges):
+        '''Adds the nodes and edges, dicts of attributes in the form save_json() writes
+        them, writing straight to the storage graph, and rebuilds the indexes at the end.
+        Each ID is converted once, and the nodes and edges referring to it share the
+        result. The only check made is that the ends of every edge exist.'''
+        extract = self._extract_id
+        seen = self._id_generator.seen
+        ids = {}
+        for node in nodes:
+            raw = node.get("id")
+            if raw is None:
+                id_ = self._new_node_id(node)
+            else:
+                id_ = ids[raw] = extract(raw)
+                seen(id_)
+            node["id"] = id_
+
+        has_node = self._g.has_node
+        for edge in edges:
+            raw = edge["src"]
+            edge["src"] = ids[raw] if raw in ids else extract(raw)
+            raw = edge["dst"]
+            edge["dst"] = ids[raw] if raw in ids else extract(raw)
+            edge["id"] = id_ = extract(edge["id"])
+            seen(id_)
+        new_ids = set(node["id"] for node in nodes)
+        for edge in edges:
+            for end in (edge["src"], edge["dst"]):
+                if end not in new_ids and not has_node(end):
+                    raise GraphException("Node ID not found.")
+        self._store_loaded(nodes, edges)
+
+    def _store_loaded(self, nodes, edges):
+        '''Adds the nodes and edges, dicts of attributes holding their IDs and, for edges,
+        those of their ends, which must exist. Writes straight to the storage graph, and
+        rebuilds the indexes at the end.'''
+        self._write()
+        if self._interner is not None:
+            nodes = map(self._interner.attrs, nodes)
+            edges = map(self._interner.attrs, edges)
+        if self.verbose:
+            self.log("trusted load of {} nodes, {} edges".format(len(nodes), len(edges)))
+
+        if self.backend == "networkx":
+            self._store_trusted(nodes, edges)
+        else:
+            add_node = self._g.add_node
+            for node in nodes:
+                add_node(node["id"], node)
+            node_handle = self._g.node_handle
+            self._g.add_edges_by_handle(
+                (node_handle(edge["src"]), node_handle(edge["dst"]), edge["id"], edge) for edge in edges)
+
+        if self._node_indexes or self._edge_indexes:
+            self._reindex()
+
+    def _store_trusted(self, nodes, edges):
+        '''Fills the tables of the networkx storage graph the way add_node() and
+        add_edge() would, but keeping the dicts given as the attributes.'''
+        node_table = self._g.node
+        adj = self._g.adj
+        # the edges from v to u, which share the edges from u to v
+        reverse = self._g.pred if self.directed else adj
+        for node in nodes:
+            id_ = node["id"]
+            if id_ in node_table:
+                node_table[id_].update(node)
+                continue
+            node_table[id_] = node
+            adj[id_] = {}
+            if self.directed:
+                reverse[id_] = {}
+
+        edge_table = self._edges
+        for edge in edges:
+            src = edge["src"]
+            dst = edge["dst"]
+            bundle = adj[src].get(dst)
+            if bundle is None:
+                bundle = adj[src][dst] = reverse[dst][src] = {}
+            bundle[edge["id"]] = edge
+            edge_table[edge["id"]] = edge
+
+    def save_binary(self, filename, expand=False):
+        '''Saves the graph to the binary file filename, which load_binary() reads back.
+        The file holds the same graph as save_json() would, expand included, but packed,
+        see BinaryGraphWriter: it is several times smaller, and loads faster. UUIDs held
+        in attributes other than IDs are kept as UUIDs, rather than saved as hex.'''
+        with open(filename, 'wb') as outfile:
+            BinaryGraphWriter(outfile).write(self.meta, list(self._g.node.iteritems()),
+                list(self._iter_saved_edges(expand)), list(self._iter_saved_events()),
+                self.directed)
+
+    def load_binary(self, filename):
+        '''Loads the graph saved by save_binary() in the file filename, see
+        BinaryGraphReader. Like load_json() with trusted=True, the nodes and edges are
+        added in bulk, without the checks add_node() and add_edge() make.'''
+        self._write()
+        if self.id_kind == "auto" or self.id_kind == "uuid":
+            convert = self._extract_id
+        else:
+            # IDs saved as UUIDs are read as save_json() would have written them
+            extract = self._extract_id
+            convert = lambda id_: extract(id_.hex if type(id_) is uuid.UUID else id_)
+        with open(filename, 'rb') as infile:
+            graph = BinaryGraphReader(infile).read(convert)
+
+        if self._cow is not None or self._coalescer is not None:
+            self.load_json(graph)
+        else:
+            self.meta = graph["meta"]
+            seen = self._id_generator.seen
+            for item in chain(graph["nodes"], graph["edges"]):
+                seen(item["id"])
+            self._store_loaded(graph["nodes"], graph["edges"])
+        self.timeline = [Event(timecode, name, attributes)
+            for timecode, name, attributes in graph["timeline"]]
+
+    def load_json_stream(self, filename, node_filter=None, node_attrs=None, edge_attrs=None,
+            rekey=False, batch_size=10000):
+        '''Same as load_json(), but reads the file filename a node or edge at a time, see
+        JsonGraphReader, so that the parsed file is never held in memory as a whole. The
+        nodes and edges are added in batches of batch_size.
+
+        node_filter selects the nodes to load: it is either a function, called with the
+        attributes of each node (its "id" included), which returns True to load it, or a
+        dict of attribute -> value, which nodes must all have, e.g. {"type": "AS"}. Edges
+        to or from a node which is not loaded are left out.
+
+        node_attrs and edge_attrs are the lists of the attributes to load, such as
+        ["label", "cc"], if not all of them. The filter sees every attribute.
+
+        Edges are only checked against the nodes loaded so far, so the nodes must come
+        first in the file when filtering, as they do in files written by save_json().
+        '''
+        if isinstance(node_filter, Mapping):
+            wanted = node_filter.items()
+            node_filter = lambda node: all(attr in node and node[attr] == value for attr, value in wanted)
+        self._write()
+        new_ids = {}
+        batch = self.batch()
+        with open(filename, 'rb') as infile:
+            for name, value in JsonGraphReader(infile).sections():
+                if name == "meta":
+                    self.meta = value
+                elif name == "timeline":
+                    self.timeline = list(value)
+                elif name == "nodes":
+                    for node in value:
+                        if node_filter is not None and not node_filter(node):
+                            continue
+                        id_ = node.pop("id", None)
+                        if node_attrs is not None:
+                            node = _project(node, node_attrs)
+                        if rekey:
+                            new_ids[id_] = batch.add_node(node)
+                        else:
+                            batch.add_node(node, id_)
+                        if len(batch._nodes) >= batch_size:
+                            batch.commit()
+                elif name == "edges":
+                    batch.commit()
+                    for edge in value:
+                        src = edge.pop("src")
+                        dst = edge.pop("dst")
+                        id_ = edge.pop("id", None)
+                        if rekey:
+                            if src not in new_ids or dst not in new_ids:
+                                continue
+                            src = new_ids[src]
+                            dst = new_ids[dst]
+                            id_ = None
+                        elif node_filter is not None and not (batch.has_node(src) and batch.has_node(dst)):
+                            continue
+                        if edge_attrs is not None:
+                            edge = _project(edge, edge_attrs)
+                        batch.add_edge(src, dst, edge, id_)
+                        if len(batch._edges) >= batch_size:
+                            batch.commit()
+        batch.commit()
 
     def copy(self):
-        return copy.deepcopy(self)
+        '''Returns a copy of the graph, in constant time: the copy shares the storage of
+        the graph until either of them changes.
+
+        The first change to either graph then copies the tables of nodes, edges and
+        adjacency rows, which only hold references to the attributes and rows, and the
+        indexes: this takes time and memory proportional to the number of nodes and
+        edges, if far less than a deep copy. After that, only what changes is copied: a
+        node's attributes, an edge's attributes, or the adjacency of the nodes an edge
+        is added between or removed from. With the compact backend, the whole storage is
+        copied the first time either graph changes.
+
+        Both graphs must be changed through their methods only: changing the dict
+        returned by get_node() or get_edge() in place would change both.
+        '''
+        return self._copy_as(self.__class__)
+
+    def _copy_as(self, cls):
+        copied = cls.__new__(cls)
+        copied.__dict__.update(self.__dict__)
+        copied.meta = copy.deepcopy(self.meta)
+        copied.timeline = list(self.timeline)
+        copied._id_generator = copy.deepcopy(self._id_generator)
+        if self._interner is not None:
+            copied._interner = self._interner.copy()
+        # nothing is either graph's own anymore
+        self._cow = CopyOnWrite(self.directed)
+        copied._cow = CopyOnWrite(self.directed)
+        return copied
+
+    def freeze(self):
+        '''Returns an immutable snapshot of the graph, as a FrozenGraph. Like copy(), this
+        takes constant time, and the snapshot never changes, so any number of threads may
+        read it without locks.
+
+        As with copy(), the first change to the graph after each freeze copies what the
+        snapshot shares with it: with the networkx backend, the top-level tables of nodes,
+        edges and adjacency rows, and the indexes (about 0.2s for 200,000 nodes and as
+        many edges); with the compact backend, which packs its arrays first if they are
+        not, the whole storage. Either way, publishing a snapshot after every batch of
+        changes costs time proportional to the size of the graph per batch: on large
+        graphs, make batches bigger, or freeze less often, e.g. every few seconds.
+        '''
+        return self._freeze_as(FrozenGraph)
+
+    def _freeze_as(self, cls):
+        if self.backend != "networkx" and not self._g.is_packed():
+            # readers of the snapshot then scan no tombstones, nor overflow
+            self._write()
+            self._g.compact()
+        return self._copy_as(cls)
+
+    def _write(self):
+        '''Stops sharing the top-level tables and the indexes of the graph with its copies,
+        see copy(). Must be called before any change.'''
+        cow = self._cow
+        if cow is None or cow.unshared:
+            return
+        if self.backend == "networkx":
+            self._g = cow.unshare(self._g)
+            self._edges = dict(self._edges)
+        else:
+            self._g = copy.deepcopy(self._g)
+            self._edges = self._new_edge_table()
+            self._cow = None
+        self._node_indexes = self._node_indexes.copy()
+        self._edge_indexes = self._edge_indexes.copy()
+
+    def _own_node(self, id_):
+        self._write()
+        if self._cow is not None:
+            self._cow.node(self._g, id_)
+
+    def _own_bundle(self, src, dst):
+        self._write()
+        if self._cow is not None:
+            self._cow.bundle(self._g, src, dst)
+
+    def _own_edge(self, src, dst, id_):
+        self._write()
+        if self._cow is not None:
+            self._cow.edge(self._g, self._edges, src, dst, id_)
 
     def _check_key_presence(self, d, key, val):
         try:
@@ -682,22 +1792,64 @@ class Graph(object):
             d[key] = val
 
     def networkx_graph(self):
-        return copy.deepcopy(self._g)
+        if self.backend == "networkx":
+            return copy.deepcopy(self._g)
+        return copy.deepcopy(self._g.to_networkx())
 
     def load_networkx_graph(self, nxgraph):
-        self._g = nxgraph
+        self._write()
+        self._cow = None
+        if self.backend == "networkx":
+            self._g = nxgraph
+        else:
+            self._g = BACKENDS[self.backend][self.directed].from_networkx(nxgraph, self.attr_store)
+        self._edges = self._new_edge_table()
 
         # add id fields on nodes that don't have them
         for id_ in self._g.nodes():
             self._check_key_presence(self._g.node[id_], "id", id_)
 
-        for src, dst in nxgraph.edges():
-            for key in nxgraph.edge[src][dst]:
-                attrs = nxgraph.edge[src][dst][key]
+        for src, dst, key, attrs in self._g.edges(keys=True, data=True):
+            if self.backend == "networkx":
                 self._edges[key] = attrs
-                self._check_key_presence(self._edges[key], "id", key)
-                self._check_key_presence(self._edges[key], "src", src)
-                self._check_key_presence(self._edges[key], "dst", dst)
+            self._check_key_presence(attrs, "id", key)
+            self._check_key_presence(attrs, "src", src)
+            self._check_key_presence(attrs, "dst", dst)
+
+        self._reindex()
+
+class FrozenGraph(Graph):
+    '''An immutable snapshot of a Graph, as returned by Graph.freeze(); see FrozenDiGraph
+    for a DiGraph.
+
+    Every method which only reads the graph works as on a Graph, including queries,
+    views, indexes and exports, and frozen graphs can be passed to the operators and
+    to diff(). Every method which would change the graph raises a
+    FrozenGraphException instead; copy() returns a mutable Graph. Frozen graphs are
+    hashable, by identity, e.g. to cache results computed from a snapshot.
+
+    With the compact backend, the adjacency arrays of a snapshot are fully packed.
+    '''
+    def __hash__(self):
+        return id(self)
+
+    def _write(self):
+        raise FrozenGraphException()
+
+    def freeze(self):
+        return self
+
+    def copy(self):
+        return self._copy_as(Graph)
+
+    def add_event(self, timecode, name, attributes):
+        raise FrozenGraphException()
+
+    def intern_attributes(self, values=()):
+        raise FrozenGraphException()
+
+    def coalesce_edges(self, identity=(), aggregate=()):
+        raise FrozenGraphException()
 
 if __name__ == "__main__":
     print("Please import this module !")
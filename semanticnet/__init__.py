@@ -1,4 +1,11 @@
 from Graph import *
 from DiGraph import *
+from ids import *
 from operators import *
 from algorithms import *
+from jsonstream import *
+from locking import *
+from parallel import *
+from sharding import *
+from serializers import *
+from binary import *
@@ -87,6 +87,8 @@ def diff(A, B, context=False, mods=False):
     WARNING: Currently, this method only works if both A and B were generated with unique IDs in a
     deterministic fashion; i.e., two identical nodes are given the same ID at both points in time.
     This means that diff() will not work on graphs which were generated with automatic random UUIDs.
+    Build them with id_generator="content" (or a configured ContentIdGenerator) instead, or load
+    them with load_json(..., rekey=True) into such a graph.
     '''
     # must take their union first, then mark appropriate nodes/edges
     AB = sn.union(A, B)
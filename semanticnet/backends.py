@@ -0,0 +1,577 @@
+import array
+import networkx as nx
+from collections import Mapping
+from columns import ColumnStore
+from ids import IdTable
+
+def _index_array(values=()):
+    '''A packed array of signed machine words, used for every index column.'''
+    return array.array('l', values)
+
+# rows of at most this many edges are scanned without looking for a shorter one
+_SHORT_ROW = 32
+
+class _NodeView(Mapping):
+    '''Read-only mapping of node ID -> attributes, mirroring networkx's G.node.'''
+    def __init__(self, graph):
+        self._graph = graph
+
+    def __getitem__(self, id_):
+        u = self._graph._nodes.lookup(id_)
+        if u is None:
+            raise KeyError(id_)
+        return self._graph._node_attrs[u]
+
+    def __contains__(self, id_):
+        return id_ in self._graph._nodes
+
+    def __iter__(self):
+        return iter(self._graph._nodes)
+
+    def __len__(self):
+        return len(self._graph._nodes)
+
+    def iteritems(self):
+        nodes = self._graph._nodes
+        attrs = self._graph._node_attrs
+        return ((nodes.external(u), attrs[u]) for u in nodes.handles())
+
+    def items(self):
+        return list(self.iteritems())
+
+class _AdjacencyRow(Mapping):
+    '''Mapping of neighbor ID -> {edge key: attributes} for a single node, over the
+    CSR index named csr.'''
+    def __init__(self, graph, u, csr):
+        self._graph = graph
+        self._u = u
+        self._csr = csr
+
+    def __getitem__(self, id_):
+        v = self._graph._nodes.lookup(id_)
+        edges = self._graph._edges_between(self._u, v, getattr(self._graph, self._csr)) \
+            if v is not None else None
+        if not edges:
+            raise KeyError(id_)
+        return edges
+
+    def __iter__(self):
+        return iter(self._graph._neighbor_ids(self._u, getattr(self._graph, self._csr)))
+
+    def __len__(self):
+        return len(self._graph._neighbor_handles(self._u, getattr(self._graph, self._csr)))
+
+class _AdjacencyView(Mapping):
+    '''Read-only mapping mirroring networkx's G.edge, i.e. G.edge[src][dst][key], or
+    G.pred[dst][src][key] with csr="_in".'''
+    def __init__(self, graph, csr="_out"):
+        self._graph = graph
+        self._csr = csr
+
+    def __getitem__(self, id_):
+        u = self._graph._nodes.lookup(id_)
+        if u is None:
+            raise KeyError(id_)
+        return _AdjacencyRow(self._graph, u, self._csr)
+
+    def __iter__(self):
+        return iter(self._graph._nodes)
+
+    def __len__(self):
+        return len(self._graph._nodes)
+
+class _EdgeMap(Mapping):
+    '''Read-only mapping of edge key -> attributes over every edge in the graph.'''
+    def __init__(self, graph):
+        self._graph = graph
+
+    def __getitem__(self, key):
+        e = self._graph._edge_ids.lookup(key)
+        if e is None:
+            raise KeyError(key)
+        return self._graph._edge_attrs[e]
+
+    def __contains__(self, key):
+        return key in self._graph._edge_ids
+
+    def __iter__(self):
+        return iter(self._graph._edge_ids)
+
+    def __len__(self):
+        return len(self._graph._edge_ids)
+
+    def iteritems(self):
+        edge_ids = self._graph._edge_ids
+        attrs = self._graph._edge_attrs
+        return ((edge_ids.external(e), attrs[e]) for e in edge_ids.handles())
+
+    def items(self):
+        return list(self.iteritems())
+
+class _CSR(object):
+    '''Compressed sparse row adjacency: the edges incident on node u are
+    edges[offsets[u]:offsets[u + 1]]. Edges added after the last build are kept
+    in a small per-node overflow table until the next rebuild.'''
+    def __init__(self):
+        self.offsets = _index_array([0])
+        self.edges = _index_array()
+        self.extra = {}
+
+    def row(self, u):
+        if u + 1 < len(self.offsets):
+            row = self.edges[self.offsets[u]:self.offsets[u + 1]]
+        else:
+            row = _index_array()
+        extra = self.extra.get(u)
+        if extra is not None:
+            row += extra
+        return row
+
+    def size(self, u):
+        '''Returns the number of edges in u's row, counting removed ones.'''
+        offsets = self.offsets
+        size = offsets[u + 1] - offsets[u] if u + 1 < len(offsets) else 0
+        extra = self.extra.get(u)
+        return size + len(extra) if extra is not None else size
+
+    def append(self, u, e):
+        try:
+            self.extra[u].append(e)
+        except KeyError:
+            self.extra[u] = _index_array([e])
+
+    def build(self, num_nodes, pairs):
+        '''Rebuild from an iterable of (node index, edge index) pairs with a counting sort.'''
+        pairs = list(pairs)
+        counts = [0] * (num_nodes + 1)
+        for u, e in pairs:
+            counts[u + 1] += 1
+        for u in xrange(num_nodes):
+            counts[u + 1] += counts[u]
+        cursor = counts[:]
+        edges = _index_array([0]) * len(pairs)
+        for u, e in pairs:
+            edges[cursor[u]] = e
+            cursor[u] += 1
+        self.offsets = _index_array(counts)
+        self.edges = edges
+        self.extra = {}
+
+class CompactMultiGraph(object):
+    '''An array-backed undirected multigraph.
+
+    Node and edge IDs are interned in IdTables, which give each of them a dense
+    integer handle. Edge endpoints live in two packed arrays indexed by edge
+    handle, and each node's incident edges are found through a compressed sparse
+    row (CSR) index over those arrays. Removals leave tombstones, which the
+    removals themselves squeeze out, together with the overflow of recent inserts,
+    once they make up a quarter of the edges. Reads never change the structure, so
+    any number of threads may read it at once, and skip the check for tombstones
+    while there are none.
+
+    With attr_store="columnar", node and edge attributes are kept in ColumnStores
+    instead of one dict per item, and the "id", "src" and "dst" attributes are
+    computed from the topology rather than stored.
+
+    The class exposes the subset of the networkx 1.x MultiGraph API that
+    semanticnet relies on, so it can stand in for one as Graph._g. The *_handle
+    methods work on node handles directly and skip ID lookups altogether.
+    '''
+    directed = False
+
+    def __init__(self, attr_store="dict"):
+        self.graph = {}
+        self.attr_store = attr_store
+
+        self._nodes = IdTable()
+        self._edge_ids = IdTable()
+        if attr_store == "columnar":
+            self._node_attrs = ColumnStore(self, {"id": "node_id"})
+            self._edge_attrs = ColumnStore(self, {"id": "edge_key", "src": "edge_src", "dst": "edge_dst"})
+        else:
+            self._node_attrs = []
+            self._edge_attrs = []
+        self._esrc = _index_array()
+        self._edst = _index_array()
+
+        self._out = _CSR()
+        self._in = self._out
+        self._dirty = 0
+        self._removed = 0
+
+        self.node = _NodeView(self)
+        self.edge = _AdjacencyView(self)
+        self.adj = self.edge
+        self.edge_attrs = _EdgeMap(self)
+
+    def _link(self, e, s, d):
+        self._out.append(s, e)
+        if d != s:
+            self._out.append(d, e)
+
+    def _pairs(self):
+        for e in xrange(len(self._esrc)):
+            s = self._esrc[e]
+            if s < 0:
+                continue
+            d = self._edst[e]
+            yield s, e
+            if d != s:
+                yield d, e
+
+    def compact(self):
+        '''Drop removed edges, renumber the survivors densely and rebuild the CSR index.'''
+        alive = [e for e in xrange(len(self._esrc)) if self._esrc[e] >= 0]
+        self._esrc = _index_array(self._esrc[e] for e in alive)
+        self._edst = _index_array(self._edst[e] for e in alive)
+        if self.attr_store == "columnar":
+            self._edge_attrs.compact(alive)
+        else:
+            self._edge_attrs = [self._edge_attrs[e] for e in alive]
+        self._edge_ids = self._edge_ids.select(alive)
+        self._rebuild()
+        self._dirty = 0
+        self._removed = 0
+
+    def is_packed(self):
+        '''Returns True if nothing changed since the last compact(), so that the rows hold
+        neither tombstones nor overflow.'''
+        return not self._dirty and not self._out.extra and not self._in.extra
+
+    def _rebuild(self):
+        self._out.build(self._nodes.capacity(), self._pairs())
+
+    def needs_compact(self):
+        '''Returns True if enough edges were removed since the last compact() to make it
+        worth it.'''
+        return self._removed > 64 and self._removed > (len(self._edge_ids) >> 2)
+
+    def maybe_compact(self):
+        '''Calls compact() if needs_compact(). Called by the changes which may leave
+        tombstones, after removing edges, or before adding one, so that the handle
+        add_edge_by_handle() returns stays valid.'''
+        if self.needs_compact():
+            self.compact()
+
+    def _row(self, u, csr):
+        '''Returns the handles of the live edges in u's row of csr.'''
+        row = csr.row(u)
+        if not self._removed:
+            return row
+        esrc = self._esrc
+        return [e for e in row if esrc[e] >= 0]
+
+    def _ends(self, u, csr):
+        '''Returns the other endpoint handle of every live edge in u's row.'''
+        esrc = self._esrc
+        edst = self._edst
+        return [edst[e] if esrc[e] == u else esrc[e] for e in self._row(u, csr)]
+
+    def _neighbor_handles(self, u, csr):
+        seen = set()
+        add = seen.add
+        return [v for v in self._ends(u, csr) if not (v in seen or add(v))]
+
+    def _neighbor_ids(self, u, csr):
+        external = self._nodes.external
+        return [external(v) for v in self._neighbor_handles(u, csr)]
+
+    def _joining(self, u, v, csr):
+        '''Returns the handles of the edges in u's row of csr whose other end is v. When
+        u's row is long, v's row is scanned instead if it is shorter.'''
+        row = self._row(u, csr)
+        if len(row) > _SHORT_ROW:
+            other_csr = self._in if csr is self._out else self._out
+            if other_csr.size(v) < len(row):
+                u, v, csr = v, u, other_csr
+                row = self._row(u, csr)
+        return self._matching(row, u, v, csr)
+
+    def _matching(self, row, u, v, csr):
+        '''Returns the handles of the edges of row, u's row of csr, whose other end is v.'''
+        esrc = self._esrc
+        edst = self._edst
+        return [e for e in row if (edst[e] if esrc[e] == u else esrc[e]) == v]
+
+    def _edges_between(self, u, v, csr=None):
+        external = self._edge_ids.external
+        attrs = self._edge_attrs
+        return dict((external(e), attrs[e]) for e in self._joining(u, v, self._out if csr is None else csr))
+
+    def _node_handle(self, n):
+        u = self._nodes.lookup(n)
+        if u is None:
+            raise KeyError(n)
+        return u
+
+    def node_handle(self, n):
+        '''Returns the handle of node n, or None if it is not in the graph.'''
+        return self._nodes.lookup(n)
+
+    def node_id(self, u):
+        '''Returns the ID of the node with handle u.'''
+        return self._nodes.external(u)
+
+    def edge_key(self, e):
+        '''Returns the key of the edge with handle e.'''
+        return self._edge_ids.external(e)
+
+    def edge_src(self, e):
+        '''Returns the ID of the source of the edge with handle e.'''
+        return self._nodes.external(self._esrc[e])
+
+    def edge_dst(self, e):
+        '''Returns the ID of the destination of the edge with handle e.'''
+        return self._nodes.external(self._edst[e])
+
+    def node_attrs(self, u):
+        '''Returns the attribute dict of the node with handle u.'''
+        if not self._nodes.alive(u):
+            raise KeyError(u)
+        return self._node_attrs[u]
+
+    def node_items(self, handles):
+        '''Returns (node ID, attributes) for each of the given node handles.'''
+        attrs = self._node_attrs
+        if self.attr_store == "columnar":
+            node_id = self._nodes.external
+            return [(node_id(u), attrs[u]) for u in handles]
+        return [(attrs[u]["id"], attrs[u]) for u in handles]
+
+    def node_attr_values(self, name):
+        '''Iterates over (node ID, value) for every node with the attribute name.'''
+        return self._attr_values(self._nodes, self._node_attrs, name)
+
+    def edge_attr_values(self, name):
+        '''Iterates over (edge key, value) for every edge with the attribute name.'''
+        return self._attr_values(self._edge_ids, self._edge_attrs, name)
+
+    def _attr_values(self, ids, store, name):
+        external = ids.external
+        if self.attr_store == "columnar":
+            return ((external(row), value) for row, value in store.scan(name))
+        return ((external(row), store[row][name]) for row in ids.handles() if name in store[row])
+
+    def neighbor_handles(self, u):
+        return self._neighbor_handles(u, self._out)
+
+    def edge_attrs_between(self, u, v):
+        '''Returns the attribute dicts of the edges joining handles u and v.'''
+        attrs = self._edge_attrs
+        return [attrs[e] for e in self._joining(u, v, self._out)]
+
+    def add_node(self, n, attr_dict=None, **attr):
+        if attr_dict is None:
+            attr_dict = attr
+        else:
+            attr_dict.update(attr)
+        u = self._nodes.intern(n)
+        if u == len(self._node_attrs):
+            self._node_attrs.append(attr_dict)
+        else:
+            self._node_attrs[u].update(attr_dict)
+        return u
+
+    def remove_node(self, n):
+        u = self._node_handle(n)
+        for e in self._row(u, self._out):
+            self._remove_edge_handle(e)
+        if self._in is not self._out:
+            for e in self._row(u, self._in):
+                self._remove_edge_handle(e)
+        self._nodes.discard(n)
+        self._node_attrs[u] = None
+        self.maybe_compact()
+
+    def has_node(self, n):
+        return n in self._nodes
+
+    def nodes(self):
+        return list(self._nodes)
+
+    def number_of_nodes(self):
+        return len(self._nodes)
+
+    def add_edge(self, u, v, key=None, attr_dict=None, **attr):
+        if attr_dict is None:
+            attr_dict = attr
+        else:
+            attr_dict = dict(attr_dict, **attr)
+        if key is None:
+            key = self._edge_ids.capacity()
+            while key in self._edge_ids:
+                key += 1
+        s = self._nodes.lookup(u)
+        if s is None:
+            s = self.add_node(u)
+        d = self._nodes.lookup(v)
+        if d is None:
+            d = self.add_node(v)
+        self.add_edge_by_handle(s, d, key, attr_dict)
+
+    def add_edge_by_handle(self, s, d, key, attr_dict):
+        '''Adds an edge keyed by key between the nodes with handles s and d. Unlike
+        add_edge(), attr_dict is stored as given rather than copied. Returns the
+        edge's handle.'''
+        self.maybe_compact()
+        e = self._edge_ids.lookup(key)
+        if e is not None:
+            if self._esrc[e] == s and self._edst[e] == d:
+                self._edge_attrs[e].update(attr_dict)
+                return e
+            # the key moved to a different pair of endpoints
+            self._remove_edge_handle(e)
+
+        e = self._edge_ids.intern(key)
+        self._edge_attrs.append(attr_dict)
+        self._esrc.append(s)
+        self._edst.append(d)
+        self._link(e, s, d)
+        self._dirty += 1
+        return e
+
+    def add_edges_by_handle(self, edges):
+        '''Adds each (source handle, destination handle, key, attribute dict) in edges,
+        as add_edge_by_handle() would. Large batches are written straight into the edge
+        arrays, and the CSR index is rebuilt once at the end.'''
+        edges = list(edges)
+        if len(edges) <= (len(self._edge_ids) >> 2):
+            for s, d, key, attr_dict in edges:
+                self.add_edge_by_handle(s, d, key, attr_dict)
+            return
+
+        intern = self._edge_ids.intern
+        for s, d, key, attr_dict in edges:
+            if intern(key) < len(self._esrc):
+                # the key was already there
+                self.add_edge_by_handle(s, d, key, attr_dict)
+                continue
+            self._edge_attrs.append(attr_dict)
+            self._esrc.append(s)
+            self._edst.append(d)
+        self.compact()
+
+    def _remove_edge_handle(self, e):
+        self._edge_ids.discard_handle(e)
+        self._edge_attrs[e] = None
+        self._esrc[e] = -1
+        self._edst[e] = -1
+        self._dirty += 1
+        self._removed += 1
+
+    def remove_edge(self, u, v, key=None):
+        if key is None:
+            key = next(iter(self.edge[u][v]))
+        e = self._edge_ids.lookup(key)
+        if e is None:
+            raise KeyError(key)
+        self._remove_edge_handle(e)
+        self.maybe_compact()
+
+    def has_edge(self, u, v, key=None):
+        try:
+            edges = self.edge[u][v]
+        except KeyError:
+            return False
+        return key is None or key in edges
+
+    def neighbors(self, n):
+        return self._neighbor_ids(self._node_handle(n), self._out)
+
+    def edges(self, data=False, keys=False):
+        return self._incident((e for e in xrange(len(self._esrc)) if self._esrc[e] >= 0), data, keys)
+
+    def _incident(self, edges, data, keys):
+        node_id = self._nodes.external
+        edge_id = self._edge_ids.external
+        result = []
+        for e in edges:
+            item = (node_id(self._esrc[e]), node_id(self._edst[e]))
+            if keys:
+                item += (edge_id(e),)
+            if data:
+                item += (self._edge_attrs[e],)
+            result.append(item)
+        return result
+
+    def number_of_edges(self):
+        return len(self._edge_ids)
+
+    def is_directed(self):
+        return self.directed
+
+    def is_multigraph(self):
+        return True
+
+    def to_networkx(self):
+        '''Returns an equivalent networkx multigraph.'''
+        g = nx.MultiDiGraph() if self.directed else nx.MultiGraph()
+        g.graph.update(self.graph)
+        for id_, attrs in self.node.iteritems():
+            g.add_node(id_, dict(attrs))
+        for src, dst, key, attrs in self.edges(data=True, keys=True):
+            g.add_edge(src, dst, key, dict(attrs))
+        return g
+
+    @classmethod
+    def from_networkx(cls, nxgraph, attr_store="dict"):
+        '''Builds a compact graph holding the same nodes, edges and attributes as nxgraph.'''
+        g = cls(attr_store)
+        g.graph.update(nxgraph.graph)
+        for id_, attrs in nxgraph.nodes(data=True):
+            g.add_node(id_, attrs)
+        for src, dst, key, attrs in nxgraph.edges(data=True, keys=True):
+            # undirected networkx graphs may report an edge either way round
+            if not cls.directed and attrs.get("src") == dst and attrs.get("dst") == src:
+                src, dst = dst, src
+            g.add_edge(src, dst, key, attrs)
+        return g
+
+class CompactMultiDiGraph(CompactMultiGraph):
+    '''Directed variant of CompactMultiGraph, keeping separate outgoing and
+    incoming CSR indexes so that both successors and predecessors are cheap.'''
+    directed = True
+
+    def __init__(self, attr_store="dict"):
+        super(CompactMultiDiGraph, self).__init__(attr_store)
+        self._in = _CSR()
+        self.succ = self.adj
+        self.pred = _AdjacencyView(self, "_in")
+
+    def _link(self, e, s, d):
+        self._out.append(s, e)
+        self._in.append(d, e)
+
+    def _rebuild(self):
+        alive = [e for e in xrange(len(self._esrc)) if self._esrc[e] >= 0]
+        self._out.build(self._nodes.capacity(), ((self._esrc[e], e) for e in alive))
+        self._in.build(self._nodes.capacity(), ((self._edst[e], e) for e in alive))
+
+    def _matching(self, row, u, v, csr):
+        ends = self._edst if csr is self._out else self._esrc
+        return [e for e in row if ends[e] == v]
+
+    def _ends(self, u, csr):
+        return map((self._edst if csr is self._out else self._esrc).__getitem__, self._row(u, csr))
+
+    def successors(self, n):
+        return self.neighbors(n)
+
+    def predecessors(self, n):
+        return self._neighbor_ids(self._node_handle(n), self._in)
+
+    def predecessor_handles(self, u):
+        return self._neighbor_handles(u, self._in)
+
+    def in_edges(self, n, data=False, keys=False):
+        return self._incident(self._row(self._node_handle(n), self._in), data, keys)
+
+    def out_edges(self, n, data=False, keys=False):
+        return self._incident(self._row(self._node_handle(n), self._out), data, keys)
+
+ATTR_STORES = ("dict", "columnar")
+
+BACKENDS = {
+    "networkx": (nx.MultiGraph, nx.MultiDiGraph),
+    "compact": (CompactMultiGraph, CompactMultiDiGraph),
+}
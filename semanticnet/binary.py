@@ -0,0 +1,350 @@
+import array
+import json
+import struct
+import sys
+import uuid
+from binascii import hexlify
+from itertools import izip
+from ids import uuid_from_int
+from serializers import encode_default
+
+MAGIC = "SNETBIN\0"
+VERSION = 1
+
+# the kinds of the columns of IDs and attribute values
+_BOOL, _INT, _FLOAT, _STR, _UNICODE, _STR_TABLE, _UNICODE_TABLE, _UUID, _JSON = range(9)
+
+# column flags
+_KEY_UNICODE = 1
+_ALL_ROWS = 2
+
+# string columns are written as indexes into the string table while they have fewer
+# distinct values than this, or than half of their rows
+_TABLE_MIN_VALUES = 256
+
+def _typecodes():
+    '''Returns the array typecode for each (signed, width) of integer.'''
+    codes = {}
+    for code in "bBhHiIlL":
+        key = (code.islower(), array.array(code).itemsize)
+        codes.setdefault(key, code)
+    return codes
+
+_TYPECODES = _typecodes()
+_SWAP = sys.byteorder != "little"
+
+def _int_width(values, signed):
+    '''Returns the fewest bytes holding every integer of values, or None if none is
+    wide enough.'''
+    if not values:
+        return 1
+    low, high = min(values), max(values)
+    for width in (1, 2, 4, 8):
+        bits = width * 8
+        if signed and -(1 << (bits - 1)) <= low and high < (1 << (bits - 1)) \
+                or not signed and low >= 0 and high < (1 << bits):
+            return width if (signed, width) in _TYPECODES else None
+    return None
+
+class BinaryGraphWriter(object):
+    '''Writes a graph to a file in the binary format of Graph.save_binary().
+
+    The file starts with MAGIC and the format VERSION, followed by the sections of
+    the graph: meta, the string table, nodes, edges and timeline. Integers are
+    little-endian, and packed as arrays of the fewest bytes which hold them all.
+
+    Nodes are a column of IDs followed by a column per attribute name. Edges are
+    sorted by source, and their ends written as the number of edges out of each node,
+    followed by the positions of their targets among the nodes, as the difference
+    with the previous target of the same source. Then come their IDs and attributes.
+
+    Attribute names and the values of string columns with few distinct values are
+    written once, in the string table, and referred to by their index. Columns of
+    booleans, integers, floats, strings and UUIDs are packed; the other values, such
+    as lists or columns mixing types, are encoded as JSON. meta and the timeline are
+    JSON too.
+
+    The whole file is encoded in memory before being written, since the string table
+    comes first.
+    '''
+    def __init__(self, outfile):
+        self.outfile = outfile
+        self._strings = {}
+        self._table = []
+
+    def write(self, meta, nodes, edges, timeline, directed=False):
+        '''Writes the graph: meta is a dict, nodes and edges lists of (ID, attributes)
+        items, the ends of edges being the "src" and "dst" attributes, and timeline a
+        list of [timecode, name, attributes] events.'''
+        parts = []
+        parts.append(self._json(meta))
+
+        positions = dict((id_, pos) for pos, (id_, attrs) in enumerate(nodes))
+        parts.append(struct.pack("<I", len(nodes)))
+        parts.append(self._values([id_ for id_, attrs in nodes]))
+        parts.append(self._columns([attrs for id_, attrs in nodes], ("id",)))
+
+        ends = [(positions[attrs["src"]], positions[attrs["dst"]], n)
+            for n, (id_, attrs) in enumerate(edges)]
+        ends.sort()
+        edges = [edges[n] for src, dst, n in ends]
+        degrees = [0] * len(nodes)
+        deltas = []
+        last_src = last_dst = None
+        for src, dst, n in ends:
+            degrees[src] += 1
+            deltas.append(dst - last_dst if src == last_src else dst)
+            last_src, last_dst = src, dst
+        parts.append(struct.pack("<I", len(edges)))
+        parts.append(self._ints(degrees, False))
+        parts.append(self._ints(deltas, False))
+        parts.append(self._values([id_ for id_, attrs in edges]))
+        parts.append(self._columns([attrs for id_, attrs in edges], ("id", "src", "dst")))
+
+        parts.append(self._json(timeline))
+
+        write = self.outfile.write
+        write(MAGIC + struct.pack("<HB", VERSION, int(directed)))
+        write(self._string_table())
+        for part in parts:
+            write(part)
+
+    def _string(self, value):
+        '''Returns the index of value in the string table, adding it if necessary.'''
+        if type(value) is unicode:
+            value = value.encode("utf-8")
+        index = self._strings.get(value)
+        if index is None:
+            index = self._strings[value] = len(self._table)
+            self._table.append(value)
+        return index
+
+    def _string_table(self):
+        return self._ints(map(len, self._table), False) + self._block("".join(self._table))
+
+    def _block(self, data):
+        return struct.pack("<I", len(data)) + data
+
+    def _json(self, value):
+        return self._block(json.dumps(value, default=encode_default))
+
+    def _ints(self, values, signed):
+        width = _int_width(values, signed)
+        packed = array.array(_TYPECODES[signed, width], values)
+        if _SWAP:
+            packed.byteswap()
+        return struct.pack("<BI", width, len(packed)) + packed.tostring()
+
+    def _columns(self, items, skipped):
+        '''Encodes the attributes of items, a list of dicts, as a column per name.'''
+        names = {}
+        for attrs in items:
+            for name in attrs:
+                names[name] = None
+        for name in skipped:
+            names.pop(name, None)
+
+        parts = [struct.pack("<I", len(names))]
+        for name in names:
+            rows = []
+            values = []
+            for row, attrs in enumerate(items):
+                if name in attrs:
+                    rows.append(row)
+                    values.append(attrs[name])
+            flags = _KEY_UNICODE if type(name) is unicode else 0
+            if len(rows) == len(items):
+                flags |= _ALL_ROWS
+            parts.append(struct.pack("<IB", self._string(name), flags))
+            if not flags & _ALL_ROWS:
+                parts.append(self._ints(rows, False))
+            parts.append(self._values(values))
+        return "".join(parts)
+
+    def _values(self, values):
+        '''Encodes the list values as a column of the narrowest kind holding them all.'''
+        types = set(map(type, values))
+        kind = _JSON
+        if len(types) == 1:
+            type_ = types.pop()
+            if type_ is bool:
+                kind = _BOOL
+            elif type_ is float:
+                kind = _FLOAT
+            elif type_ is uuid.UUID:
+                kind = _UUID
+            elif type_ is str or type_ is unicode:
+                kind = _STR if type_ is str else _UNICODE
+                if len(set(values)) < max(_TABLE_MIN_VALUES, len(values) / 2):
+                    kind += _STR_TABLE - _STR
+            elif type_ is int or type_ is long:
+                kind = _INT if _int_width(values, True) else _JSON
+        elif types and types <= set([int, long]) and _int_width(values, True):
+            kind = _INT
+
+        head = struct.pack("<B", kind)
+        if kind == _BOOL:
+            return head + self._ints(map(int, values), False)
+        if kind == _INT:
+            return head + self._ints(values, True)
+        if kind == _FLOAT:
+            packed = array.array("d", values)
+            if _SWAP:
+                packed.byteswap()
+            return head + self._block(packed.tostring())
+        if kind == _UUID:
+            return head + self._block("".join(value.bytes for value in values))
+        if kind == _STR or kind == _UNICODE:
+            if kind == _UNICODE:
+                values = [value.encode("utf-8") for value in values]
+            return head + self._ints(map(len, values), False) + self._block("".join(values))
+        if kind == _STR_TABLE or kind == _UNICODE_TABLE:
+            return head + self._ints(map(self._string, values), False)
+        return head + self._json(values)
+
+class BinaryGraphReader(object):
+    '''Reads a file in the binary format of Graph.save_binary(), see BinaryGraphWriter.
+
+    The packed columns are copied straight into arrays, so most of the time goes into
+    building the dicts of attributes.
+    '''
+    def __init__(self, infile):
+        self.infile = infile
+        self.directed = None
+        self._data = ""
+        self._pos = 0
+
+    def read(self, convert_id=None):
+        '''Returns the graph as a dict of meta, nodes, edges and timeline, in the form
+        Graph.load_json() takes them. The IDs are given as they were saved, or passed
+        through convert_id if given, once each. Whether the graph saved was directed is
+        left in the directed attribute.'''
+        self._data = self.infile.read()
+        self._pos = 0
+        magic = self._take(len(MAGIC))
+        if magic != MAGIC:
+            raise ValueError("Not a semanticnet binary graph file")
+        version, self.directed = self._unpack("<HB")
+        self.directed = bool(self.directed)
+        if version != VERSION:
+            raise ValueError("Unsupported semanticnet binary format version {}, expected {}".format(
+                version, VERSION))
+        self._table = self._strings(self._ints(), self._block())
+        self._unicode_table = None
+
+        meta = self._json()
+
+        count, = self._unpack("<I")
+        node_ids = self._check(self._values(), count)
+        if convert_id is not None:
+            node_ids = map(convert_id, node_ids)
+        nodes = [{"id": id_} for id_ in node_ids]
+        self._columns(nodes)
+
+        count, = self._unpack("<I")
+        degrees = self._ints()
+        deltas = self._ints()
+        edge_ids = self._check(self._values(), count)
+        if convert_id is not None:
+            edge_ids = map(convert_id, edge_ids)
+        edges = []
+        append = edges.append
+        n = 0
+        for src, degree in enumerate(degrees):
+            if not degree:
+                continue
+            src = node_ids[src]
+            dst = 0
+            for delta in deltas[n:n + degree]:
+                dst += delta
+                append({"id": edge_ids[n], "src": src, "dst": node_ids[dst]})
+                n += 1
+        self._columns(edges)
+
+        timeline = self._json()
+        return {"meta": meta, "nodes": nodes, "edges": edges, "timeline": timeline}
+
+    def _check(self, ids, count):
+        if len(ids) != count:
+            raise ValueError("Corrupt semanticnet binary graph file: expected {} IDs, found {}".format(
+                count, len(ids)))
+        return ids
+
+    def _take(self, size):
+        end = self._pos + size
+        if end > len(self._data):
+            raise ValueError("Truncated semanticnet binary graph file")
+        data = self._data[self._pos:end]
+        self._pos = end
+        return data
+
+    def _unpack(self, fmt):
+        return struct.unpack(fmt, self._take(struct.calcsize(fmt)))
+
+    def _block(self):
+        size, = self._unpack("<I")
+        return self._take(size)
+
+    def _json(self):
+        return json.loads(self._block())
+
+    def _array(self, typecode, data):
+        values = array.array(typecode)
+        values.fromstring(data)
+        if _SWAP:
+            values.byteswap()
+        return values
+
+    def _ints(self, signed=False):
+        width, count = self._unpack("<BI")
+        return self._array(_TYPECODES[signed, width], self._take(count * width))
+
+    def _strings(self, lengths, data):
+        strings = []
+        append = strings.append
+        end = 0
+        for length in lengths:
+            start = end
+            end += length
+            append(data[start:end])
+        return strings
+
+    def _unicode(self):
+        if self._unicode_table is None:
+            self._unicode_table = [value.decode("utf-8") for value in self._table]
+        return self._unicode_table
+
+    def _columns(self, items):
+        count, = self._unpack("<I")
+        for _ in xrange(count):
+            index, flags = self._unpack("<IB")
+            name = (self._unicode() if flags & _KEY_UNICODE else self._table)[index]
+            if flags & _ALL_ROWS:
+                rows = items
+            else:
+                rows = [items[row] for row in self._ints()]
+            for attrs, value in izip(rows, self._values()):
+                attrs[name] = value
+
+    def _values(self):
+        kind, = self._unpack("<B")
+        if kind == _BOOL:
+            return map(bool, self._ints())
+        if kind == _INT:
+            return self._ints(True).tolist()
+        if kind == _FLOAT:
+            return self._array("d", self._block()).tolist()
+        if kind == _UUID:
+            data = hexlify(self._block())
+            return [uuid_from_int(int(data[i:i + 32], 16)) for i in xrange(0, len(data), 32)]
+        if kind == _STR or kind == _UNICODE:
+            values = self._strings(self._ints(), self._block())
+            if kind == _UNICODE:
+                values = [value.decode("utf-8") for value in values]
+            return values
+        if kind == _STR_TABLE or kind == _UNICODE_TABLE:
+            table = self._table if kind == _STR_TABLE else self._unicode()
+            return [table[index] for index in self._ints()]
+        if kind == _JSON:
+            return self._json()
+        raise ValueError("Unknown column kind {} in semanticnet binary graph file".format(kind))
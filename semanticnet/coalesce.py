@@ -0,0 +1,100 @@
+import uuid
+
+# attribute of a coalesced edge holding the number of edges merged into it
+COUNT = "count"
+
+# suffixes of the attributes holding the smallest and largest value of an aggregate
+MIN_SUFFIX = ":min"
+MAX_SUFFIX = ":max"
+
+class EdgeCoalescer(object):
+    '''Merges parallel edges into one, as set up by Graph.coalesce_edges().
+
+    Two edges between the same nodes are parallel when they have equal values for
+    every identity attribute. The stored edge keeps the attributes of the first one,
+    plus COUNT, the number of edges merged into it. Each aggregate attribute holds
+    the sum of the values of the merged edges, and attr:min and attr:max their
+    smallest and largest value. These are the reserved attributes, which the edges to
+    merge may not hold.
+    '''
+    def __init__(self, identity, aggregate):
+        self.identity = tuple(sorted(identity))
+        self.aggregate = tuple(aggregate)
+        self.reserved = (COUNT,) + tuple(attr + suffix
+            for attr in self.aggregate for suffix in (MIN_SUFFIX, MAX_SUFFIX))
+        # the edge index which finds the parallel edges
+        self.index_attrs = ("src", "dst") + self.identity
+
+    def key(self, src, dst, attrs):
+        '''Returns the key of the edge from src to dst with the attributes attrs in the
+        index over index_attrs, or None if it lacks an identity attribute.'''
+        try:
+            return (src, dst) + tuple([attrs[attr] for attr in self.identity])
+        except KeyError:
+            return None
+
+    def start(self, attrs):
+        '''Returns the attributes of a new edge which the edge attrs is the first of.'''
+        attrs = dict(attrs)
+        attrs[COUNT] = 1
+        for attr in self.aggregate:
+            if attr in attrs:
+                attrs[attr + MIN_SUFFIX] = attrs[attr + MAX_SUFFIX] = attrs[attr]
+        return attrs
+
+    def merge(self, edge, attrs):
+        '''Returns the attributes of the stored edge edge which change when the edge
+        attrs is merged into it, as a dict of attribute name -> new value.'''
+        changes = {COUNT: edge.get(COUNT, 1) + 1}
+        for attr in self.aggregate:
+            if attr not in attrs:
+                continue
+            value = attrs[attr]
+            if attr not in edge:
+                changes[attr] = changes[attr + MIN_SUFFIX] = changes[attr + MAX_SUFFIX] = value
+            else:
+                changes[attr] = edge[attr] + value
+                changes[attr + MIN_SUFFIX] = min(edge.get(attr + MIN_SUFFIX, edge[attr]), value)
+                changes[attr + MAX_SUFFIX] = max(edge.get(attr + MAX_SUFFIX, edge[attr]), value)
+        return changes
+
+    def expand(self, attrs):
+        '''Returns a list of the attributes of COUNT edges which coalesce back into the
+        stored edge attrs. Only the aggregates of the original edges were kept, so they
+        are rebuilt as one edge with the smallest value, one with the largest, and the
+        rest of the sum spread evenly over the others: the count, sum, min and max of
+        the expanded edges are those of the stored edge.'''
+        count = attrs.get(COUNT, 1)
+        plain = dict((name, value) for name, value in attrs.iteritems()
+            if name != COUNT and not self._is_aggregate_extra(name))
+        expanded = [dict(plain) for i in xrange(count)]
+        for attr in self.aggregate:
+            if attr not in attrs:
+                continue
+            total = attrs[attr]
+            low = attrs.get(attr + MIN_SUFFIX, total)
+            high = attrs.get(attr + MAX_SUFFIX, total)
+            if count == 1:
+                values = [total]
+            else:
+                values = [low, high]
+                if count > 2:
+                    rest = total - low - high
+                    middle = rest / (count - 2)
+                    if middle * (count - 2) != rest:
+                        middle = float(rest) / (count - 2)
+                    values.extend([middle] * (count - 2))
+            for edge, value in zip(expanded, values):
+                edge[attr] = value
+        return expanded
+
+    def _is_aggregate_extra(self, name):
+        for attr in self.aggregate:
+            if name == attr + MIN_SUFFIX or name == attr + MAX_SUFFIX:
+                return True
+        return False
+
+def expanded_id(id_, n):
+    '''Returns a UUID for the nth edge (from 1) expanded out of the coalesced edge
+    id_, always the same for the same edge.'''
+    return uuid.uuid5(uuid.NAMESPACE_OID, "{}/{}".format(id_, n))
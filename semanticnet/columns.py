@@ -0,0 +1,375 @@
+import array
+import copy
+import sys
+import weakref
+from collections import MutableMapping
+from itertools import izip
+
+class _Missing(object):
+    '''Marks a row which has no value in a column.'''
+    def __reduce__(self):
+        return "_MISSING"
+
+    def __repr__(self):
+        return "_MISSING"
+
+_MISSING = _Missing()
+
+# row of views whose node or edge has been removed; past the end of every column
+_DEAD_ROW = sys.maxsize
+
+# string columns stay dictionary-encoded while they have fewer distinct values than
+# this, or than half of their rows
+_DICT_MIN_VALUES = 256
+
+class _ObjectColumn(object):
+    '''Fallback column holding arbitrary Python values in a list.'''
+    kind = "object"
+
+    def __init__(self, values=None):
+        self.values = [] if values is None else values
+
+    def get(self, row):
+        try:
+            return self.values[row]
+        except IndexError:
+            return _MISSING
+
+    def accepts(self, value):
+        return True
+
+    def set(self, row, value):
+        values = self.values
+        if row >= len(values):
+            values.extend([_MISSING] * (row + 1 - len(values)))
+        values[row] = value
+
+    def delete(self, row):
+        if row < len(self.values):
+            self.values[row] = _MISSING
+
+    def items(self):
+        return ((row, value) for row, value in enumerate(self.values) if value is not _MISSING)
+
+    def select(self, rows):
+        return _ObjectColumn([self.get(row) for row in rows])
+
+class _NumberColumn(object):
+    '''Packed column of ints or floats, with one byte per row marking which rows
+    have a value.'''
+    def __init__(self, type_):
+        self.type = type_
+        self.kind = type_.__name__
+        self.values = array.array('l' if type_ is int else 'd')
+        self.present = bytearray()
+
+    def get(self, row):
+        try:
+            if self.present[row]:
+                return self.values[row]
+        except IndexError:
+            pass
+        return _MISSING
+
+    def accepts(self, value):
+        return type(value) is self.type
+
+    def set(self, row, value):
+        missing = row + 1 - len(self.present)
+        if missing > 0:
+            self.values.extend(array.array(self.values.typecode, [0]) * missing)
+            self.present.extend(bytearray(missing))
+        self.values[row] = value
+        self.present[row] = 1
+
+    def delete(self, row):
+        if row < len(self.present):
+            self.present[row] = 0
+
+    def items(self):
+        return ((row, value) for row, (value, present) in enumerate(izip(self.values, self.present))
+                if present)
+
+    def select(self, rows):
+        column = _NumberColumn(self.type)
+        for new, row in enumerate(rows):
+            value = self.get(row)
+            if value is not _MISSING:
+                column.set(new, value)
+        return column
+
+class _DictColumn(object):
+    '''Dictionary-encoded column of strings: every row holds the index of its value
+    in a table of the distinct values, or -1 if it has none.'''
+    kind = "dict"
+
+    def __init__(self):
+        self.codes = array.array('i')
+        self.values = []
+        self.index = {}
+        self.count = 0
+
+    def get(self, row):
+        try:
+            code = self.codes[row]
+        except IndexError:
+            return _MISSING
+        if code < 0:
+            return _MISSING
+        return self.values[code]
+
+    def accepts(self, value):
+        if type(value) is not str and type(value) is not unicode:
+            return False
+        # once most values are distinct, the encoding only costs memory
+        return (value in self.index or len(self.values) < _DICT_MIN_VALUES
+            or len(self.values) * 2 < self.count)
+
+    def set(self, row, value):
+        code = self.index.get(value)
+        if code is None:
+            code = self.index[value] = len(self.values)
+            self.values.append(value)
+        missing = row + 1 - len(self.codes)
+        if missing > 0:
+            self.codes.extend(array.array('i', [-1]) * missing)
+        if self.codes[row] < 0:
+            self.count += 1
+        self.codes[row] = code
+
+    def delete(self, row):
+        if row < len(self.codes) and self.codes[row] >= 0:
+            self.codes[row] = -1
+            self.count -= 1
+
+    def items(self):
+        values = self.values
+        return ((row, values[code]) for row, code in enumerate(self.codes) if code >= 0)
+
+    def select(self, rows):
+        column = _DictColumn()
+        column.values = self.values
+        column.index = self.index
+        column.codes = array.array('i', (self.codes[row] if row < len(self.codes) else -1
+            for row in rows))
+        column.count = sum(1 for code in column.codes if code >= 0)
+        return column
+
+def _new_column(value):
+    '''Returns an empty column of the most compact kind able to hold value.'''
+    if type(value) is int or type(value) is float:
+        return _NumberColumn(type(value))
+    if type(value) is str or type(value) is unicode:
+        return _DictColumn()
+    return _ObjectColumn()
+
+def _promoted(column, rows):
+    '''Returns an object column holding the first rows values of column.'''
+    return _ObjectColumn([column.get(row) for row in xrange(rows)])
+
+class RowView(MutableMapping):
+    '''The attributes of a single node or edge in a ColumnStore, as a dict-like
+    object. Reads and writes go straight to the columns, so a view stays current
+    as the graph changes. Once its node or edge is removed, a view is empty.'''
+    def __init__(self, store, row):
+        self._store = store
+        self._row = row
+
+    def __getitem__(self, key):
+        return self._store.get(self._row, key)
+
+    def __setitem__(self, key, value):
+        self._store.set(self._row, key, value)
+
+    def __delitem__(self, key):
+        self._store.delete(self._row, key)
+
+    def __contains__(self, key):
+        try:
+            self._store.get(self._row, key)
+        except KeyError:
+            return False
+        return True
+
+    def __iter__(self):
+        return iter(self._store.keys(self._row))
+
+    def __len__(self):
+        return len(self._store.keys(self._row))
+
+    def iteritems(self):
+        get = self._store.get
+        row = self._row
+        return ((key, get(row, key)) for key in self._store.keys(row))
+
+    def items(self):
+        return list(self.iteritems())
+
+    def copy(self):
+        return dict(self.iteritems())
+
+    def __repr__(self):
+        return repr(self.copy())
+
+    def __copy__(self):
+        return self.copy()
+
+    def __deepcopy__(self, memo):
+        # copies are detached from the graph, just like copies of a dict would be
+        return copy.deepcopy(self.copy(), memo)
+
+    def __reduce__(self):
+        return (_row_view, (self._store, self._row))
+
+def _row_view(store, row):
+    return store._view(row)
+
+class ColumnStore(object):
+    '''Stores the attributes of the nodes or the edges of a graph column by column.
+
+    Every attribute name gets one column, indexed by row. Ints and floats are kept
+    in packed arrays, strings with few distinct values are dictionary-encoded, and
+    anything else goes in a plain list. A column falls back to a more general kind
+    the first time it is given a value it cannot hold.
+
+    The store mimics the list of attribute dicts it replaces: store[row] returns a
+    RowView (or None for a removed row), store.append(attrs) adds a row, and
+    store[row] = None removes one. The attributes named in virtual are not stored
+    at all, but computed from the row by the given method of owner; any value
+    written to them is ignored.
+    '''
+    def __init__(self, owner=None, virtual=None):
+        self.columns = {}
+        self._names = []
+        self._alive = bytearray()
+        self._owner = owner
+        self._virtual = dict(virtual or {})
+        self._virtual_names = sorted(self._virtual)
+        self._views = weakref.WeakValueDictionary()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["_views"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._views = weakref.WeakValueDictionary()
+
+    def __len__(self):
+        return len(self._alive)
+
+    def _view(self, row):
+        # look the weak reference up directly; WeakValueDictionary.get() is slow
+        ref = self._views.data.get(row)
+        view = ref() if ref is not None else None
+        if view is None:
+            view = self._views[row] = RowView(self, row)
+        return view
+
+    def __getitem__(self, row):
+        if not self._alive[row]:
+            return None
+        return self._view(row)
+
+    def __setitem__(self, row, attrs):
+        for column in self.columns.itervalues():
+            column.delete(row)
+        if attrs is None:
+            self._alive[row] = 0
+            view = self._views.pop(row, None)
+            if view is not None:
+                view._row = _DEAD_ROW
+        else:
+            self._alive[row] = 1
+            self.update(row, attrs)
+
+    def append(self, attrs):
+        row = len(self._alive)
+        self._alive.append(1)
+        self.update(row, attrs)
+        return row
+
+    def update(self, row, attrs):
+        for key, value in attrs.iteritems():
+            self.set(row, key, value)
+
+    def _check(self, row, key):
+        if row >= len(self._alive) or not self._alive[row]:
+            raise KeyError(key)
+
+    def get(self, row, key):
+        '''Returns the value of attribute key in row. Raises KeyError if it has none.'''
+        self._check(row, key)
+        column = self.columns.get(key)
+        if column is None:
+            method = self._virtual.get(key)
+            if method is None:
+                raise KeyError(key)
+            return getattr(self._owner, method)(row)
+        value = column.get(row)
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def set(self, row, key, value):
+        if key in self._virtual:
+            return
+        self._check(row, key)
+        column = self.columns.get(key)
+        if column is None:
+            column = self.columns[key] = _new_column(value)
+            self._names.append(key)
+        elif not column.accepts(value):
+            column = self.columns[key] = _promoted(column, len(self._alive))
+        column.set(row, value)
+
+    def delete(self, row, key):
+        self._check(row, key)
+        column = self.columns.get(key)
+        if column is None or column.get(row) is _MISSING:
+            raise KeyError(key)
+        column.delete(row)
+
+    def keys(self, row):
+        '''Returns the names of the attributes row has.'''
+        if row >= len(self._alive) or not self._alive[row]:
+            return []
+        columns = self.columns
+        return self._virtual_names + [
+            name for name in self._names if columns[name].get(row) is not _MISSING
+        ]
+
+    def scan(self, key):
+        '''Iterates over (row, value) for every row which has attribute key, reading
+        nothing but that attribute's column.'''
+        column = self.columns.get(key)
+        if column is not None:
+            return column.items()
+        method = self._virtual.get(key)
+        if method is None:
+            return iter(())
+        compute = getattr(self._owner, method)
+        return ((row, compute(row)) for row in xrange(len(self._alive)) if self._alive[row])
+
+    def compact(self, rows):
+        '''Keeps only the given rows, renumbered densely in the order given. Views of
+        the kept rows follow them to their new number.'''
+        for name in self._names:
+            self.columns[name] = self.columns[name].select(rows)
+        self._alive = bytearray(self._alive[row] for row in rows)
+
+        moved = dict((row, new) for new, row in enumerate(rows))
+        views = self._views
+        self._views = weakref.WeakValueDictionary()
+        for row, view in views.items():
+            if row in moved:
+                view._row = moved[row]
+                self._views[view._row] = view
+            else:
+                view._row = _DEAD_ROW
+
+    def column_kinds(self):
+        '''Returns a dict mapping each attribute name to the kind of its column:
+        "int", "float", "dict" (dictionary-encoded strings) or "object".'''
+        return dict((name, column.kind) for name, column in self.columns.iteritems())
@@ -0,0 +1,88 @@
+class CopyOnWrite(object):
+    '''Tracks which parts of a networkx storage graph a Graph owns, when it shares its
+    storage with copies of itself, see Graph.copy().
+
+    Nothing is copied until the graph is first written to. unshare() then copies the
+    top-level tables of the storage graph: they only hold references, but have an
+    entry per node, so this first write takes time and memory proportional to the
+    number of nodes. Every further write copies the node, adjacency row, edge bundle
+    (the dict of edges between two nodes) or edge it touches, the first time it does.
+    The attributes and adjacency rows stay shared with the copies, which never write
+    to them either.
+    '''
+    def __init__(self, directed):
+        self.directed = directed
+        self.unshared = False
+        self._nodes = set()
+        self._rows = set()
+        self._pred_rows = set()
+        self._bundles = set()
+        self._edges = set()
+
+    def unshare(self, g):
+        '''Returns a storage graph with the same contents as g, with its own top-level
+        tables.'''
+        self.unshared = True
+        copied = g.__class__.__new__(g.__class__)
+        copied.__dict__.update(g.__dict__)
+        copied.graph = dict(g.graph)
+        copied.node = dict(g.node)
+        copied.adj = dict(g.adj)
+        copied.edge = copied.adj
+        if self.directed:
+            copied.succ = copied.adj
+            copied.pred = dict(g.pred)
+        return copied
+
+    def node(self, g, id_):
+        '''Makes the attributes of node id_ in g (if it exists) its own.'''
+        if id_ not in self._nodes and id_ in g.node:
+            g.node[id_] = dict(g.node[id_])
+            self._nodes.add(id_)
+
+    def added_node(self, id_):
+        '''Records that node id_ was added with attributes nobody else holds.'''
+        self._nodes.add(id_)
+
+    def _row(self, g, u):
+        if u not in self._rows and u in g.adj:
+            g.adj[u] = dict(g.adj[u])
+            self._rows.add(u)
+
+    def _pred_row(self, g, v):
+        if v not in self._pred_rows and v in g.pred:
+            g.pred[v] = dict(g.pred[v])
+            self._pred_rows.add(v)
+
+    def bundle(self, g, u, v):
+        '''Makes the adjacency rows of u and v, and the bundle of edges from u to v (if
+        there are any), its own, so that edges between u and v can be added or removed.'''
+        self._row(g, u)
+        if self.directed:
+            self._pred_row(g, v)
+        else:
+            self._row(g, v)
+        if (u, v) in self._bundles or v not in g.adj.get(u, ()):
+            return
+        # the bundle is shared between both rows, so both must hold the copy
+        bundle = dict(g.adj[u][v])
+        g.adj[u][v] = bundle
+        if self.directed:
+            g.pred[v][u] = bundle
+        else:
+            g.adj[v][u] = bundle
+            self._bundles.add((v, u))
+        self._bundles.add((u, v))
+
+    def edge(self, g, edges, u, v, id_):
+        '''Makes the attributes of edge id_, from u to v, its own, in g as well as in
+        edges, the Graph's table of edge ID -> attributes.'''
+        self.bundle(g, u, v)
+        if id_ in self._edges:
+            return
+        bundle = g.adj.get(u, {}).get(v, {})
+        if id_ in bundle:
+            attrs = dict(bundle[id_])
+            bundle[id_] = attrs
+            edges[id_] = attrs
+        self._edges.add(id_)
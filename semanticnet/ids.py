@@ -0,0 +1,347 @@
+import json
+import os
+import re
+import time
+import uuid
+from binascii import hexlify, unhexlify
+
+def uuid_from_int(value):
+    '''Returns the UUID whose 128-bit integer value is value, skipping the argument
+    parsing of uuid.UUID(), which dominates the cost of creating one.'''
+    id_ = _new_uuid(uuid.UUID)
+    id_.__dict__['int'] = value
+    return id_
+
+_new_uuid = object.__new__
+
+# random bytes are read from the OS in blocks of this many UUIDs
+_RANDOM_POOL_SIZE = 256
+_random_pool = []
+_random_pool_pid = None
+
+def random_uuid4():
+    '''Same as uuid.uuid4(), but draws the random bits from a pool refilled in blocks.
+    The pool is dropped in forked children, so they never share IDs with their parent.'''
+    global _random_pool_pid
+    if not _random_pool or _random_pool_pid != os.getpid():
+        _random_pool_pid = os.getpid()
+        bits = hexlify(os.urandom(16 * _RANDOM_POOL_SIZE))
+        _random_pool[:] = [int(bits[i:i + 32], 16) for i in xrange(0, len(bits), 32)]
+    value = _random_pool.pop()
+    # set the version (4) and variant (RFC 4122) bits, as uuid.UUID(version=4) does
+    value &= ~((0xf000 << 64) | (0xc000 << 48))
+    value |= (4 << 76) | (0x8000 << 48)
+    return uuid_from_int(value)
+
+def pack_uuid(id_):
+    '''Returns the 16-byte big-endian representation of the UUID id_.'''
+    return unhexlify('%032x' % id_.int)
+
+def unpack_uuid(packed):
+    '''Inverse of pack_uuid().'''
+    return uuid_from_int(int(hexlify(packed), 16))
+
+class IdTable(object):
+    '''Interns external node or edge IDs as dense integer handles.
+
+    Each distinct ID is given the next free integer the first time it is seen,
+    and keeps it for as long as it stays in the table. Handles are never reused,
+    so they are safe to store in packed arrays.
+
+    UUIDs are stored as their 128-bit integer value rather than as uuid.UUID
+    objects, which are both much larger and much slower to hash: the integer is
+    smaller than even their packed 16-byte form, and is hashed in C. Any other
+    hashable ID (str, int, ...) is stored as-is, in a separate namespace so that
+    an integer ID can never collide with a UUID.
+    '''
+
+    def __init__(self):
+        self._uuid_handles = {}
+        self._other_handles = {}
+        self._keys = []
+        self._is_uuid = bytearray()
+        self._size = 0
+
+    def _slot(self, id_):
+        '''Returns the namespace and key under which id_ is stored.'''
+        if type(id_) is uuid.UUID:
+            return self._uuid_handles, id_.int
+        return self._other_handles, id_
+
+    def lookup(self, id_):
+        '''Returns the handle of id_, or None if it is not in the table.'''
+        handles, key = self._slot(id_)
+        return handles.get(key)
+
+    def intern(self, id_):
+        '''Returns the handle of id_, adding it to the table if necessary.'''
+        handles, key = self._slot(id_)
+        handle = handles.get(key)
+        if handle is None:
+            handle = len(self._keys)
+            handles[key] = handle
+            self._keys.append(key)
+            self._is_uuid.append(handles is self._uuid_handles)
+            self._size += 1
+        return handle
+
+    def discard(self, id_):
+        '''Removes id_ from the table. Its handle is retired, not recycled.'''
+        handle = self.lookup(id_)
+        if handle is not None:
+            self.discard_handle(handle)
+        return handle
+
+    def discard_handle(self, handle):
+        '''Removes the ID with the given handle from the table.'''
+        key = self._keys[handle]
+        if key is None:
+            raise KeyError(handle)
+        del (self._uuid_handles if self._is_uuid[handle] else self._other_handles)[key]
+        self._keys[handle] = None
+        self._size -= 1
+
+    def external(self, handle):
+        '''Returns the external ID for handle.'''
+        key = self._keys[handle]
+        if key is None:
+            raise KeyError(handle)
+        if self._is_uuid[handle]:
+            return uuid_from_int(key)
+        return key
+
+    def select(self, handles):
+        '''Returns a new table holding only the given handles' IDs, renumbered densely
+        in the order given.'''
+        table = IdTable()
+        for handle in handles:
+            key = self._keys[handle]
+            is_uuid = self._is_uuid[handle]
+            namespace = table._uuid_handles if is_uuid else table._other_handles
+            namespace[key] = len(table._keys)
+            table._keys.append(key)
+            table._is_uuid.append(is_uuid)
+        table._size = len(table._keys)
+        return table
+
+    def alive(self, handle):
+        return 0 <= handle < len(self._keys) and self._keys[handle] is not None
+
+    def handles(self):
+        '''Iterates over the handles of every ID in the table, in insertion order.'''
+        keys = self._keys
+        return (h for h in xrange(len(keys)) if keys[h] is not None)
+
+    def capacity(self):
+        '''One more than the largest handle ever given out.'''
+        return len(self._keys)
+
+    def __contains__(self, id_):
+        return self.lookup(id_) is not None
+
+    def __iter__(self):
+        return (self.external(h) for h in self.handles())
+
+    def __len__(self):
+        return self._size
+
+### ID kinds
+# Each kind pairs a function which turns an ID given by the user (or read from a
+# file) into the ID stored in the graph, with one which turns a stored ID into
+# its JSON representation. Graphs pick theirs once, at construction.
+
+# the form save_json() writes UUIDs in, which is parsed without uuid.UUID()
+_is_hex_uuid = re.compile(r'[0-9a-fA-F]{32}\Z').match
+
+# the strings a counter gives with id_kind "str"
+_is_decimal = re.compile(r'[0-9]+\Z').match
+
+def extract_auto_id(id_):
+    '''Parse a UUID out of the string id_. Any other ID is returned as-is.'''
+    if type(id_) is not str and type(id_) is not unicode:
+        return id_
+    if _is_hex_uuid(id_):
+        return uuid_from_int(int(id_, 16))
+    try:
+        return uuid.UUID(id_)
+    except ValueError:
+        return id_
+
+def extract_uuid_id(id_):
+    if type(id_) is uuid.UUID or id_ is None:
+        return id_
+    if (type(id_) is str or type(id_) is unicode) and _is_hex_uuid(id_):
+        return uuid_from_int(int(id_, 16))
+    return uuid.UUID(id_)
+
+def extract_str_id(id_):
+    if type(id_) is str or type(id_) is unicode or id_ is None:
+        return id_
+    return str(id_)
+
+def extract_int_id(id_):
+    if type(id_) is int or id_ is None:
+        return id_
+    return int(id_)
+
+def export_auto_id(id_):
+    if type(id_) is uuid.UUID:
+        return id_.hex
+    return id_
+
+def export_uuid_id(id_):
+    return id_.hex
+
+def export_plain_id(id_):
+    return id_
+
+# Generators create either UUIDs or plain integers; these coerce them to the kind.
+
+def generated_auto_id(id_):
+    return id_
+
+def generated_uuid_id(id_):
+    if type(id_) is uuid.UUID:
+        return id_
+    return uuid_from_int(id_)
+
+def generated_str_id(id_):
+    if type(id_) is uuid.UUID:
+        return id_.hex
+    return str(id_)
+
+def generated_int_id(id_):
+    if type(id_) is uuid.UUID:
+        return id_.int
+    return id_
+
+ID_KINDS = {
+    "auto": (extract_auto_id, export_auto_id, generated_auto_id),
+    "uuid": (extract_uuid_id, export_uuid_id, generated_uuid_id),
+    "str": (extract_str_id, export_plain_id, generated_str_id),
+    "int": (extract_int_id, export_plain_id, generated_int_id),
+}
+
+### ID generators
+
+class IdGenerator(object):
+    '''Base class for the strategies a graph uses to create IDs for new nodes and edges.
+
+    Generators return either UUIDs or integers; the graph converts them to its
+    id_kind.
+    '''
+    def node_id(self, graph, data):
+        '''Returns an ID for a new node of graph with the attributes data.'''
+        raise NotImplementedError
+
+    def edge_id(self, graph, src, dst, data):
+        '''Returns an ID for a new edge of graph from src to dst with the attributes data.'''
+        raise NotImplementedError
+
+    def seen(self, id_):
+        '''Called with every ID given explicitly by the user.'''
+        pass
+
+class RandomIdGenerator(IdGenerator):
+    '''Random (version 4) UUIDs, checked against the graph for collisions. This is
+    the default for every id_kind except "int".'''
+    def node_id(self, graph, data):
+        return graph._create_uuid()
+
+    def edge_id(self, graph, src, dst, data):
+        return graph._create_uuid()
+
+class CounterIdGenerator(IdGenerator):
+    '''Consecutive integers, shared by nodes and edges. Integer IDs given explicitly
+    by the user, and strings of digits (which is what the counter gives with id_kind
+    "str"), move the counter past them, so no collision check is needed. This is the
+    default for id_kind "int".'''
+    def __init__(self, start=0):
+        self.next = start
+
+    def node_id(self, graph, data):
+        id_ = self.next
+        self.next += 1
+        return id_
+
+    def edge_id(self, graph, src, dst, data):
+        return self.node_id(graph, data)
+
+    def seen(self, id_):
+        if type(id_) is str or type(id_) is unicode:
+            if not _is_decimal(id_):
+                return
+            id_ = int(id_)
+        elif type(id_) is not int and type(id_) is not long:
+            return
+        if id_ >= self.next:
+            self.next = id_ + 1
+
+class UlidGenerator(IdGenerator):
+    '''Time-ordered 128-bit IDs in the style of ULIDs: the milliseconds since the
+    epoch in the top 48 bits, followed by 80 random bits. Within a millisecond, the
+    random part is incremented instead of redrawn, so sorting the IDs sorts them in
+    creation order.'''
+    def __init__(self, clock=time.time):
+        self._clock = clock
+        self._last_ms = -1
+        self._last_rand = 0
+
+    def _next(self):
+        ms = int(self._clock() * 1000)
+        if ms > self._last_ms:
+            rand = int(hexlify(os.urandom(10)), 16)
+        else:
+            ms = self._last_ms
+            rand = self._last_rand + 1
+            if rand >> 80:
+                ms += 1
+                rand = 0
+        self._last_ms = ms
+        self._last_rand = rand
+        return uuid_from_int((ms << 80) | rand)
+
+    def node_id(self, graph, data):
+        return self._next()
+
+    def edge_id(self, graph, src, dst, data):
+        return self._next()
+
+def _canonical_value(value):
+    if type(value) is uuid.UUID:
+        return value.hex
+    return str(value)
+
+class ContentIdGenerator(IdGenerator):
+    '''Derives IDs from content, so that the same node or edge gets the same ID in
+    every graph it appears in. Graphs built this way, such as daily snapshots of the
+    same data, can be compared directly with sn.diff().
+
+    Node IDs are name-based (version 5) UUIDs of the node_attrs attributes. Edge
+    IDs cover the source and destination IDs, and the edge_attrs attributes. Nodes
+    or edges which agree on all of those are considered the same: adding one again
+    updates the existing one.
+    '''
+    NAMESPACE = uuid.UUID('4f0d3a4c5a4b4ab09d8e5c1a6f0e2b7d')
+
+    def __init__(self, node_attrs=("label", "type"), edge_attrs=("type",), namespace=NAMESPACE):
+        self.node_attrs = tuple(node_attrs)
+        self.edge_attrs = tuple(edge_attrs)
+        self.namespace = namespace
+
+    def _hash(self, prefix, values):
+        name = json.dumps(values, separators=(",", ":"), default=_canonical_value)
+        return uuid.uuid5(self.namespace, prefix + name)
+
+    def node_id(self, graph, data):
+        return self._hash("node:", [data.get(attr) for attr in self.node_attrs])
+
+    def edge_id(self, graph, src, dst, data):
+        return self._hash("edge:", [src, dst] + [data.get(attr) for attr in self.edge_attrs])
+
+ID_GENERATORS = {
+    "random": RandomIdGenerator,
+    "counter": CounterIdGenerator,
+    "ulid": UlidGenerator,
+    "content": ContentIdGenerator,
+}
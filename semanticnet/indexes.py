@@ -0,0 +1,509 @@
+import copy
+import sys
+from bisect import bisect_left, bisect_right, insort
+from collections import Mapping
+from itertools import count
+from columns import _MISSING
+
+def index_name(attr):
+    '''Returns the name an index over attr is registered under: the attribute itself,
+    or a tuple of attributes for a composite index.'''
+    if isinstance(attr, (list, tuple)):
+        attr = tuple(attr)
+        return attr[0] if len(attr) == 1 else attr
+    return attr
+
+class _Bucket(object):
+    '''The IDs sharing one key, with a hash of their positions so that any of them can
+    be removed in constant time. IDs are kept in insertion order, except that removing
+    one moves the last ID into its place.'''
+    __slots__ = ("ids", "pos")
+
+    def __init__(self, ids):
+        self.ids = ids
+        self.pos = dict((id_, i) for i, id_ in enumerate(ids))
+
+    def add(self, id_):
+        self.pos[id_] = len(self.ids)
+        self.ids.append(id_)
+
+    def remove(self, id_):
+        # move the last ID into the hole
+        i = self.pos.pop(id_)
+        last = self.ids.pop()
+        if i < len(self.ids):
+            self.ids[i] = last
+            self.pos[last] = i
+
+class HashIndex(object):
+    '''Maps each value of an attribute, or each combination of values of several
+    attributes for a composite index, to the IDs of the items which have it.
+
+    Items are added, moved and removed in constant time. Keys held by a single item
+    map straight to its ID; only shared keys get a _Bucket. With unique=True, no two
+    items may share a key.
+    '''
+    kind = "hash"
+
+    def __init__(self, attrs, unique=False):
+        self.attrs = tuple(attrs)
+        self.unique = unique
+        # False when items were left out, e.g. when the index was not built from them
+        self.complete = True
+        self._buckets = {}
+        self._keys = {}
+
+    def key(self, attrs):
+        '''Returns the key of an item with the attributes attrs, or _MISSING if it lacks
+        any of the indexed attributes.'''
+        if len(self.attrs) == 1:
+            return attrs.get(self.attrs[0], _MISSING)
+        try:
+            return tuple([attrs[attr] for attr in self.attrs])
+        except KeyError:
+            return _MISSING
+
+    def add(self, id_, attrs):
+        if id_ in self._keys:
+            self.discard(id_)
+        key = self.key(attrs)
+        if key is _MISSING:
+            return
+        self._keys[id_] = key
+        bucket = self._buckets.get(key, _MISSING)
+        if bucket is _MISSING:
+            self._buckets[key] = id_
+        elif type(bucket) is _Bucket:
+            bucket.add(id_)
+        else:
+            self._buckets[key] = _Bucket([bucket, id_])
+
+    def discard(self, id_):
+        key = self._keys.pop(id_, _MISSING)
+        if key is _MISSING:
+            return
+        bucket = self._buckets[key]
+        if type(bucket) is _Bucket:
+            bucket.remove(id_)
+            if len(bucket.ids) == 1:
+                self._buckets[key] = bucket.ids[0]
+        else:
+            del self._buckets[key]
+
+    def update(self, id_, attrs):
+        '''Moves item id_ to the key for its new attributes attrs.'''
+        key = self.key(attrs)
+        old = self._keys.get(id_, _MISSING)
+        if old is not _MISSING and key is not _MISSING and old == key:
+            return
+        self.add(id_, attrs)
+
+    def conflicts(self, id_, attrs):
+        '''Returns True if this is a unique index, and an item other than id_ already
+        has the key of attrs.'''
+        if not self.unique:
+            return False
+        key = self.key(attrs)
+        if key is _MISSING:
+            return False
+        holder = self._buckets.get(key, _MISSING)
+        return holder is not _MISSING and holder != id_
+
+    def ids(self, key):
+        '''Returns the IDs of the items with the given key, see _Bucket for their order.'''
+        try:
+            bucket = self._buckets.get(key, _MISSING)
+        except TypeError: # unhashable keys can't be in the index
+            return []
+        if bucket is _MISSING:
+            return []
+        if type(bucket) is _Bucket:
+            return list(bucket.ids)
+        return [bucket]
+
+    def get(self, key, default=None):
+        '''Returns the ID of the first item with the given key, or default.'''
+        try:
+            bucket = self._buckets.get(key, _MISSING)
+        except TypeError:
+            return default
+        if bucket is _MISSING:
+            return default
+        return bucket.ids[0] if type(bucket) is _Bucket else bucket
+
+    def count(self, key):
+        '''Returns the number of items with the given key.'''
+        try:
+            bucket = self._buckets.get(key, _MISSING)
+        except TypeError:
+            return 0
+        if bucket is _MISSING:
+            return 0
+        return len(bucket.ids) if type(bucket) is _Bucket else 1
+
+    def keys(self):
+        return self._buckets.keys()
+
+    def __contains__(self, key):
+        return key in self._buckets
+
+    def __len__(self):
+        return len(self._buckets)
+
+    def clear(self):
+        self._buckets = {}
+        self._keys = {}
+
+    def copy(self):
+        '''Returns an index holding the same items, which can change independently.'''
+        copied = copy.copy(self)
+        copied._buckets = dict((key, _Bucket(list(bucket.ids)) if type(bucket) is _Bucket else bucket)
+            for key, bucket in self._buckets.iteritems())
+        copied._keys = dict(self._keys)
+        return copied
+
+# sorts after every insertion sequence number, see SortedIndex
+_AFTER = float("inf")
+
+class _SortedList(object):
+    '''A sorted list kept as a list of sorted sublists of at most 2 * _LOAD values,
+    so that inserting or removing a value only shifts the values of one sublist.
+    _maxes holds the last value of each sublist.'''
+    _LOAD = 512
+
+    def __init__(self):
+        self._lists = []
+        self._maxes = []
+
+    def __len__(self):
+        return sum(len(sub) for sub in self._lists)
+
+    def copy(self):
+        copied = _SortedList()
+        copied._lists = [list(sub) for sub in self._lists]
+        copied._maxes = list(self._maxes)
+        return copied
+
+    def add(self, value):
+        lists, maxes = self._lists, self._maxes
+        if not maxes:
+            lists.append([value])
+            maxes.append(value)
+            return
+        pos = bisect_right(maxes, value)
+        if pos == len(maxes):
+            pos -= 1
+            lists[pos].append(value)
+            maxes[pos] = value
+        else:
+            insort(lists[pos], value)
+        if len(lists[pos]) > 2 * self._LOAD:
+            sub = lists[pos]
+            lists[pos:pos + 1] = [sub[:self._LOAD], sub[self._LOAD:]]
+            maxes[pos:pos + 1] = [sub[self._LOAD - 1], sub[-1]]
+
+    def remove(self, value):
+        lists, maxes = self._lists, self._maxes
+        pos = bisect_left(maxes, value)
+        sub = lists[pos]
+        del sub[bisect_left(sub, value)]
+        if sub:
+            maxes[pos] = sub[-1]
+        else:
+            del lists[pos]
+            del maxes[pos]
+
+    def _position(self, value, right):
+        '''Returns the (sublist, offset) position at which value would be inserted,
+        after any equal values if right is True.'''
+        bisect = bisect_right if right else bisect_left
+        pos = bisect(self._maxes, value)
+        if pos == len(self._maxes):
+            return pos, 0
+        return pos, bisect(self._lists[pos], value)
+
+    def count(self, start, stop):
+        '''Returns the number of values from position start up to position stop.'''
+        (first, i), (last, j) = start, stop
+        if stop <= start:
+            return 0
+        if first == last:
+            return j - i
+        return len(self._lists[first]) - i + sum(len(sub) for sub in self._lists[first + 1:last]) + j
+
+    def slice(self, start, stop, reverse=False):
+        '''Iterates over the values from position start up to position stop, or the
+        other way around if reverse is True.'''
+        lists = self._lists
+        (first, i), (last, j) = start, stop
+        positions = xrange(first, min(last, len(lists) - 1) + 1)
+        for pos in (reversed(positions) if reverse else positions):
+            sub = lists[pos]
+            lo = i if pos == first else 0
+            hi = j if pos == last else len(sub)
+            if reverse:
+                for k in xrange(hi - 1, lo - 1, -1):
+                    yield sub[k]
+            else:
+                for k in xrange(lo, hi):
+                    yield sub[k]
+
+class SortedIndex(HashIndex):
+    '''A HashIndex which also keeps its items ordered by key, to answer range queries
+    and iterate in key order. Finding the first item of a range is logarithmic, each
+    following item constant time.
+
+    Items are held as (key, sequence number, ID) triples, so that items sharing a key
+    stay in insertion order, and IDs never get compared.
+    '''
+    kind = "sorted"
+
+    def __init__(self, attrs, unique=False):
+        HashIndex.__init__(self, attrs, unique)
+        self._sorted = _SortedList()
+        self._seqs = {}
+        self._counter = count()
+
+    def add(self, id_, attrs):
+        HashIndex.add(self, id_, attrs)
+        key = self._keys.get(id_, _MISSING)
+        if key is not _MISSING:
+            seq = self._seqs[id_] = next(self._counter)
+            self._sorted.add((key, seq, id_))
+
+    def discard(self, id_):
+        key = self._keys.get(id_, _MISSING)
+        if key is not _MISSING:
+            self._sorted.remove((key, self._seqs.pop(id_), id_))
+        HashIndex.discard(self, id_)
+
+    def _bounds(self, low, high, low_inclusive, high_inclusive):
+        sorted_ = self._sorted
+        if low is _MISSING:
+            start = (0, 0)
+        else:
+            start = sorted_._position((low,) if low_inclusive else (low, _AFTER), False)
+        if high is _MISSING:
+            stop = (len(sorted_._lists), 0)
+        else:
+            stop = sorted_._position((high, _AFTER) if high_inclusive else (high,), False)
+        return start, stop
+
+    def range(self, low=_MISSING, high=_MISSING, low_inclusive=True, high_inclusive=True,
+            reverse=False):
+        '''Iterates over the IDs of the items with a key between low and high, in key
+        order, or in reverse key order if reverse is True. Either bound may be left
+        out.'''
+        start, stop = self._bounds(low, high, low_inclusive, high_inclusive)
+        if stop < start:
+            return iter(())
+        return (id_ for key, seq, id_ in self._sorted.slice(start, stop, reverse))
+
+    def range_count(self, low=_MISSING, high=_MISSING, low_inclusive=True, high_inclusive=True):
+        '''Returns the number of items range() would iterate over, without visiting
+        them.'''
+        return self._sorted.count(*self._bounds(low, high, low_inclusive, high_inclusive))
+
+    def clear(self):
+        HashIndex.clear(self)
+        self._sorted = _SortedList()
+        self._seqs = {}
+
+    def copy(self):
+        copied = HashIndex.copy(self)
+        copied._sorted = self._sorted.copy()
+        copied._seqs = dict(self._seqs)
+        # both go on from the same sequence number
+        seq = next(self._counter)
+        self._counter = count(seq)
+        copied._counter = count(seq)
+        return copied
+
+# length of the substrings of the keys a TextIndex keeps track of
+_GRAM = 3
+
+def _prefix_end(prefix):
+    '''Returns the lowest string greater than every string starting with prefix, or
+    _MISSING if there is none.'''
+    char = unichr if type(prefix) is unicode else chr
+    prefix = prefix.rstrip(char(sys.maxunicode if char is unichr else 255))
+    if not prefix:
+        return _MISSING
+    return prefix[:-1] + char(ord(prefix[-1]) + 1)
+
+class TextIndex(SortedIndex):
+    '''A SortedIndex over string values which also finds the items whose value starts
+    with, or contains, a given string.
+
+    Prefixes are found by range in the sorted keys. For substrings, the index maps
+    every 3 character substring of the distinct keys to the keys containing it: the
+    keys containing a longer string are among those containing all of its 3
+    character substrings. Shorter strings are looked for in every distinct key.
+    Values which are not strings are only indexed as in a SortedIndex.
+    '''
+    kind = "text"
+
+    def __init__(self, attrs, unique=False):
+        SortedIndex.__init__(self, attrs, unique)
+        self._grams = {}
+
+    @staticmethod
+    def _grams_of(key):
+        return set(key[i:i + _GRAM] for i in xrange(len(key) - _GRAM + 1))
+
+    def add(self, id_, attrs):
+        SortedIndex.add(self, id_, attrs)
+        key = self._keys.get(id_, _MISSING)
+        if isinstance(key, basestring) and self.count(key) == 1:
+            for gram in self._grams_of(key):
+                self._grams.setdefault(gram, set()).add(key)
+
+    def discard(self, id_):
+        key = self._keys.get(id_, _MISSING)
+        SortedIndex.discard(self, id_)
+        if isinstance(key, basestring) and self.count(key) == 0:
+            for gram in self._grams_of(key):
+                keys = self._grams[gram]
+                keys.discard(key)
+                if not keys:
+                    del self._grams[gram]
+
+    def prefix(self, prefix):
+        '''Iterates over the IDs of the items whose value starts with prefix, in value
+        order.'''
+        return self.range(low=prefix, high=_prefix_end(prefix), high_inclusive=False)
+
+    def prefix_count(self, prefix):
+        return self.range_count(low=prefix, high=_prefix_end(prefix), high_inclusive=False)
+
+    def substring_keys(self, substring):
+        '''Returns the values which contain substring.'''
+        if len(substring) < _GRAM:
+            keys = self._buckets
+        else:
+            sets = []
+            for gram in self._grams_of(substring):
+                keys = self._grams.get(gram)
+                if keys is None:
+                    return []
+                sets.append(keys)
+            sets.sort(key=len)
+            keys = sets[0].intersection(*sets[1:])
+        return [key for key in keys if isinstance(key, basestring) and substring in key]
+
+    def substring(self, substring):
+        '''Iterates over the IDs of the items whose value contains substring.'''
+        return (id_ for key in self.substring_keys(substring) for id_ in self.ids(key))
+
+    def clear(self):
+        SortedIndex.clear(self)
+        self._grams = {}
+
+    def copy(self):
+        copied = SortedIndex.copy(self)
+        copied._grams = dict((gram, set(keys)) for gram, keys in self._grams.iteritems())
+        return copied
+
+INDEX_KINDS = {
+    "hash": HashIndex,
+    "sorted": SortedIndex,
+    "text": TextIndex,
+}
+
+class IndexSet(object):
+    '''The secondary indexes over the nodes, or over the edges, of one graph, keyed
+    by index_name(). Every change to an item is routed only to the indexes covering
+    the attributes involved.'''
+    def __init__(self):
+        self.indexes = {}
+        self.unique = []
+        self._by_attr = {}
+
+    def __nonzero__(self):
+        return bool(self.indexes)
+
+    def get(self, name):
+        return self.indexes.get(name)
+
+    def add(self, name, index):
+        if name in self.indexes:
+            self.remove(name)
+        self.indexes[name] = index
+        for attr in index.attrs:
+            self._by_attr.setdefault(attr, []).append(index)
+        if index.unique:
+            self.unique.append(index)
+
+    def remove(self, name):
+        index = self.indexes.pop(name)
+        for attr in index.attrs:
+            self._by_attr[attr].remove(index)
+            if not self._by_attr[attr]:
+                del self._by_attr[attr]
+        if index.unique:
+            self.unique.remove(index)
+
+    def clear(self):
+        self.indexes = {}
+        self.unique = []
+        self._by_attr = {}
+
+    def copy(self):
+        '''Returns a copy of every index, see HashIndex.copy().'''
+        copied = IndexSet()
+        for name, index in self.indexes.iteritems():
+            copied.add(name, index.copy())
+        return copied
+
+    def insert(self, id_, attrs):
+        for index in self.indexes.itervalues():
+            index.add(id_, attrs)
+
+    def discard(self, id_):
+        for index in self.indexes.itervalues():
+            index.discard(id_)
+
+    def update(self, id_, attr_name, attrs):
+        '''Moves item id_ in every index over attr_name, after that attribute changed.'''
+        for index in self._by_attr.get(attr_name, ()):
+            index.update(id_, attrs)
+
+    def conflict(self, id_, attrs, attr_name=None):
+        '''Returns the first unique index in which attrs would clash with another item,
+        or None. If attr_name is given, only the indexes over it are checked.'''
+        for index in self.unique:
+            if (attr_name is None or attr_name in index.attrs) and index.conflicts(id_, attrs):
+                return index
+        return None
+
+    def batch_conflict(self, items):
+        '''Same as conflict(), for a whole list of (ID, attributes) items about to be
+        added together: they must not clash with each other either. Returns the
+        offending index and key, or (None, None).'''
+        for index in self.unique:
+            seen = {}
+            for id_, attrs in items:
+                key = index.key(attrs)
+                if key is _MISSING:
+                    continue
+                if index.conflicts(id_, attrs) or seen.setdefault(key, id_) != id_:
+                    return index, key
+        return None, None
+
+class IndexView(Mapping):
+    '''Read-only mapping of key -> list of item attributes over one index.'''
+    def __init__(self, index, get_item):
+        self._index = index
+        self._get_item = get_item
+
+    def __getitem__(self, key):
+        ids = self._index.ids(key)
+        if not ids:
+            raise KeyError(key)
+        return [self._get_item(id_) for id_ in ids]
+
+    def __iter__(self):
+        return iter(self._index.keys())
+
+    def __len__(self):
+        return len(self._index)
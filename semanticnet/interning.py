@@ -0,0 +1,66 @@
+import sys
+from collections import defaultdict
+
+class Interner(object):
+    '''Makes equal attribute names, and equal string values of the attributes in
+    values, share a single object, as set up by Graph.intern_attributes().
+
+    Strings are pooled by type, so that a unicode value is never swapped for an equal
+    str one, or the other way round.
+    '''
+    def __init__(self, values=()):
+        self.values = set(values)
+        self._pools = {str: {}, unicode: {}}
+
+    def copy(self):
+        '''Returns an Interner with its own set of values, sharing the string pools.'''
+        copied = Interner(self.values)
+        copied._pools = self._pools
+        return copied
+
+    def intern(self, value):
+        '''Returns the pooled string equal to value, or value itself if it is not a
+        string.'''
+        pool = self._pools.get(type(value))
+        if pool is None:
+            return value
+        return pool.setdefault(value, value)
+
+    def attrs(self, data):
+        '''Returns a copy of the attributes data, with interned names and values.'''
+        pools = self._pools
+        values = self.values
+        interned = {}
+        for name, value in data.iteritems():
+            pool = pools.get(type(name))
+            if pool is not None:
+                name = pool.setdefault(name, name)
+            if name in values:
+                pool = pools.get(type(value))
+                if pool is not None:
+                    value = pool.setdefault(value, value)
+            interned[name] = value
+        return interned
+
+def memory_report(items, skip=()):
+    '''Returns a dict of attribute name -> number of bytes saved by sharing string
+    objects, for the attribute names and the string values of the attribute dicts in
+    items. The savings are measured against a copy of every string per item, whether
+    strings were shared by an Interner or otherwise.
+    '''
+    referenced = defaultdict(int)
+    objects = defaultdict(dict)
+    getsizeof = sys.getsizeof
+    for attrs in items:
+        for name, value in attrs.iteritems():
+            if name in skip:
+                continue
+            shared = objects[name]
+            size = getsizeof(name)
+            referenced[name] += size
+            shared[id(name)] = size
+            if isinstance(value, basestring):
+                size = getsizeof(value)
+                referenced[name] += size
+                shared[id(value)] = size
+    return dict((name, referenced[name] - sum(objects[name].itervalues())) for name in referenced)
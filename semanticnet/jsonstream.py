@@ -0,0 +1,217 @@
+import json
+import re
+import uuid
+from json.encoder import encode_basestring_ascii
+from serializers import encode_default, get_serializer
+
+def _section_order():
+    '''Returns the names of the sections of a saved graph, in the order json.dump() wrote
+    them when save_json() built the whole graph as a dict: readers may rely on it.'''
+    graph = dict()
+    for name in ["meta", "nodes", "edges", "timeline"]:
+        graph[name] = None
+    return list(graph)
+
+SECTIONS = _section_order()
+
+# how json encodes the values which attributes mostly hold, by exact type; floats are
+# left to the encoder, which takes care of nan and infinity
+_SCALARS = {
+    str: encode_basestring_ascii,
+    unicode: encode_basestring_ascii,
+    int: str,
+    long: str,
+    bool: lambda value: "true" if value else "false",
+    type(None): lambda value: "null",
+    uuid.UUID: lambda value: '"' + value.hex + '"',
+}
+
+class JsonGraphWriter(object):
+    '''Writes a graph to a file in the JSON format of Graph.save_json(), one node or edge
+    at a time, so that the file is never held in memory as a whole.
+
+    The output is the same, byte for byte, as json.dump(graph, outfile, indent=True)
+    of the graph as a dict of meta, nodes, edges and timeline, with UUIDs as hex (see
+    encode_default()), or as json.dump(graph, outfile) if compact is True. Given a
+    serializer other than "json" (see get_serializer()), the items are encoded by it,
+    unindented. Encoded items are written out in chunks of chunk_size.
+    '''
+    def __init__(self, outfile, compact=False, chunk_size=1000, serializer="json"):
+        self.outfile = outfile
+        self.serializer = get_serializer(serializer)
+        self.indent = None if compact or self.serializer.name != "json" else 1
+        self.chunk_size = chunk_size
+        self._encoder = json.JSONEncoder(indent=self.indent, default=encode_default)
+        self._scalar_encoder = json.JSONEncoder(default=encode_default)
+
+    def _newline(self, level):
+        if self.indent is None:
+            return ""
+        return "\n" + " " * (self.indent * level)
+
+    def encode(self, value, level=0):
+        '''Returns value encoded as it appears nested level deep in the file.'''
+        if self.indent is None:
+            return self.serializer.dumps(value)
+        if type(value) is dict:
+            text = self._encode_flat_dict(value, level)
+            if text is not None:
+                return text
+        text = self._encoder.encode(value)
+        if self.indent is not None and level:
+            # strings are escaped, so every newline is one of the encoder's
+            text = text.replace("\n", self._newline(level))
+        return text
+
+    def _encode_flat_dict(self, value, level):
+        '''Returns the dict value encoded like encode() does, or None if it holds other
+        keys than strings, or other values than numbers, strings, booleans and None.
+
+        The indenting encoder is written in python, while the one for unindented output
+        mostly runs in C, so the attributes of nodes and edges, which are usually flat,
+        are laid out here instead, and only their values encoded.'''
+        if not value:
+            return "{}"
+        encode = self._scalar_encoder.encode
+        scalars = _SCALARS
+        newline = self._newline(level + 1)
+        parts = []
+        for key, item in value.iteritems():
+            if not isinstance(key, basestring) or isinstance(item, (dict, list, tuple)):
+                return None
+            encode_item = scalars.get(type(item), encode)
+            parts.append(encode_basestring_ascii(key) + ": " + encode_item(item))
+        return "{" + newline + (", " + newline).join(parts) + self._newline(level) + "}"
+
+    def write(self, meta, nodes, edges, timeline):
+        '''Writes the graph: meta is a dict, and nodes, edges and timeline iterables of
+        the items of each section, such as generators.'''
+        sections = {"meta": meta, "nodes": nodes, "edges": edges, "timeline": timeline}
+        write = self.outfile.write
+        write("{")
+        for i, name in enumerate(SECTIONS):
+            if i:
+                write(", ")
+            write(self._newline(1) + self.encode(name) + ": ")
+            if name == "meta":
+                write(self.encode(meta, 1))
+            else:
+                self.write_array(sections[name], 2)
+        write(self._newline(0) + "}")
+
+    def write_array(self, items, level):
+        '''Writes the array of items, level deep in the file.'''
+        write = self.outfile.write
+        newline = self._newline(level)
+        count = 0
+        chunk = []
+        for item in items:
+            chunk.append(("[" if count == 0 else ", ") + newline)
+            chunk.append(self.encode(item, level))
+            count += 1
+            if count % self.chunk_size == 0:
+                write("".join(chunk))
+                chunk = []
+        if count == 0:
+            write("[]")
+        else:
+            write("".join(chunk) + self._newline(level - 1) + "]")
+
+_WHITESPACE = re.compile(r'[ \t\n\r]*')
+_NUMBER_CHARS = re.compile(r'[-+.eE0-9]*')
+
+class JsonGraphReader(object):
+    '''Reads a file in the JSON format of Graph.save_json() a little at a time, so that
+    only the item being read is held in memory, rather than the whole document.
+
+        for name, value in JsonGraphReader(infile).sections():
+            ...
+
+    The file is read in chunks of chunk_size bytes, or more when an item is larger.
+    '''
+    # the sections whose items are handed out one by one
+    ARRAYS = ("nodes", "edges", "timeline")
+
+    def __init__(self, infile, chunk_size=1 << 16):
+        self.infile = infile
+        self.chunk_size = chunk_size
+        self._decoder = json.JSONDecoder()
+        self._buf = ""
+        self._pos = 0
+        self._eof = False
+
+    def _fill(self):
+        '''Reads more of the file into the buffer, dropping what was already parsed.
+        Returns False at the end of the file.'''
+        data = self.infile.read(max(self.chunk_size, len(self._buf) - self._pos))
+        self._buf = self._buf[self._pos:] + data
+        self._pos = 0
+        if not data:
+            self._eof = True
+        return bool(data)
+
+    def _peek(self):
+        '''Returns the next character which is not whitespace, or "" at the end of the
+        file, without consuming it.'''
+        while True:
+            self._pos = _WHITESPACE.match(self._buf, self._pos).end()
+            if self._pos < len(self._buf):
+                return self._buf[self._pos]
+            if not self._fill():
+                return ""
+
+    def _expect(self, chars):
+        char = self._peek()
+        if not char or char not in chars:
+            raise ValueError("Expecting one of '{}' at position {} of the buffer".format(chars, self._pos))
+        self._pos += 1
+        return char
+
+    def _value(self):
+        '''Parses the next JSON value.'''
+        self._peek()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buf, self._pos)
+            except ValueError:
+                # the value goes on past the buffer
+                if not self._fill():
+                    raise
+                continue
+            if not self._eof and _NUMBER_CHARS.match(self._buf, end).end() == len(self._buf) \
+                    and self._fill():
+                # a number may go on past the buffer, e.g. 1.5e3 read up to 1.
+                continue
+            self._pos = end
+            return value
+
+    def _items(self):
+        self._expect("[")
+        if self._peek() == "]":
+            self._pos += 1
+            return
+        while True:
+            yield self._value()
+            if self._expect(",]") == "]":
+                return
+
+    def sections(self):
+        '''Iterates over the (name, value) pairs of the sections of the graph, in the order
+        of the file. The value of nodes, edges and timeline is an iterator over their
+        items, which must be used before moving on to the next section.'''
+        self._expect("{")
+        if self._peek() == "}":
+            return
+        while True:
+            name = self._value()
+            self._expect(":")
+            if name in self.ARRAYS and self._peek() == "[":
+                items = self._items()
+                yield name, items
+                for item in items:
+                    # skip what the caller left
+                    pass
+            else:
+                yield name, self._value()
+            if self._expect(",}") == "}":
+                return
@@ -0,0 +1,202 @@
+import threading
+from contextlib import contextmanager
+from thread import get_ident
+from Graph import Graph
+from DiGraph import DiGraph
+
+class ReadWriteLock(object):
+    '''A lock held either by any number of readers, or by a single writer.
+
+    Both sides are reentrant, and the writer may also take the read side, so that
+    locked methods can call each other. A reader may not take the write side, as
+    two readers doing so would wait for each other forever. Writers waiting for the
+    lock go before readers asking for it afterwards, so that a steady flow of
+    readers can't starve ingestion.
+    '''
+    def __init__(self):
+        self._cond = threading.Condition(threading.Lock())
+        self._readers = 0
+        self._writer = None
+        self._writes = 0
+        self._waiting_writers = 0
+        # per thread, whether each read hold it took counts in _readers
+        self._local = threading.local()
+
+    def _reads(self):
+        try:
+            return self._local.reads
+        except AttributeError:
+            self._local.reads = []
+            return self._local.reads
+
+    def acquire_read(self):
+        reads = self._reads()
+        if self._writer == get_ident():
+            reads.append(False)
+            return
+        with self._cond:
+            if not reads:
+                while self._writer is not None or self._waiting_writers:
+                    self._cond.wait()
+            self._readers += 1
+        reads.append(True)
+
+    def release_read(self):
+        if self._reads().pop():
+            with self._cond:
+                self._readers -= 1
+                if not self._readers:
+                    self._cond.notify_all()
+
+    def acquire_write(self):
+        me = get_ident()
+        if self._writer == me:
+            self._writes += 1
+            return
+        if self._reads():
+            raise RuntimeError("A thread holding the read lock can't take the write lock.")
+        with self._cond:
+            self._waiting_writers += 1
+            while self._writer is not None or self._readers:
+                self._cond.wait()
+            self._waiting_writers -= 1
+            self._writer = me
+            self._writes = 1
+
+    def release_write(self):
+        self._writes -= 1
+        if not self._writes:
+            with self._cond:
+                self._writer = None
+                self._cond.notify_all()
+
+    @contextmanager
+    def reading(self):
+        self.acquire_read()
+        try:
+            yield
+        finally:
+            self.release_read()
+
+    @contextmanager
+    def writing(self):
+        self.acquire_write()
+        try:
+            yield
+        finally:
+            self.release_write()
+
+class ConcurrentGraph(Graph):
+    '''A Graph which may be used by several threads at once.
+
+    Every method takes a ReadWriteLock: reading methods share it, while changes,
+    including the commit of a batch, hold it alone, so that readers always see the
+    graph between two changes. IDs are drawn under a lock of their own. Several
+    producer threads can thus fill their own Batch at the same time, e.g. one per
+    log file, only taking turns to commit, and each commit applies as a whole:
+
+        with g.batch() as batch:
+            for record in records:
+                batch.add_edge(...)
+
+    Iterators (iter_nodes(), iter_edges()) are built from a list taken under the
+    lock. Views (nodes, edges, adj) and queries (find_nodes(), find_edges()) read
+    the graph when they are used instead, so use them inside "with g.reading():",
+    which also keeps the graph from changing across several calls, or on a
+    snapshot from freeze(), which needs no lock at all.
+
+    With the compact backend, reads never change the arrays either: they are packed
+    by the changes which leave enough tombstones behind, under the write lock.
+    '''
+    def __init__(self, *args, **kwargs):
+        self._lock = ReadWriteLock()
+        self._id_lock = threading.Lock()
+        super(ConcurrentGraph, self).__init__(*args, **kwargs)
+
+    def reading(self):
+        '''Returns a context manager holding the read lock of the graph.'''
+        return self._lock.reading()
+
+    def writing(self):
+        '''Returns a context manager holding the write lock of the graph.'''
+        return self._lock.writing()
+
+    def _new_node_id(self, data):
+        with self._id_lock:
+            return super(ConcurrentGraph, self)._new_node_id(data)
+
+    def _new_edge_id(self, src, dst, data):
+        with self._id_lock:
+            return super(ConcurrentGraph, self)._new_edge_id(src, dst, data)
+
+    def _given_id(self, id_):
+        with self._id_lock:
+            return super(ConcurrentGraph, self)._given_id(id_)
+
+    def iter_nodes(self, data=False):
+        with self._lock.reading():
+            return iter(list(super(ConcurrentGraph, self).iter_nodes(data)))
+
+    def iter_edges(self, data=False):
+        with self._lock.reading():
+            return iter(list(super(ConcurrentGraph, self).iter_edges(data)))
+
+    def copy(self):
+        with self._lock.writing():
+            copied = super(ConcurrentGraph, self).copy()
+        copied._lock = ReadWriteLock()
+        copied._id_lock = threading.Lock()
+        return copied
+
+def _locked(cls, name, write):
+    '''Returns a method of cls which calls the method name of its base classes under
+    the read or the write lock.'''
+    def method(self, *args, **kwargs):
+        lock = self._lock
+        if write:
+            lock.acquire_write()
+        else:
+            lock.acquire_read()
+        try:
+            return getattr(super(cls, self), name)(*args, **kwargs)
+        finally:
+            if write:
+                lock.release_write()
+            else:
+                lock.release_read()
+    method.__name__ = name
+    method.__doc__ = getattr(cls, name).__doc__
+    return method
+
+# add_nodes(), add_edges() and bulk_load() go through a batch, locked by _commit_batch()
+_WRITE_METHODS = [
+    "add_node", "remove_node", "remove_nodes", "add_edge", "add_edge_by_handle",
+    "remove_edge", "remove_edges", "upsert_edge", "upsert_node", "upsert_nodes",
+    "get_or_add_node", "set_graph_attribute", "set_node_attribute", "set_edge_attribute",
+    "set_node_key", "get_node_by_key", "coalesce_edges", "intern_attributes", "add_event",
+    "index_nodes_by", "index_edges_by", "cache_nodes_by", "cache_edges_by",
+    "clear_node_cache", "clear_edge_cache", "load_json", "load_json_stream", "load_binary", "load_networkx_graph",
+    "freeze",
+    "_commit_batch",
+]
+_READ_METHODS = [
+    "has_node", "has_edge", "has_edge_between", "node_count", "edge_count",
+    "get_node", "get_nodes", "get_node_ids", "get_node_attribute", "get_node_attributes",
+    "get_node_attribute_values", "get_edge", "get_edges", "get_edge_ids",
+    "get_edge_attribute", "get_edge_attributes", "get_edge_attribute_values",
+    "get_edges_between", "get_graph_attribute", "get_node_handle", "get_node_id",
+    "neighbors", "neighbor_handles", "get_nodes_by_attr", "get_edges_by_attr",
+    "get_nodes_by_range", "get_edges_by_range", "get_nodes_by_prefix",
+    "get_nodes_by_substring", "get_edges_by_prefix", "get_edges_by_substring",
+    "memory_report", "save_json", "save_binary", "networkx_graph",
+]
+for name in _WRITE_METHODS:
+    setattr(ConcurrentGraph, name, _locked(ConcurrentGraph, name, True))
+for name in _READ_METHODS:
+    setattr(ConcurrentGraph, name, _locked(ConcurrentGraph, name, False))
+
+class ConcurrentDiGraph(ConcurrentGraph, DiGraph):
+    '''A DiGraph which may be used by several threads at once, see ConcurrentGraph.'''
+
+for name in ["predecessors", "predecessor_handles"]:
+    setattr(ConcurrentDiGraph, name, _locked(ConcurrentDiGraph, name, False))
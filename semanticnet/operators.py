@@ -6,7 +6,7 @@ def node_in(nid, G):
     return G._g.has_node(nid)
 
 def edge_in(eid, G):
-    return eid in G.get_edges()
+    return eid in G.edges
 
 ### Operators
 def _inter(A, B, node_cond, edge_cond):
@@ -57,22 +57,22 @@ def union(A, B, node_is_member=node_in, edge_is_member=edge_in):
     # copy A and B, and combine all their nodes and edges based on ID first, to create
     # a universal set AB to use in building the union
     AB = B.copy()
-    AB.add_nodes(dict((nid, attrs) for nid, attrs in A.get_nodes().iteritems() if nid not in AB.get_node_ids()))
-    AB.add_edges(dict((eid, attrs) for eid, attrs in A.get_edges().iteritems() if eid not in AB.get_edges()))
+    AB.add_nodes(dict((nid, attrs) for nid, attrs in A.iter_nodes(data=True) if nid not in AB.nodes))
+    AB.add_edges(dict((eid, attrs) for eid, attrs in A.iter_edges(data=True) if eid not in AB.edges))
 
     # then use the universal set AB to build the union, based on the lambdas
     C = type(AB)()
     C.add_nodes(
         dict(
             (nid, attrs)
-            for nid, attrs in AB.get_nodes().items()
+            for nid, attrs in AB.iter_nodes(data=True)
             if node_is_member(nid, A) or node_is_member(nid, B)
         )
     )
     C.add_edges(
         dict(
             (eid, attrs)
-            for eid, attrs in AB.get_edges().items()
+            for eid, attrs in AB.iter_edges(data=True)
             if edge_is_member(eid, A) or edge_is_member(eid, B)
         )
     )
@@ -0,0 +1,165 @@
+import cPickle
+import multiprocessing
+from Graph import Graph
+from DiGraph import DiGraph
+
+def _new_fragment(directed, id_kind):
+    '''Returns an empty graph for a worker to build into.'''
+    if directed:
+        return DiGraph(id_kind=id_kind)
+    return Graph(id_kind=id_kind)
+
+def _pack_fragment(fragment):
+    '''Returns fragment as a pickled string: the list of its (node ID, attributes) and
+    the list of its (source position, destination position, attributes) edges, where
+    positions index the list of nodes. Edge IDs are dropped, the graph merged into
+    gives edges IDs of its own.'''
+    nodes = []
+    positions = {}
+    for id_, attrs in fragment.iter_nodes(data=True):
+        positions[id_] = len(nodes)
+        attrs = dict(attrs)
+        del attrs["id"]
+        nodes.append((id_, attrs))
+    edges = []
+    for attrs in fragment._edges.itervalues():
+        attrs = dict(attrs)
+        src = positions[attrs.pop("src")]
+        dst = positions[attrs.pop("dst")]
+        del attrs["id"]
+        edges.append((src, dst, attrs))
+    return cPickle.dumps((nodes, edges), cPickle.HIGHEST_PROTOCOL)
+
+def _build_fragment(task):
+    '''Runs build_fn over a chunk of sources in a fresh graph, and returns it packed.'''
+    build_fn, sources, directed, id_kind = task
+    fragment = _new_fragment(directed, id_kind)
+    for source in sources:
+        build_fn(fragment, source)
+    return _pack_fragment(fragment)
+
+def _chunks(sources, size):
+    chunk = []
+    for source in sources:
+        chunk.append(source)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def _edge_key(graph, src, dst, attrs):
+    '''Returns what two equal edges share, or None if attrs can't be compared that way.'''
+    ends = (src, dst) if graph.directed else frozenset((src, dst))
+    try:
+        return (ends, frozenset(attrs.iteritems()))
+    except TypeError:
+        # unhashable values
+        return None
+
+class _Merger(object):
+    '''Merges packed fragments into graph, see parallel_build().'''
+    def __init__(self, graph, key, dedupe_edges):
+        self.graph = graph
+        self.key = key
+        # a coalescing graph merges equal edges itself
+        self.dedupe_edges = dedupe_edges and graph._coalescer is None
+        self.seen = set()
+        if self.dedupe_edges:
+            for attrs in graph._edges.itervalues():
+                attrs = dict(attrs)
+                src = attrs.pop("src")
+                dst = attrs.pop("dst")
+                del attrs["id"]
+                edge_key = _edge_key(graph, src, dst, attrs)
+                if edge_key is not None:
+                    self.seen.add(edge_key)
+        if key is not None:
+            graph.set_node_key(key)
+
+    def merge(self, packed):
+        graph = self.graph
+        key = self.key
+        nodes, edges = cPickle.loads(packed)
+
+        ids = [None] * len(nodes)
+        if key is not None:
+            keyed = [(attrs[key], attrs) for id_, attrs in nodes if key in attrs]
+            found = graph.upsert_nodes(keyed, update=True)
+        with graph.batch() as batch:
+            for pos, (id_, attrs) in enumerate(nodes):
+                if key is None:
+                    if graph.has_node(id_):
+                        for attr_name, value in attrs.iteritems():
+                            graph.set_node_attribute(id_, attr_name, value)
+                        ids[pos] = id_
+                    else:
+                        ids[pos] = batch.add_node(attrs, id_)
+                elif key in attrs:
+                    ids[pos] = found[attrs[key]]
+                else:
+                    ids[pos] = batch.add_node(attrs)
+
+            seen = self.seen
+            for src, dst, attrs in edges:
+                src = ids[src]
+                dst = ids[dst]
+                if self.dedupe_edges:
+                    edge_key = _edge_key(graph, src, dst, attrs)
+                    if edge_key is not None:
+                        if edge_key in seen:
+                            continue
+                        seen.add(edge_key)
+                batch.add_edge(src, dst, attrs)
+
+def parallel_build(sources, build_fn, workers=None, graph=None, key="label",
+        chunksize=None, dedupe_edges=False):
+    '''Builds a graph out of sources, such as file names, in several processes.
+
+    build_fn(fragment, source) is called for every source, in one of workers processes
+    (by default, one per CPU), and adds what source holds to fragment, an empty Graph,
+    or DiGraph if graph is directed. Sources are handed out in chunks of chunksize, each
+    built into a fragment of its own. build_fn must be picklable, i.e. defined at the
+    top level of a module. With workers=1, everything runs in this process.
+
+    The fragments are merged into graph (by default, a new Graph), in the order of
+    their sources, so the result does not depend on the number of workers. Nodes of
+    different fragments with the same value of key are merged into one, which is the
+    key of the nodes of graph (see set_node_key()) from then on, and the attributes of
+    later sources take precedence. Nodes lacking key are all kept. If key is None,
+    nodes are merged by ID instead, so the fragments must use IDs of their own, such as
+    labels, rather than generated ones: fragments have the id_kind of graph for this.
+    Every edge of the fragments is added, as a serial build would do. If dedupe_edges is
+    True, an edge is only added when graph has no edge between the same nodes with the
+    same attributes yet, e.g. because another fragment had it.
+    Returns graph.
+    '''
+    if graph is None:
+        graph = Graph()
+    sources = list(sources)
+    if workers is None:
+        workers = multiprocessing.cpu_count()
+    if chunksize is None:
+        # a few chunks per worker, so that a slow chunk doesn't hold the others up
+        chunksize = max(1, len(sources) // (workers * 4))
+    tasks = [(build_fn, chunk, graph.directed, graph.id_kind)
+        for chunk in _chunks(sources, chunksize)]
+
+    merger = _Merger(graph, key, dedupe_edges)
+    if workers == 1:
+        for task in tasks:
+            merger.merge(_build_fragment(task))
+        return graph
+
+    pool = multiprocessing.Pool(workers)
+    try:
+        # imap hands fragments back in the order of the tasks
+        for packed in pool.imap(_build_fragment, tasks):
+            merger.merge(packed)
+        pool.close()
+    except:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+    return graph
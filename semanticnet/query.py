@@ -0,0 +1,173 @@
+import operator
+from itertools import chain
+from columns import _MISSING
+
+# attr__op suffixes understood by find_nodes() and find_edges()
+OPERATORS = {
+    "eq": operator.eq,
+    "ne": operator.ne,
+    "lt": operator.lt,
+    "lte": operator.le,
+    "gt": operator.gt,
+    "gte": operator.ge,
+    "in": lambda value, values: value in values,
+    "startswith": lambda value, prefix: isinstance(value, basestring) and value.startswith(prefix),
+    "contains": lambda value, substring: isinstance(value, basestring) and substring in value,
+}
+
+# the operators a sorted index can answer, as (bound, inclusive)
+_RANGE_OPERATORS = {
+    "gt": ("low", False),
+    "gte": ("low", True),
+    "lt": ("high", False),
+    "lte": ("high", True),
+}
+
+def parse_conditions(conditions):
+    '''Turns a dict of conditions, such as {"type": "AS", "registration__gte": "2010"},
+    into a list of (attribute, operator name, value) triples. A name without a known
+    __operator suffix is an equality test on the whole name.'''
+    parsed = []
+    for name, value in conditions.iteritems():
+        attr, _, op = name.rpartition("__")
+        if not attr or op not in OPERATORS:
+            attr, op = name, "eq"
+        parsed.append((attr, op, value))
+    return parsed
+
+class _Plan(object):
+    '''One way of finding the matching items: the IDs to start from (or None for a
+    scan of every item), what that costs, and the conditions still to check.'''
+    def __init__(self, description, cost, ids, residual):
+        self.description = description
+        self.cost = cost
+        self.ids = ids
+        self.residual = residual
+
+class Query(object):
+    '''The items of a graph matching a list of conditions, as returned by
+    Graph.find_nodes() and Graph.find_edges().
+
+    Nothing is looked up until the query is iterated over or counted. Every time
+    it is, the planner picks the index which leaves the fewest items to check,
+    among the indexes of the graph which hold every item: an exact value or a list
+    of values ("in") for any index, a range for a sorted or text index, a prefix or
+    a substring for a text index, or exact values for all the attributes of a
+    composite index. It only scans every item when no index helps. Changing the
+    graph while iterating over a query is not supported.
+    '''
+    def __init__(self, get_indexes, get_items, conditions):
+        self._get_indexes = get_indexes
+        self._get_items = get_items
+        self.conditions = parse_conditions(conditions)
+
+    def _candidates(self):
+        items = self._get_items()
+        conditions = self.conditions
+        yield _Plan("scan", len(items), None, conditions)
+
+        by_attr = {}
+        for condition in conditions:
+            by_attr.setdefault(condition[0], []).append(condition)
+
+        for index in self._get_indexes().indexes.itervalues():
+            if not index.complete:
+                continue
+            if len(index.attrs) > 1:
+                # a composite index needs an exact value for each of its attributes
+                key = []
+                for attr in index.attrs:
+                    eq = [c for c in by_attr.get(attr, ()) if c[1] == "eq"]
+                    if not eq:
+                        break
+                    key.append(eq[0][2])
+                else:
+                    key = tuple(key)
+                    used = [[c for c in by_attr[attr] if c[1] == "eq"][0] for attr in index.attrs]
+                    yield _Plan("index {} = {!r}".format(index.attrs, key), index.count(key),
+                        lambda index=index, key=key: index.ids(key),
+                        [c for c in conditions if c not in used])
+                continue
+
+            attr = index.attrs[0]
+            bounds = {}
+            used = []
+            for condition in by_attr.get(attr, ()):
+                op, value = condition[1], condition[2]
+                if op == "eq":
+                    yield _Plan("index {} = {!r}".format(attr, value), index.count(value),
+                        lambda index=index, value=value: index.ids(value),
+                        [c for c in conditions if c is not condition])
+                elif op == "in":
+                    values = set(value)
+                    yield _Plan("index {} in {!r}".format(attr, value),
+                        sum(index.count(v) for v in values),
+                        lambda index=index, values=values: chain.from_iterable(
+                            index.ids(v) for v in values),
+                        [c for c in conditions if c is not condition])
+                elif op == "startswith" and index.kind == "text":
+                    yield _Plan("index {} prefix {!r}".format(attr, value), index.prefix_count(value),
+                        lambda index=index, value=value: index.prefix(value),
+                        [c for c in conditions if c is not condition])
+                elif op == "contains" and index.kind == "text":
+                    keys = index.substring_keys(value)
+                    yield _Plan("index {} substring {!r}".format(attr, value),
+                        sum(index.count(key) for key in keys),
+                        lambda index=index, keys=keys: chain.from_iterable(
+                            index.ids(key) for key in keys),
+                        [c for c in conditions if c is not condition])
+                elif op in _RANGE_OPERATORS and index.kind != "hash":
+                    bound, inclusive = _RANGE_OPERATORS[op]
+                    if bound not in bounds:
+                        bounds[bound] = value
+                        bounds[bound + "_inclusive"] = inclusive
+                        used.append(condition)
+            if bounds:
+                yield _Plan("index {} range".format(attr), index.range_count(**bounds),
+                    lambda index=index, bounds=bounds: index.range(**bounds),
+                    [c for c in conditions if c not in used])
+
+    def _plan(self):
+        return min(self._candidates(), key=lambda plan: plan.cost)
+
+    def explain(self):
+        '''Returns a short description of how the query would be answered now.'''
+        return self._plan().description
+
+    def _matches(self, attrs, conditions):
+        for attr, op, value in conditions:
+            item_value = attrs.get(attr, _MISSING)
+            if item_value is _MISSING or not OPERATORS[op](item_value, value):
+                return False
+        return True
+
+    def iteritems(self):
+        '''Iterates over (ID, attributes) for every matching item.'''
+        return self._run(self._plan())
+
+    def _run(self, plan):
+        items = self._get_items()
+        matches = self._matches
+        residual = plan.residual
+        if plan.ids is None:
+            pairs = items.iteritems()
+        else:
+            pairs = ((id_, items[id_]) for id_ in plan.ids())
+        for id_, attrs in pairs:
+            if not residual or matches(attrs, residual):
+                yield id_, attrs
+
+    def ids(self):
+        '''Iterates over the IDs of the matching items.'''
+        return (id_ for id_, attrs in self.iteritems())
+
+    def __iter__(self):
+        return (attrs for id_, attrs in self.iteritems())
+
+    def count(self):
+        '''Returns the number of matching items. When an index answers every condition,
+        this does not visit the items at all.'''
+        plan = self._plan()
+        if not plan.residual:
+            return plan.cost
+        return sum(1 for _ in self._run(plan))
@@ -0,0 +1,109 @@
+import json
+import uuid
+
+def encode_default(value):
+    '''Returns the JSON form of the values json can't encode by itself: UUIDs, such as
+    the IDs of nodes and edges, are written as hex.'''
+    if type(value) is uuid.UUID:
+        return value.hex
+    raise TypeError("{!r} is not JSON serializable".format(value))
+
+def hex_uuids(attrs):
+    '''Returns a copy of the attributes attrs with their UUID values as hex, for the
+    encoders which can't be given encode_default().'''
+    return dict((name, value.hex if type(value) is uuid.UUID else value)
+        for name, value in attrs.iteritems())
+
+class Serializer(object):
+    '''Encodes and decodes JSON through one of the JSON modules which may be installed,
+    as chosen with the serializer parameter of Graph.save_json() and Graph.load_json().
+    Documents are encoded unindented, with UUIDs as hex, see encode_default().
+    '''
+    name = None
+    module_name = None
+
+    def __init__(self):
+        self.module = __import__(self.module_name)
+
+    def dumps(self, value):
+        '''Returns value encoded as JSON.'''
+        raise NotImplementedError
+
+    def loads(self, text):
+        '''Returns the value encoded as JSON in text.'''
+        return self.module.loads(text)
+
+    def load(self, infile):
+        '''Returns the value encoded as JSON in the file infile.'''
+        return self.loads(infile.read())
+
+class StdlibSerializer(Serializer):
+    '''The json module of the standard library, always available.'''
+    name = "json"
+    module_name = "json"
+
+    def __init__(self):
+        super(StdlibSerializer, self).__init__()
+        # the unindented encoder mostly runs in C
+        self.dumps = json.JSONEncoder(default=encode_default).encode
+
+class SimplejsonSerializer(Serializer):
+    '''simplejson, with its C speedups, which encodes exactly like json but decodes
+    faster. ASCII strings are decoded as str rather than unicode.'''
+    name = "simplejson"
+    module_name = "simplejson"
+
+    def __init__(self):
+        super(SimplejsonSerializer, self).__init__()
+        self.dumps = self.module.JSONEncoder(default=encode_default).encode
+
+class UjsonSerializer(Serializer):
+    '''ujson, the fastest of them. Releases before 2.0 round floats to 15 significant
+    digits, and can't encode integers beyond 64 bits, infinity or NaN, so this is only
+    used when asked for by name.'''
+    name = "ujson"
+    module_name = "ujson"
+
+    def dumps(self, value):
+        if type(value) is dict:
+            # attributes may hold UUIDs, which ujson can't be taught to encode
+            value = hex_uuids(value)
+        return self.module.dumps(value, ensure_ascii=True)
+
+SERIALIZERS = {
+    "json": StdlibSerializer,
+    "simplejson": SimplejsonSerializer,
+    "ujson": UjsonSerializer,
+}
+
+# the serializers "auto" picks from, fastest first, among the exact ones
+_AUTO_ORDER = ["simplejson", "json"]
+
+def available_serializers():
+    '''Returns the sorted names of the serializers whose module is installed.'''
+    names = []
+    for name, cls in SERIALIZERS.iteritems():
+        try:
+            __import__(cls.module_name)
+        except ImportError:
+            continue
+        names.append(name)
+    return sorted(names)
+
+def get_serializer(name="json"):
+    '''Returns the Serializer called name, one of SERIALIZERS, or, for "auto", the fastest
+    exact one installed. Serializer instances are returned as they are.'''
+    if isinstance(name, Serializer):
+        return name
+    if name == "auto":
+        installed = available_serializers()
+        name = [auto for auto in _AUTO_ORDER if auto in installed][0]
+    try:
+        cls = SERIALIZERS[name]
+    except KeyError:
+        raise ValueError("Unknown serializer '{}'. Choose one of: {}".format(
+            name, ", ".join(["auto"] + sorted(SERIALIZERS))))
+    try:
+        return cls()
+    except ImportError:
+        raise ValueError("Serializer '{}' needs the {} module.".format(name, cls.module_name))
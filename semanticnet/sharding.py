@@ -0,0 +1,526 @@
+import copy
+import cPickle
+import json
+import multiprocessing
+from collections import defaultdict
+from Graph import Batch, Event, Graph, GraphException, ReservedAttributeException, _has_reserved
+from ids import ID_KINDS, ID_GENERATORS, IdGenerator, random_uuid4
+from serializers import encode_default
+
+def _unlink(links, a, b, id_):
+    '''Removes the edge id_ from links[a][b], and the entries it leaves empty.'''
+    if a not in links or b not in links[a]:
+        return
+    ids = links[a][b]
+    if id_ in ids:
+        ids.remove(id_)
+    if not ids:
+        del links[a][b]
+        if not links[a]:
+            del links[a]
+
+class _Shard(object):
+    '''The nodes of one shard of a ShardedGraph, the edges leaving them, and the IDs of
+    the edges reaching them, kept in a worker process.'''
+    def __init__(self, id_kind):
+        # nodes only: the other end of an edge may live in another shard
+        self.graph = Graph(id_kind=id_kind)
+        self.edges = {}
+        self.succ = defaultdict(lambda: defaultdict(list))
+        self.pred = defaultdict(lambda: defaultdict(list))
+
+    def missing(self, ids):
+        has_node = self.graph._g.has_node
+        return [id_ for id_ in ids if not has_node(id_)]
+
+    def commit(self, nodes, edges, mirrors):
+        if nodes:
+            self.graph._commit_batch(nodes, [])
+        for src, dst, data, id_ in edges:
+            self.edges[id_] = data
+            self.succ[src][dst].append(id_)
+        for src, dst, id_ in mirrors:
+            self.pred[dst][src].append(id_)
+
+    def remove_node(self, id_):
+        '''Removes node id_ and the edges leaving it. Returns those edges, whose IDs the
+        shards of their destinations keep, and the edges reaching it, which the shards of
+        their sources hold, as two lists of (src, dst, ID), for unlink().'''
+        if not self.graph._g.has_node(id_):
+            raise GraphException("Node ID not found.")
+        self.graph.remove_node(id_)
+        out_edges = [(id_, dst, edge_id) for dst, ids in self.succ.pop(id_, {}).iteritems() for edge_id in ids]
+        for src, dst, edge_id in out_edges:
+            del self.edges[edge_id]
+        in_edges = [(src, id_, edge_id) for src, ids in self.pred.pop(id_, {}).iteritems() for edge_id in ids]
+        return out_edges, in_edges
+
+    def remove_edge(self, id_):
+        '''Removes edge id_ if it leaves a node of this shard, returning its ends, or None.'''
+        attrs = self.edges.pop(id_, None)
+        if attrs is None:
+            return None
+        _unlink(self.succ, attrs["src"], attrs["dst"], id_)
+        return attrs["src"], attrs["dst"]
+
+    def unlink(self, edges, mirrors):
+        '''Removes the edges leaving nodes of this shard, and the IDs of the edges reaching
+        them, given as lists of (src, dst, ID). Those already removed are skipped.'''
+        for src, dst, id_ in edges:
+            if self.edges.pop(id_, None) is not None:
+                _unlink(self.succ, src, dst, id_)
+        for src, dst, id_ in mirrors:
+            _unlink(self.pred, dst, src, id_)
+
+    def set_edge_attribute(self, id_, attr_name, value):
+        '''Sets the attribute of edge id_ if it leaves a node of this shard, returning
+        whether it does.'''
+        if id_ not in self.edges:
+            return False
+        self.edges[id_][attr_name] = value
+        return True
+
+    def get_nodes(self):
+        return self.graph.get_nodes()
+
+    def get_nodes_by_id(self, ids):
+        node = self.graph._g.node
+        return dict((id_, node[id_]) for id_ in ids if id_ in node)
+
+    def get_edges(self):
+        return dict(self.edges)
+
+    def get_edge(self, id_):
+        return self.edges.get(id_)
+
+    def neighbors(self, id_, succ, pred):
+        '''Returns the IDs of the nodes linked to node id_, by the edges leaving it if
+        succ is True, and by those reaching it if pred is True.'''
+        if not self.graph._g.has_node(id_):
+            raise GraphException("Node ID not found.")
+        ids = set()
+        if succ and id_ in self.succ:
+            ids.update(self.succ[id_])
+        if pred and id_ in self.pred:
+            ids.update(self.pred[id_])
+        return list(ids)
+
+    def node_count(self):
+        return self.graph.node_count()
+
+    def edge_count(self):
+        return len(self.edges)
+
+    def call(self, name, args, kwargs):
+        '''Calls the method name of the graph of the nodes.'''
+        return getattr(self.graph, name)(*args, **kwargs)
+
+    def dump(self):
+        '''Returns the nodes and edges of the shard encoded as JSON, in the form of
+        Graph.save_json(), as two lists of strings.'''
+        export_id = self.graph._export_id
+        nodes = []
+        for id_, attrs in self.graph.iter_nodes(data=True):
+            attrs = dict(attrs)
+            attrs["id"] = export_id(id_)
+            nodes.append(json.dumps(attrs, default=encode_default))
+        edges = []
+        for id_, attrs in self.edges.iteritems():
+            attrs = dict(attrs)
+            attrs["src"] = export_id(attrs["src"])
+            attrs["dst"] = export_id(attrs["dst"])
+            attrs["id"] = export_id(id_)
+            edges.append(json.dumps(attrs, default=encode_default))
+        return nodes, edges
+
+def _portable(error):
+    '''Returns error, or a GraphException with its message if error can't be sent back
+    to the parent process.'''
+    try:
+        cPickle.loads(cPickle.dumps(error, cPickle.HIGHEST_PROTOCOL))
+        return error
+    except Exception:
+        return GraphException(getattr(error, "msg", str(error)))
+
+def _serve(conn, id_kind):
+    '''Runs a shard: receives lists of (method name, arguments) calls, and sends back
+    either (True, list of results) or (False, the first error).'''
+    shard = _Shard(id_kind)
+    while True:
+        calls = conn.recv()
+        if calls is None:
+            break
+        try:
+            results = [getattr(shard, name)(*args) for name, args in calls]
+        except Exception as e:
+            conn.send((False, _portable(e)))
+        else:
+            conn.send((True, results))
+    conn.close()
+
+class _ShardedBatch(Batch):
+    def has_node(self, id_):
+        '''Returns True if node id_ is in the graph, or pending in this batch.'''
+        id_ = self.graph._extract_id(id_)
+        return id_ in self._node_ids or self.graph.has_node(id_)
+
+class ShardedGraph(object):
+    '''A graph spread over several worker processes, each holding a shard of the nodes,
+    for graphs which outgrow a single process.
+
+    Nodes go to shard hash(ID) % shards, with the edges leaving them; the shard of the
+    node an edge reaches keeps the ID of the edge as well, to find neighbors and
+    predecessors. IDs are created in this process, with the same id_kind and
+    id_generator options as Graph, except that random UUIDs are not checked for
+    collisions.
+
+    Every request is sent to the shards involved in a single message each, and when
+    several shards are involved, they work at the same time: a batch (see batch())
+    commits with one round trip to check that the ends of the edges exist, and one to
+    write, and queries such as get_nodes_by_attr() or save_json() run on every shard
+    at once. A batch is checked before anything is written, but a shard may still
+    refuse its part, e.g. because of a unique index, after the others wrote theirs.
+    Removals and attribute changes are sent to the shards holding the nodes and edges
+    involved; meta and the timeline are kept in this process.
+
+    The processes are stopped by close(), or at the end of a with block:
+
+        with sn.ShardedGraph(shards=4) as g:
+            with g.batch() as batch:
+                ...
+            g.save_json("graph.json")
+    '''
+
+    directed = False
+
+    def __init__(self, shards=None, id_kind="auto", id_generator=None):
+        try:
+            self._extract_id, self._export_id, self._generated_id = ID_KINDS[id_kind]
+        except KeyError:
+            raise GraphException("Unknown id_kind '{}'. Choose one of: {}".format(
+                id_kind, ", ".join(sorted(ID_KINDS))))
+        self.id_kind = id_kind
+        if not isinstance(id_generator, IdGenerator):
+            if id_generator is None:
+                id_generator = "counter" if id_kind == "int" else "random"
+            try:
+                id_generator = ID_GENERATORS[id_generator]()
+            except KeyError:
+                raise GraphException("Unknown id_generator '{}'. Choose one of: {}".format(
+                    id_generator, ", ".join(sorted(ID_GENERATORS))))
+        self._id_generator = id_generator
+
+        self.meta = {}
+        self.timeline = []
+        self.attr_reserved = ["id", "src", "dst"]
+
+        if shards is None:
+            shards = multiprocessing.cpu_count()
+        self._conns = []
+        self._processes = []
+        for i in xrange(shards):
+            conn, child_conn = multiprocessing.Pipe()
+            process = multiprocessing.Process(target=_serve, args=(child_conn, id_kind))
+            process.daemon = True
+            process.start()
+            child_conn.close()
+            self._conns.append(conn)
+            self._processes.append(process)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        '''Stops the worker processes, dropping the graph.'''
+        for conn in self._conns:
+            conn.send(None)
+            conn.close()
+        for process in self._processes:
+            process.join()
+        self._conns = []
+        self._processes = []
+
+    @property
+    def shards(self):
+        return len(self._conns)
+
+    def _shard_of(self, id_):
+        return hash(id_) % len(self._conns)
+
+    def _request(self, calls):
+        '''Sends each shard its list of calls, given as a dict of shard -> list of
+        (method name, arguments), all at once, and returns a dict of shard -> list of
+        results, once every shard is done.'''
+        for shard, shard_calls in calls.iteritems():
+            self._conns[shard].send(shard_calls)
+        results = {}
+        error = None
+        for shard in calls:
+            ok, value = self._conns[shard].recv()
+            if ok:
+                results[shard] = value
+            elif error is None:
+                error = value
+        if error is not None:
+            raise error
+        return results
+
+    def _ask(self, shard, name, *args):
+        return self._request({shard: [(name, args)]})[shard][0]
+
+    def _ask_all(self, name, *args):
+        '''Calls the method name of every shard, returning the list of their results.'''
+        results = self._request(dict((shard, [(name, args)]) for shard in xrange(self.shards)))
+        return [results[shard][0] for shard in xrange(self.shards)]
+
+    def _create_uuid(self):
+        return random_uuid4()
+
+    def _new_node_id(self, data):
+        return self._generated_id(self._id_generator.node_id(self, data))
+
+    def _new_edge_id(self, src, dst, data):
+        return self._generated_id(self._id_generator.edge_id(self, src, dst, data))
+
+    def _given_id(self, id_):
+        id_ = self._extract_id(id_)
+        self._id_generator.seen(id_)
+        return id_
+
+    def _check_reserved_attrs(self, data):
+        for k in data:
+            if k in self.attr_reserved:
+                raise ReservedAttributeException(k)
+
+    def batch(self):
+        '''Returns a Batch, which buffers insertions into this graph and sends them to
+        the shards all at once when committed. See Batch for details.'''
+        return _ShardedBatch(self)
+
+    def _commit_batch(self, nodes, edges):
+        reserved = self.attr_reserved
+        new_ids = set()
+        for id_, data in nodes:
+            if _has_reserved(data, reserved):
+                self._check_reserved_attrs(data)
+            new_ids.add(id_)
+        ends = set()
+        for src, dst, data, id_ in edges:
+            if _has_reserved(data, reserved):
+                self._check_reserved_attrs(data)
+            ends.update((src, dst))
+        ends -= new_ids
+
+        if ends:
+            calls = defaultdict(list)
+            for id_ in ends:
+                calls[self._shard_of(id_)].append(id_)
+            calls = dict((shard, [("missing", (ids,))]) for shard, ids in calls.iteritems())
+            for results in self._request(calls).itervalues():
+                if results[0]:
+                    raise GraphException("Node ID not found.")
+
+        shard_of = self._shard_of
+        parts = defaultdict(lambda: ([], [], []))
+        for id_, data in nodes:
+            parts[shard_of(id_)][0].append((id_, data))
+        for src, dst, data, id_ in edges:
+            data["id"] = id_
+            data["src"] = src
+            data["dst"] = dst
+            parts[shard_of(src)][1].append((src, dst, data, id_))
+            parts[shard_of(dst)][2].append((src, dst, id_))
+        self._request(dict((shard, [("commit", part)]) for shard, part in parts.iteritems()))
+
+    def add_node(self, data={}, id_=None):
+        '''Same as Graph.add_node().'''
+        with self.batch() as batch:
+            id_ = batch.add_node(data, id_)
+        return id_
+
+    def add_nodes(self, nodes):
+        '''Same as Graph.add_nodes(), in a single batch.'''
+        with self.batch() as batch:
+            ids = batch._add_nodes(nodes, copy.deepcopy)
+        return ids
+
+    def add_edge(self, src, dst, data={}, id_=None):
+        '''Same as Graph.add_edge().'''
+        with self.batch() as batch:
+            id_ = batch.add_edge(src, dst, data, id_)
+        return id_
+
+    def add_edges(self, edges):
+        '''Same as Graph.add_edges(), in a single batch.'''
+        with self.batch() as batch:
+            batch._add_edges(edges, copy.deepcopy)
+
+    def has_node(self, id_):
+        id_ = self._extract_id(id_)
+        return not self._ask(self._shard_of(id_), "missing", [id_])
+
+    def get_node(self, id_):
+        '''Returns the attributes of node id_.'''
+        id_ = self._extract_id(id_)
+        found = self._ask(self._shard_of(id_), "get_nodes_by_id", [id_])
+        if id_ not in found:
+            raise GraphException("Node ID not found.")
+        return found[id_]
+
+    def remove_node(self, id_):
+        '''Same as Graph.remove_node(): removes node id_, and the edges linked to it from
+        the shards holding them.'''
+        id_ = self._extract_id(id_)
+        out_edges, in_edges = self._ask(self._shard_of(id_), "remove_node", id_)
+        shard_of = self._shard_of
+        parts = defaultdict(lambda: ([], []))
+        for src, dst, edge_id in out_edges:
+            parts[shard_of(dst)][1].append((src, dst, edge_id))
+        for src, dst, edge_id in in_edges:
+            parts[shard_of(src)][0].append((src, dst, edge_id))
+        if parts:
+            self._request(dict((shard, [("unlink", part)]) for shard, part in parts.iteritems()))
+
+    def remove_nodes(self, ids):
+        map(self.remove_node, ids)
+
+    def remove_edge(self, id_):
+        '''Same as Graph.remove_edge().'''
+        id_ = self._extract_id(id_)
+        for ends in self._ask_all("remove_edge", id_):
+            if ends is not None:
+                src, dst = ends
+                self._ask(self._shard_of(dst), "unlink", [], [(src, dst, id_)])
+                return
+        raise GraphException('Edge ID not found.')
+
+    def remove_edges(self, ids):
+        map(self.remove_edge, ids)
+
+    def set_node_attribute(self, id_, attr_name, value):
+        '''Same as Graph.set_node_attribute().'''
+        id_ = self._extract_id(id_)
+        self._ask(self._shard_of(id_), "call", "set_node_attribute", (id_, attr_name, value), {})
+
+    def set_edge_attribute(self, id_, attr_name, value):
+        '''Same as Graph.set_edge_attribute().'''
+        id_ = self._extract_id(id_)
+        if attr_name in self.attr_reserved:
+            raise ReservedAttributeException(attr_name)
+        if not any(self._ask_all("set_edge_attribute", id_, attr_name, value)):
+            raise GraphException("Edge id '" + str(id_) + "' not found!")
+
+    def add_event(self, timecode, name, attributes):
+        self.timeline.append(Event(timecode, name, attributes))
+
+    def get_nodes(self):
+        '''Same as Graph.get_nodes(): returns a dict of all nodes, keyed by their ID.'''
+        nodes = {}
+        for shard_nodes in self._ask_all("get_nodes"):
+            nodes.update(shard_nodes)
+        return nodes
+
+    def get_edges(self):
+        '''Same as Graph.get_edges(): returns a dict of all edges, keyed by their ID.'''
+        edges = {}
+        for shard_edges in self._ask_all("get_edges"):
+            edges.update(shard_edges)
+        return edges
+
+    def get_nodes_by_id(self, ids):
+        '''Returns a dict of node ID -> attributes for the nodes ids, asking each shard
+        for all of its nodes at once.'''
+        calls = defaultdict(list)
+        for id_ in ids:
+            id_ = self._extract_id(id_)
+            calls[self._shard_of(id_)].append(id_)
+        found = {}
+        results = self._request(dict((shard, [("get_nodes_by_id", (ids,))]) for shard, ids in calls.iteritems()))
+        for shard_results in results.itervalues():
+            found.update(shard_results[0])
+        return found
+
+    def get_edge(self, id_):
+        '''Returns edge id_.'''
+        id_ = self._extract_id(id_)
+        for attrs in self._ask_all("get_edge", id_):
+            if attrs is not None:
+                return attrs
+        raise GraphException('Edge ID not found.')
+
+    def _linked(self, id_, succ, pred):
+        id_ = self._extract_id(id_)
+        return self.get_nodes_by_id(self._ask(self._shard_of(id_), "neighbors", id_, succ, pred))
+
+    def neighbors(self, id_):
+        '''Returns a dict of ID -> attributes of the neighbors of node id_ (its
+        successors in a ShardedDiGraph).'''
+        return self._linked(id_, True, not self.directed)
+
+    def node_count(self):
+        return sum(self._ask_all("node_count"))
+
+    def edge_count(self):
+        return sum(self._ask_all("edge_count"))
+
+    def index_nodes_by(self, *attrs, **kwargs):
+        '''Same as Graph.index_nodes_by(), on every shard.'''
+        self._ask_all("call", "index_nodes_by", attrs, kwargs)
+
+    def cache_nodes_by(self, attr_name):
+        '''Same as Graph.cache_nodes_by(), on every shard.'''
+        self._ask_all("call", "cache_nodes_by", (attr_name,), {})
+
+    def get_nodes_by_attr(self, attr, val=None, nosingleton=False):
+        '''Same as Graph.get_nodes_by_attr(), asking every shard at once. The nodes must
+        have been indexed with index_nodes_by() or cache_nodes_by().'''
+        found = self._ask_all("call", "get_nodes_by_attr", (attr, val), {})
+        if val is None:
+            merged = defaultdict(list)
+            for by_value in found:
+                for value, nodes in by_value.iteritems():
+                    merged[value].extend(nodes)
+            return dict(merged)
+        nodes = [node for shard_nodes in found for node in shard_nodes]
+        if nosingleton and len(nodes) == 1:
+            return nodes[0]
+        return nodes
+
+    def save_json(self, filename):
+        '''Same as Graph.save_json(). Every shard encodes its nodes and edges at the same
+        time, so the file is written with one item per line, rather than indented.'''
+        dumps = self._ask_all("dump")
+        with open(filename, 'w') as outfile:
+            outfile.write('{"meta": ' + json.dumps(self.meta, default=encode_default) + ', "nodes": [')
+            self._write_items(outfile, [nodes for nodes, edges in dumps])
+            outfile.write('], "edges": [')
+            self._write_items(outfile, [edges for nodes, edges in dumps])
+            outfile.write('], "timeline": ' + json.dumps(list(self._iter_saved_events()), default=encode_default) + '}\n')
+
+    def _iter_saved_events(self):
+        export_id = self._export_id
+        for event in self.timeline:
+            attrs = dict(event.attributes)
+            for key in ("src", "dst", "id"):
+                if key in attrs:
+                    attrs[key] = export_id(attrs[key])
+            yield [event.timecode, event.name, attrs]
+
+    def _write_items(self, outfile, parts):
+        first = True
+        for items in parts:
+            for item in items:
+                outfile.write('\n' + item if first else ',\n' + item)
+                first = False
+
+class ShardedDiGraph(ShardedGraph):
+    '''A ShardedGraph whose edges are directed, like a DiGraph.'''
+
+    directed = True
+
+    def predecessors(self, id_):
+        '''Returns a dict of ID -> attributes of the nodes with an edge to node id_.'''
+        return self._linked(id_, False, True)
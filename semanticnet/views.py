@@ -0,0 +1,96 @@
+from collections import Mapping, Set
+from columns import _MISSING
+
+class _LiveView(Mapping, Set):
+    '''Base class for the live views of a graph: a read-only mapping of ID ->
+    attributes, which is also a set of IDs. Views hold no data of their own, so they
+    reflect every later change to the graph, and set operations on them (&, |, -, ^)
+    return plain sets of IDs. IDs are accepted in any form the graph's methods
+    accept, e.g. as hex strings.
+    '''
+    def __init__(self, graph):
+        self._graph = graph
+
+    @classmethod
+    def _from_iterable(cls, iterable):
+        return set(iterable)
+
+    def _mapping(self):
+        raise NotImplementedError()
+
+    def _id(self, id_):
+        try:
+            return self._graph._extract_id(id_)
+        except (TypeError, ValueError):
+            return _MISSING
+
+    def __getitem__(self, id_):
+        return self._mapping()[self._id(id_)]
+
+    def __contains__(self, id_):
+        return self._id(id_) in self._mapping()
+
+    def __iter__(self):
+        return iter(self._mapping())
+
+    def __len__(self):
+        return len(self._mapping())
+
+    def iteritems(self):
+        return self._mapping().iteritems()
+
+    def itervalues(self):
+        return (attrs for id_, attrs in self.iteritems())
+
+    def __repr__(self):
+        return "{}({})".format(type(self).__name__, list(self))
+
+class NodeView(_LiveView):
+    '''The nodes of a graph, as returned by Graph.nodes.'''
+    def _mapping(self):
+        return self._graph._g.node
+
+class EdgeView(_LiveView):
+    '''The edges of a graph, as returned by Graph.edges.'''
+    def _mapping(self):
+        return self._graph._edges
+
+class NeighborView(_LiveView):
+    '''The neighbors of a node, mapped to their attributes, as returned by
+    Graph.adj[id_] (or DiGraph.pred[id_] for the predecessors).'''
+    def __init__(self, graph, id_, direction):
+        self._graph = graph
+        self._node = id_
+        self._direction = direction
+
+    def _mapping(self):
+        # neighbor ID -> edges, straight from the storage graph
+        return getattr(self._graph._g, self._direction)[self._node]
+
+    def __getitem__(self, id_):
+        id_ = self._id(id_)
+        if id_ not in self._mapping():
+            raise KeyError(id_)
+        return self._graph._g.node[id_]
+
+    def iteritems(self):
+        node = self._graph._g.node
+        return ((id_, node[id_]) for id_ in self._mapping())
+
+class AdjacencyView(Mapping):
+    '''Mapping of node ID -> NeighborView, as returned by Graph.adj and DiGraph.pred.'''
+    def __init__(self, graph, direction):
+        self._graph = graph
+        self._direction = direction
+
+    def __getitem__(self, id_):
+        id_ = self._graph._extract_id(id_)
+        if id_ not in self._graph._g.node:
+            raise KeyError(id_)
+        return NeighborView(self._graph, id_, self._direction)
+
+    def __iter__(self):
+        return iter(self._graph._g.node)
+
+    def __len__(self):
+        return len(self._graph._g.node)
@@ -0,0 +1,102 @@
+import os
+import pytest
+import semanticnet as sn
+import uuid
+
+def test_unknown_backend():
+    with pytest.raises(sn.GraphException):
+        sn.Graph(backend="nope")
+
+def test_compact_matches_networkx(populated_digraph, compact_digraph):
+    assert compact_digraph.get_nodes() == populated_digraph.get_nodes()
+    assert compact_digraph.get_edges() == populated_digraph.get_edges()
+
+    a = '3caaa8c09148493dbdf02c574b95526c'
+    b = '2cdfebf3bf9547f19f0412ccdfbe03b7'
+    c = uuid.UUID('3cd197c2cf5e42dc9ccd0c2adcaf4bc2')
+    assert compact_digraph.neighbors(uuid.UUID(a)) == populated_digraph.neighbors(uuid.UUID(a))
+    assert compact_digraph.predecessors(c) == populated_digraph.predecessors(c)
+    assert compact_digraph.get_edges_between(a, b) == populated_digraph.get_edges_between(a, b)
+    assert compact_digraph.has_edge_between(b, c)
+    assert not compact_digraph.has_edge_between(c, b)
+
+def test_compact_remove_node(compact_digraph):
+    compact_digraph.remove_node('3caaa8c09148493dbdf02c574b95526c')
+    assert not compact_digraph.has_node('3caaa8c09148493dbdf02c574b95526c')
+    assert compact_digraph.get_edge_ids() == [uuid.UUID('c172a3599b7d4ef3bbb688277276b763')]
+    assert compact_digraph.predecessors(uuid.UUID('3cd197c2cf5e42dc9ccd0c2adcaf4bc2')).keys() == [
+        uuid.UUID('2cdfebf3bf9547f19f0412ccdfbe03b7')
+    ]
+
+def test_compact_undirected_parallel_edges():
+    g = sn.Graph(backend="compact")
+    a = g.add_node({"type": "A"}, 'a')
+    b = g.add_node({"type": "B"}, 'b')
+    g.add_edge(a, b, {"n": 1}, 'ab1')
+    g.add_edge(b, a, {"n": 2}, 'ab2')
+    g.add_edge(a, a, {"n": 3}, 'aa')
+
+    assert sorted(g.get_edges_between('a', 'b')) == ['ab1', 'ab2']
+    assert sorted(g.get_edges_between('b', 'a')) == ['ab1', 'ab2']
+    assert sorted(g.neighbors('a')) == ['a', 'b']
+    assert g.neighbors('b').keys() == ['a']
+
+def test_compact_edges_between_hub():
+    # the shorter of the rows of the two ends is scanned
+    for cls in [sn.Graph, sn.DiGraph]:
+        g = cls(backend="compact", id_kind="int")
+        hub = g.add_node({}, 0)
+        leaves = [g.add_node({}, i) for i in range(1, 101)]
+        for leaf in leaves:
+            g.add_edge(hub, leaf, {}, 1000 + leaf)
+        g.add_edge(leaves[5], hub, {}, 2000)
+        expected = [1006, 2000]
+        assert sorted(g.get_edges_between(hub, leaves[5])) == expected
+        assert sorted(g.get_edges_between(leaves[5], hub)) == expected
+        assert g.get_edges_between(leaves[4], leaves[5]) == {}
+        assert sorted(g._g.edge[0][6]) == ([1006] if cls is sn.DiGraph else expected)
+        if cls is sn.DiGraph:
+            assert list(g._g.pred[0][6]) == [2000]
+
+def test_compact_survives_churn():
+    g = sn.DiGraph(backend="compact")
+    ids = [g.add_node({"n": i}, i) for i in range(50)]
+    edges = []
+    for i in range(50):
+        for j in range(1, 6):
+            edges.append(g.add_edge(ids[i], ids[(i + j) % 50], {"w": j}))
+    # removing enough edges compacts the arrays, and reads never change them
+    for eid in edges[::2]:
+        g.remove_edge(eid)
+    g.remove_node(0)
+    assert not g._g.needs_compact()
+    esrc = g._g._esrc
+    g.neighbors(1)
+    g.get_edges_between(1, 2)
+    assert g._g._esrc is esrc
+
+    for i in range(1, 50):
+        expected = set(
+            attrs["dst"] for attrs in g.get_edges().values() if attrs["src"] == i
+        )
+        assert set(g.neighbors(i)) == expected
+    assert len(g.get_edges()) == len([e for e in edges[1::2] if g.has_edge(e)])
+
+def test_compact_save_load_json(fixture_dir, compact_digraph, populated_digraph):
+    filename = os.path.join(fixture_dir, "test_output_compact.json")
+    compact_digraph.save_json(filename)
+    g = sn.DiGraph(json_file=filename)
+    os.remove(filename)
+
+    assert g.get_nodes() == populated_digraph.get_nodes()
+    assert g.get_edges() == populated_digraph.get_edges()
+
+def test_compact_networkx_roundtrip(compact_digraph):
+    nx_graph = compact_digraph.networkx_graph()
+    for id_, attrs in compact_digraph.get_edges().iteritems():
+        assert nx_graph.edge[attrs["src"]][attrs["dst"]][id_] == attrs
+
+    g = sn.DiGraph(backend="compact")
+    g.load_networkx_graph(nx_graph)
+    assert g.get_nodes() == compact_digraph.get_nodes()
+    assert g.get_edges() == compact_digraph.get_edges()
@@ -358,3 +358,120 @@ def test_remove_edge_with_cache(populated_graph):
             }
         ]
     )
+
+def test_clear_edge_cache(populated_graph):
+    populated_graph.cache_edges_by("type")
+    populated_graph.clear_edge_cache("type")
+    assert populated_graph._edge_cache == {"type": {}}
+
+    populated_graph.clear_edge_cache()
+    assert populated_graph._edge_cache == {}
+
+def test_composite_index(populated_graph):
+    g = populated_graph
+    d = g.add_node({"type": "A", "cc": "FR"})
+    e = g.add_node({"type": "A", "cc": "US"})
+    g.index_nodes_by(("type", "cc"))
+
+    # nodes lacking any of the attributes are left out
+    assert set(g.get_nodes_by_attr(("type", "cc"))) == set([("A", "FR"), ("A", "US")])
+    assert g.get_nodes_by_attr(("type", "cc"), ("A", "FR")) == [g.get_node(d)]
+
+    g.set_node_attribute(e, "cc", "FR")
+    assert g.get_nodes_by_attr(("type", "cc"), ("A", "FR")) == [g.get_node(d), g.get_node(e)]
+    assert g.get_nodes_by_attr(("type", "cc"), ("A", "US")) == []
+
+    g.remove_node(d)
+    assert g.get_nodes_by_attr(("type", "cc"), ("A", "FR"), nosingleton=True) == g.get_node(e)
+
+def test_unique_index(populated_graph):
+    import semanticnet as sn
+    g = populated_graph
+    g.index_nodes_by("type", unique=True)
+
+    with pytest.raises(sn.UniqueIndexException):
+        g.add_node({"type": "A"})
+    with pytest.raises(sn.UniqueIndexException):
+        g.set_node_attribute('2cdfebf3bf9547f19f0412ccdfbe03b7', "type", "A")
+    with pytest.raises(sn.UniqueIndexException):
+        g.bulk_load([{"type": "D"}, {"type": "D"}])
+    assert len(g.get_node_ids()) == 3
+    assert g.get_node('2cdfebf3bf9547f19f0412ccdfbe03b7')["type"] == "B"
+
+    # a node may keep, or be re-added with, its own key
+    g.set_node_attribute('3caaa8c09148493dbdf02c574b95526c', "type", "A")
+    g.add_node({"type": "A"}, '3caaa8c09148493dbdf02c574b95526c')
+    d = g.add_node({"type": "D"})
+    assert g.get_nodes_by_attr("type", "D", nosingleton=True) == g.get_node(d)
+
+    # an index can't be made unique over duplicate values
+    g.add_edge(d, '3caaa8c09148493dbdf02c574b95526c', {"type": "normal"})
+    with pytest.raises(sn.UniqueIndexException):
+        g.index_edges_by("type", unique=True)
+    assert g._edge_cache == {}
+
+def test_index_kind(populated_graph):
+    import semanticnet as sn
+    with pytest.raises(sn.GraphException):
+        populated_graph.index_nodes_by("type", kind="bogus")
+
+def test_sorted_index(populated_graph):
+    g = populated_graph
+    g.index_nodes_by("registration", kind="sorted")
+    for i, year in enumerate([2004, 1999, 2010, 1999]):
+        g.add_node({"type": "AS", "registration": year}, "as{}".format(i))
+
+    def ids(nodes):
+        return [n["id"] for n in nodes]
+
+    assert ids(g.get_nodes_by_range("registration")) == ["as1", "as3", "as0", "as2"]
+    assert ids(g.get_nodes_by_range("registration", gte=1999, lte=2004)) == ["as1", "as3", "as0"]
+    assert ids(g.get_nodes_by_range("registration", gt=1999, lt=2010)) == ["as0"]
+    assert ids(g.get_nodes_by_range("registration", reverse=True, limit=2)) == ["as2", "as0"]
+    assert g.get_nodes_by_range("registration", gt=2010) == []
+    # exact lookups work as with a hash index
+    assert ids(g.get_nodes_by_attr("registration", 1999)) == ["as1", "as3"]
+
+    g.set_node_attribute("as2", "registration", 1990)
+    g.remove_node("as1")
+    g.add_node({"registration": 2001}, "as4")
+    assert ids(g.get_nodes_by_range("registration")) == ["as2", "as3", "as4", "as0"]
+
+def test_sorted_edge_index(populated_graph):
+    import semanticnet as sn
+    g = populated_graph
+    with pytest.raises(sn.GraphException):
+        g.get_edges_by_range("weight")
+
+    g.set_edge_attribute('5f5f44ec7c0144e29c5b7d513f92d9ab', "weight", 0.5)
+    g.index_edges_by("weight", kind="sorted")
+    g.set_edge_attribute('c172a3599b7d4ef3bbb688277276b763', "weight", 2.0)
+    assert [e["weight"] for e in g.get_edges_by_range("weight", reverse=True)] == [2.0, 0.5]
+
+def test_text_index():
+    import semanticnet as sn
+    g = sn.Graph(id_kind="str")
+    g.index_nodes_by("id", kind="text")
+    for path in ["/var/log/syslog", "/var/log/nginx/access.log", "/var/lib/dpkg", "/etc/nginx/nginx.conf"]:
+        g.add_node({"type": "file"}, path)
+
+    def ids(nodes):
+        return [n["id"] for n in nodes]
+
+    assert ids(g.get_nodes_by_prefix("id", "/var/log/")) == ["/var/log/nginx/access.log", "/var/log/syslog"]
+    assert ids(g.get_nodes_by_prefix("id", "/usr")) == []
+    assert sorted(ids(g.get_nodes_by_substring("id", "nginx"))) == [
+        "/etc/nginx/nginx.conf", "/var/log/nginx/access.log"]
+    assert sorted(ids(g.get_nodes_by_substring("id", "og"))) == [
+        "/var/log/nginx/access.log", "/var/log/syslog"]
+    # the rest works as with a sorted index
+    assert ids(g.get_nodes_by_range("id", gte="/var")) == [
+        "/var/lib/dpkg", "/var/log/nginx/access.log", "/var/log/syslog"]
+
+    g.remove_node("/var/log/syslog")
+    g.add_node({"label": "/var/log/syslog.1"}, "syslog.1")
+    g.index_nodes_by("label", kind="text", build=False)
+    g.set_node_attribute("/var/lib/dpkg", "label", "/var/log/dpkg.log")
+    assert ids(g.get_nodes_by_substring("label", "log")) == ["/var/lib/dpkg"]
+    with pytest.raises(sn.GraphException):
+        g.get_nodes_by_prefix("type", "f")
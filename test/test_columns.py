@@ -0,0 +1,86 @@
+import os
+import pickle
+import pytest
+import semanticnet as sn
+import uuid
+
+def test_columnar_needs_compact_backend():
+    with pytest.raises(sn.GraphException):
+        sn.Graph(attr_store="columnar")
+    with pytest.raises(sn.GraphException):
+        sn.Graph(backend="compact", attr_store="nope")
+
+def test_columnar_matches_networkx(populated_digraph, columnar_digraph):
+    assert columnar_digraph.get_nodes() == populated_digraph.get_nodes()
+    assert columnar_digraph.get_edges() == populated_digraph.get_edges()
+
+    a = uuid.UUID('3caaa8c09148493dbdf02c574b95526c')
+    c = uuid.UUID('3cd197c2cf5e42dc9ccd0c2adcaf4bc2')
+    assert columnar_digraph.neighbors(a) == populated_digraph.neighbors(a)
+    assert columnar_digraph.predecessors(c) == populated_digraph.predecessors(c)
+    assert columnar_digraph.get_edge('7eb91be54d3746b89a61a282bcc207bb') == {
+        "type": "normal", "id": uuid.UUID('7eb91be54d3746b89a61a282bcc207bb'), "src": a, "dst": c
+    }
+
+def test_columnar_column_kinds():
+    g = sn.Graph(backend="compact", attr_store="columnar")
+    for i in range(300):
+        g.add_node({"label": "node %d" % i, "type": "AS", "asn": i, "weight": i / 2.0})
+    kinds = g._g._node_attrs.column_kinds()
+    assert kinds == {"label": "object", "type": "dict", "asn": "int", "weight": "float"}
+
+    # a value the column can't hold moves it to a more general kind, keeping the others
+    node = g.add_node({"asn": "unknown"})
+    assert g._g._node_attrs.column_kinds()["asn"] == "object"
+    assert g.get_node_attribute(node, "asn") == "unknown"
+    assert sorted(g.get_node_attribute_values("asn").values())[:3] == [0, 1, 2]
+
+def test_columnar_row_views_are_live():
+    g = sn.Graph(backend="compact", attr_store="columnar")
+    a = g.add_node({"type": "A"}, 'a')
+    b = g.add_node({"type": "B", "extra": [1, 2]}, 'b')
+    node = g.get_node(a)
+    g.set_node_attribute(a, "cc", "DE")
+    assert node == {"id": "a", "type": "A", "cc": "DE"}
+    assert "extra" not in node and g.get_node(b)["extra"] == [1, 2]
+
+    del node["cc"]
+    assert g.get_node_attributes(a) == {"id": "a", "type": "A"}
+    assert node.copy() == {"id": "a", "type": "A"}
+
+    g.remove_node(a)
+    assert node == {}
+
+def test_columnar_views_follow_compaction():
+    g = sn.DiGraph(backend="compact", attr_store="columnar")
+    ids = [g.add_node({"n": i}, i) for i in range(20)]
+    edges = [g.add_edge(ids[i], ids[(i + j) % 20], {"w": j}) for i in range(20) for j in range(1, 6)]
+    kept = dict((eid, g.get_edge(eid)) for eid in edges[1::2])
+    for eid in edges[::2]:
+        g.remove_edge(eid)
+    g.neighbors(0) # triggers a compaction
+
+    for eid, edge in kept.items():
+        assert edge["id"] == eid
+        assert g.get_edge(eid) == edge
+    assert g.get_edge_attribute_values("w") == dict((eid, edge["w"]) for eid, edge in kept.items())
+
+def test_columnar_save_load_json(fixture_dir, columnar_digraph, populated_digraph):
+    filename = os.path.join(fixture_dir, "test_output_columnar.json")
+    columnar_digraph.save_json(filename)
+    g = sn.DiGraph(json_file=filename, backend="compact", attr_store="columnar")
+    os.remove(filename)
+
+    assert g.get_nodes() == populated_digraph.get_nodes()
+    assert g.get_edges() == populated_digraph.get_edges()
+
+def test_columnar_copy_and_pickle(columnar_digraph):
+    g = columnar_digraph.copy()
+    assert g.get_nodes() == columnar_digraph.get_nodes()
+    assert g.get_edges() == columnar_digraph.get_edges()
+    g.set_node_attribute('3caaa8c09148493dbdf02c574b95526c', "type", "Z")
+    assert columnar_digraph.get_node_attribute('3caaa8c09148493dbdf02c574b95526c', "type") == "A"
+
+    backend = pickle.loads(pickle.dumps(columnar_digraph._g, 2))
+    assert dict(backend.node.iteritems()) == columnar_digraph.get_nodes()
+    assert dict(backend.edge_attrs.iteritems()) == dict(columnar_digraph.get_edges().iteritems())
@@ -1,8 +1,10 @@
+import json
 import os
 import pytest
 import semanticnet as sn
 import time
 import uuid
+from StringIO import StringIO
 
 def test_json_constructor(fixture_dir, correct_output_filename, correct_output_graph):
     g = sn.DiGraph(json_file=os.path.join(fixture_dir, correct_output_filename))
@@ -285,6 +287,52 @@ def test_add_edges(populated_digraph):
     g.add_edges(edges)
     assert g.get_edges() == populated_digraph.get_edges()
 
+def test_batch(populated_digraph):
+    for backend in ["networkx", "compact"]:
+        g = sn.DiGraph(backend=backend)
+        g.cache_nodes_by("type")
+        with g.batch() as batch:
+            a = batch.add_node({"type": "A"}, '3caaa8c09148493dbdf02c574b95526c')
+            b = batch.add_node({"type": "B"}, '2cdfebf3bf9547f19f0412ccdfbe03b7')
+            c = batch.add_node({"type": "C"}, '3cd197c2cf5e42dc9ccd0c2adcaf4bc2')
+            assert batch.has_node(a) and not g.has_node(a)
+            batch.add_edge(a, b, {"type": "normal"}, '5f5f44ec7c0144e29c5b7d513f92d9ab')
+            batch.add_edge(b, a, {"type": "normal"}, 'f3674fcc691848ebbd478b1bfb3e84c3')
+            batch.add_edge(a, c, {"type": "normal"}, '7eb91be54d3746b89a61a282bcc207bb')
+            batch.add_edge(b, c, {"type": "irregular"}, 'c172a3599b7d4ef3bbb688277276b763')
+
+        assert g.get_nodes() == populated_digraph.get_nodes()
+        assert g.get_edges() == populated_digraph.get_edges()
+        assert g.neighbors(a) == populated_digraph.neighbors(a)
+        assert g.get_nodes_by_attr("type", "B") == [g.get_node(b)]
+
+def test_batch_validates_before_writing():
+    g = sn.Graph()
+    a = g.add_node({"type": "A"})
+    with pytest.raises(sn.GraphException):
+        with g.batch() as batch:
+            b = batch.add_node({"type": "B"})
+            batch.add_edge(a, b)
+            batch.add_edge(a, "missing")
+    with pytest.raises(sn.ReservedAttributeException):
+        with g.batch() as batch:
+            batch.add_node({"type": "B", "src": a})
+    assert g.get_node_ids() == [a]
+    assert g.get_edges() == {}
+
+def test_bulk_load(populated_digraph):
+    for backend in ["networkx", "compact"]:
+        g = sn.DiGraph(backend=backend)
+        g.bulk_load(populated_digraph.get_nodes(), populated_digraph.get_edges())
+        assert g.get_nodes() == populated_digraph.get_nodes()
+        assert g.get_edges() == populated_digraph.get_edges()
+
+    g = sn.Graph()
+    ids = g.bulk_load([{"type": "A", "id": "a"}, {"type": "B", "id": "b"}, {"type": "C"}],
+        [("a", "b", {})])
+    assert ids[:2] == ["a", "b"] and g.has_node(ids[2])
+    assert g.get_edges_between("a", "b")
+
 def test_get_edge(populated_graph):
     assert ( populated_graph.get_edge('7eb91be5-4d37-46b8-9a61-a282bcc207bb') ==
         {
@@ -551,6 +599,61 @@ def test_save_json(fixture_dir, test_output, correct_output):
 
     os.remove(os.path.join(fixture_dir, "test_output.json"))
 
+@pytest.mark.parametrize("compact", [False, True])
+def test_save_json_streaming(tmpdir, populated_digraph, compact):
+    g = populated_digraph
+    g.meta = {"source": "test", "tags": ["a", "b"]}
+    n = g.add_node({"label": u"caf\xe9", "score": 0.5, "ports": [80, 443], "geo": {"cc": "FR", "asn": None}})
+    g.add_edge(n, n, {"weights": {"in": 1, "out": [1, 2]}})
+    g.add_node({"up": True, "down": False, "asn": None, "bytes": 2 ** 70, "ratio": float("inf"), 3: "x"})
+    g.add_event(12, "added", {"id": n, "why": "test"})
+    filename = str(tmpdir.join("graph.json"))
+    g.save_json(filename, compact=compact)
+
+    # the same output as dumping the whole graph as a dict, as save_json() used to, except
+    # that the stored attributes are written without being copied, so their keys come in
+    # the order of the stored dicts
+    graph = dict()
+    graph["meta"] = g.meta
+    graph["nodes"] = [attrs for id_, attrs in g.iter_nodes(data=True)]
+    graph["edges"] = [g._g.edge[i][j][key] for i, j in g._g.edges() for key in g._g.edge[i][j]]
+    graph["timeline"] = [[e.timecode, e.name, e.attributes] for e in g.timeline]
+    with open(filename) as f:
+        assert f.read() == json.dumps(graph, indent=None if compact else True, default=sn.encode_default)
+
+    # several chunks, and empty arrays
+    out = StringIO()
+    sn.JsonGraphWriter(out, compact, chunk_size=2).write({}, iter(graph["nodes"]), iter(graph["edges"]), [])
+    graph["meta"] = {}
+    graph["timeline"] = []
+    assert out.getvalue() == json.dumps(graph, indent=None if compact else True, default=sn.encode_default)
+
+@pytest.mark.parametrize("serializer", sn.available_serializers() + ["auto"])
+def test_save_load_json_serializers(tmpdir, populated_digraph, serializer):
+    g = populated_digraph
+    n = g.add_node({"label": u"caf\xe9", "score": 0.25, "ports": [80, 443], "seen": None})
+    ref = g.get_node_ids()[0]
+    e = g.add_edge(n, n, {"ref": ref})
+    filename = str(tmpdir.join("graph.json"))
+    g.save_json(filename, serializer=serializer)
+    with open(filename) as f:
+        # other serializers write compact files, which json reads too
+        assert ("\n" in f.read()) == (sn.get_serializer(serializer).name == "json")
+    with open(filename) as f:
+        assert len(json.load(f)["nodes"]) == 4
+
+    loaded = sn.DiGraph()
+    loaded.load_json(filename, serializer=serializer)
+    assert loaded.get_nodes() == g.get_nodes()
+    # UUID attributes other than IDs come back as hex
+    assert loaded.get_edge(e)["ref"] == ref.hex
+    loaded.set_edge_attribute(e, "ref", ref)
+    assert loaded.get_edges() == g.get_edges()
+
+def test_unknown_serializer(graph, tmpdir):
+    with pytest.raises(sn.GraphException):
+        graph.save_json(str(tmpdir.join("graph.json")), serializer="xml")
+
 def test_save_json_plaintext(test_output_plaintext, test_output_plaintext_correct):
     assert test_output_plaintext["timeline"] == test_output_plaintext_correct["timeline"]
     assert test_output_plaintext["meta"] == test_output_plaintext_correct["meta"]
@@ -612,6 +715,190 @@ def test_load_json_with_object(correct_output):
     g.load_json(correct_output) # load graph with json object, instead of string
     test_load_json(g)
 
+def test_load_json_stream(fixture_dir, correct_output_graph):
+    g = sn.Graph()
+    g.load_json_stream(os.path.join(fixture_dir, "test_output_correct.json"))
+    test_load_json(g)
+    assert g.meta == correct_output_graph.meta
+
+@pytest.mark.parametrize("compact", [False, True])
+def test_load_json_stream_filtered(tmpdir, compact):
+    g = sn.DiGraph(id_kind="int")
+    for i in range(50):
+        g.add_node({"type": "AS" if i % 2 else "IP", "label": u"n\xe9{}".format(i), "cc": "FR", "asn": i})
+    for i in range(49):
+        g.add_edge(i, i + 1, {"w": i * 0.5})
+        g.add_edge(i, i % 2, {"w": i})
+    g.meta = {"source": "test"}
+    g.add_event(1, "built", {"n": 50})
+    filename = str(tmpdir.join("graph.json"))
+    g.save_json(filename, compact=compact)
+
+    loaded = sn.DiGraph(id_kind="int")
+    loaded.load_json_stream(filename, batch_size=7)
+    assert loaded.get_nodes() == g.get_nodes()
+    assert loaded.get_edges() == g.get_edges()
+    assert loaded.meta == g.meta
+    assert loaded.timeline == [[1, "built", {"n": 50}]]
+
+    loaded = sn.DiGraph(id_kind="int")
+    loaded.load_json_stream(filename, node_filter={"type": "AS"}, node_attrs=["label", "cc"], edge_attrs=[])
+    assert sorted(loaded.get_node_ids()) == range(1, 50, 2)
+    assert loaded.get_node(3) == {"id": 3, "label": u"n\xe93", "cc": "FR"}
+    # only the edges between two AS nodes are left: i -> i % 2 for odd i
+    assert sorted((e["src"], e["dst"]) for e in loaded.get_edges().itervalues()) == [(i, 1) for i in range(1, 49, 2)]
+    assert all(sorted(e) == ["dst", "id", "src"] for e in loaded.get_edges().itervalues())
+
+    loaded = sn.DiGraph()
+    loaded.load_json_stream(filename, node_filter=lambda node: node["asn"] < 3, rekey=True)
+    assert sorted(loaded.get_node_attribute_values("asn").values()) == [0, 1, 2]
+    # 0 -> 1, 1 -> 2, 2 -> 0 and the loops on 0 and 1
+    assert loaded.edge_count() == 5
+
+def test_json_graph_reader():
+    # sections in any order, items split across reads, and numbers at the end of a read
+    text = '{"edges": [ {"src": 1, "dst": 2, "id": 3} ] , "meta":{"a":[1,2]},"nodes":[12345, 1.5e3,"x,]\\"y", [], {}],"timeline":[]}'
+    for chunk_size in [1, 2, 3, 7, 1000]:
+        reader = sn.JsonGraphReader(StringIO(text), chunk_size=chunk_size)
+        sections = [(name, list(value) if name in reader.ARRAYS else value) for name, value in reader.sections()]
+        assert sections == [("edges", [{"src": 1, "dst": 2, "id": 3}]), ("meta", {"a": [1, 2]}),
+            ("nodes", [12345, 1500.0, u'x,]"y', [], {}]), ("timeline", [])]
+    # sections left unread are skipped
+    assert [name for name, value in sn.JsonGraphReader(StringIO(text), chunk_size=5).sections()] == \
+        ["edges", "meta", "nodes", "timeline"]
+    with pytest.raises(ValueError):
+        list(sn.JsonGraphReader(StringIO('{"nodes": [1, 2'), chunk_size=3).sections())
+
+@pytest.mark.parametrize("backend", ["networkx", "compact"])
+def test_load_json_trusted(fixture_dir, backend):
+    filename = os.path.join(fixture_dir, "test_output_correct.json")
+    for cls in [sn.Graph, sn.DiGraph]:
+        expected = cls(backend=backend)
+        expected.load_json(filename)
+        g = cls(backend=backend)
+        g.cache_nodes_by("label")
+        g.load_json(filename, trusted=True)
+        assert g.get_nodes() == expected.get_nodes()
+        assert g.get_edges() == expected.get_edges()
+        assert g.meta == expected.meta
+        assert g.adj == expected.adj
+        if cls is sn.DiGraph:
+            assert g.pred == expected.pred
+        assert [node["id"] for node in g.get_nodes_by_attr("label", "A")] == [uuid.UUID('6cf546f71efe47578f7a1400871ef6b8')]
+        # the graph works as usual afterwards
+        a = g.add_node({"label": "D"})
+        g.add_edge(a, uuid.UUID('6cf546f71efe47578f7a1400871ef6b8'))
+        assert len(g.get_nodes_by_attr("label", "D")) == 1
+        assert g.edge_count() == 4
+
+def test_load_json_trusted_ids(tmpdir):
+    g = sn.DiGraph(id_kind="int")
+    a, b = g.add_nodes([{"type": "A"}, {"type": "B"}])
+    g.add_edge(a, b)
+    filename = str(tmpdir.join("graph.json"))
+    g.save_json(filename)
+
+    loaded = sn.DiGraph(id_kind="int")
+    loaded.load_json(filename, trusted=True)
+    # the counter moves past the IDs loaded
+    assert loaded.add_node({}) == 3
+    # the ends of edges are still checked
+    broken = {"meta": {}, "timeline": [], "nodes": [{"id": 1}], "edges": [{"id": 2, "src": 1, "dst": 5}]}
+    with pytest.raises(sn.GraphException):
+        sn.DiGraph(id_kind="int").load_json(broken, trusted=True)
+
+@pytest.mark.parametrize("backend", ["networkx", "compact"])
+def test_save_load_binary(tmpdir, populated_digraph, backend):
+    g = populated_digraph
+    ref = uuid.UUID('3caaa8c09148493dbdf02c574b95526c')
+    a = g.add_node({"label": u"caf\xe9", "score": 0.25, "count": 1 << 40, "big": 1 << 70, "ok": True,
+        "ports": [80, 443], "seen": None, "ref": ref, "mixed": 1})
+    b = g.add_node({"label": "plain", "score": float("inf"), "count": -3, "ok": False, "mixed": "1"})
+    # parallel edges, a self-loop, and targets in any order
+    for dst in (b, ref, a, b):
+        g.add_edge(a, dst, {"port": 22})
+    g.add_edge(b, a, {"weight": 0.5})
+    g.meta["source"] = "test"
+    g.add_event(1.5, "scan", {"host": "a"})
+
+    binary = str(tmpdir.join("graph.bin"))
+    g.save_binary(binary)
+    loaded = sn.DiGraph(backend=backend)
+    loaded.index_nodes_by("type")
+    loaded.load_binary(binary)
+    assert loaded.get_nodes() == g.get_nodes()
+    assert loaded.get_edges() == g.get_edges()
+    assert loaded.meta == {"source": "test"}
+    assert loaded.get_node_attribute(a, "ref") == ref
+    # columns of str stay str, the labels mix str and unicode
+    assert type(loaded.get_node_attribute(ref, "type")) is str
+    assert [node["id"] for node in loaded.get_nodes_by_attr("type", "A")] == [ref]
+    assert sorted(loaded.neighbors(a)) == sorted([a, b, ref])
+
+    # saving either graph as JSON gives the same file, up to the order of the items
+    saved = []
+    for graph in (g, loaded):
+        filename = str(tmpdir.join("graph.json"))
+        graph.save_json(filename)
+        with open(filename) as f:
+            saved.append(json.load(f))
+    for section in ("nodes", "edges"):
+        for items in saved:
+            items[section].sort(key=lambda item: item["id"])
+    assert saved[0] == saved[1]
+
+def test_save_load_binary_ids(tmpdir):
+    for id_kind in ("int", "str"):
+        g = sn.Graph(id_kind=id_kind)
+        a, b = g.add_nodes([{"type": "A"}, {"type": "B"}])
+        g.add_edge(a, b, {"type": "normal"})
+        filename = str(tmpdir.join("graph.bin"))
+        g.save_binary(filename)
+        loaded = sn.Graph(id_kind=id_kind)
+        loaded.load_binary(filename)
+        assert loaded.get_nodes() == g.get_nodes()
+        assert loaded.get_edges() == g.get_edges()
+
+    # UUIDs are loaded as save_json() would have written them
+    g = sn.Graph()
+    a = g.add_node({"type": "A"})
+    g.save_binary(filename)
+    loaded = sn.Graph(id_kind="str")
+    loaded.load_binary(filename)
+    assert loaded.get_node_ids() == [a.hex]
+
+    empty = sn.DiGraph()
+    empty.save_binary(filename)
+    loaded = sn.DiGraph(id_kind="int")
+    loaded.load_binary(filename)
+    assert loaded.node_count() == 0
+
+    with open(filename, "wb") as f:
+        f.write("{}")
+    with pytest.raises(ValueError):
+        sn.DiGraph().load_binary(filename)
+
+def test_save_load_binary_coalesced(tmpdir):
+    g = sn.DiGraph()
+    g.coalesce_edges(identity=["type"])
+    a, b = g.add_nodes([{"label": "a"}, {"label": "b"}])
+    for _ in range(3):
+        g.add_edge(a, b, {"type": "normal"})
+    binary = str(tmpdir.join("graph.bin"))
+    filename = str(tmpdir.join("graph.json"))
+    for expand in (False, True):
+        g.save_binary(binary, expand=expand)
+        g.save_json(filename, expand=expand)
+        # loaded through add_edge(), like load_json() does
+        loaded = sn.DiGraph()
+        loaded.coalesce_edges(identity=["type"])
+        loaded.load_binary(binary)
+        expected = sn.DiGraph()
+        expected.coalesce_edges(identity=["type"])
+        expected.load_json(filename)
+        assert loaded.get_edges() == expected.get_edges()
+        assert len(loaded.get_edges()) == (3 if expand else 1)
+
 def test_load_json_plaintext(correct_output_graph_plaintext_from_file):
     nodes = {
         'a': {
@@ -806,3 +1093,283 @@ def test_get_nodes_by_attr(populated_graph):
 
     ### if the attr is in the cache, but the value is not, return []
     assert populated_graph.get_nodes_by_attr("type", "D") == []
+
+def test_upsert_edge(populated_digraph):
+    g = populated_digraph
+    a = '3caaa8c09148493dbdf02c574b95526c'
+    c = '3cd197c2cf5e42dc9ccd0c2adcaf4bc2'
+
+    # an existing edge with the matching attributes is reused
+    id_ = g.upsert_edge(a, c, match={"type": "normal"}, accumulate={"activity": 1})
+    assert id_ == uuid.UUID('7eb91be54d3746b89a61a282bcc207bb')
+    assert g.get_edge(id_)["activity"] == 1
+    assert g.upsert_edge(a, c, match={"type": "normal"}, accumulate={"activity": 1}) == id_
+    assert g.get_edge(id_)["activity"] == 2
+
+    # otherwise a new one is added
+    new = g.upsert_edge(a, c, match={"type": "irregular"}, accumulate={"activity": 1}, data={"label": "x"})
+    assert new != id_
+    assert g.get_edge(new) == {"id": new, "src": uuid.UUID(a), "dst": uuid.UUID(c),
+        "type": "irregular", "activity": 1, "label": "x"}
+
+    # edges are directed
+    assert g.upsert_edge(c, a, match={"type": "normal"}) not in [id_, new]
+    assert len(g.get_edges_between(a, c)) == 3
+
+    # the index follows changes made through other methods
+    g.set_edge_attribute(new, "type", "normal")
+    g.remove_edge(id_)
+    assert g.upsert_edge(a, c, match={"type": "normal"}) == new
+
+def test_upsert_edge_undirected(populated_graph):
+    g = populated_graph
+    a = '3caaa8c09148493dbdf02c574b95526c'
+    b = '2cdfebf3bf9547f19f0412ccdfbe03b7'
+    assert g.upsert_edge(b, a) == uuid.UUID('5f5f44ec7c0144e29c5b7d513f92d9ab')
+    assert g.upsert_edge(b, a, match={"type": "normal"}) == uuid.UUID('5f5f44ec7c0144e29c5b7d513f92d9ab')
+
+def test_upsert_node(graph):
+    with pytest.raises(sn.GraphException):
+        graph.upsert_node("a")
+
+    graph.set_node_key("label")
+    a = graph.upsert_node("a", {"type": "A"})
+    assert graph.upsert_node("a", {"type": "B"}) == a
+    assert graph.get_node(a) == {"id": a, "label": "a", "type": "A"}
+    assert graph.upsert_node("a", {"type": "B"}, update=True) == a
+    assert graph.get_node(a)["type"] == "B"
+    assert graph.get_node_by_key("a") == graph.get_node(a)
+    with pytest.raises(sn.GraphException):
+        graph.get_node_by_key("b")
+
+    b = graph.upsert_node("b", id_='3caaa8c09148493dbdf02c574b95526c')
+    assert b == uuid.UUID('3caaa8c09148493dbdf02c574b95526c')
+
+    # the key stays unique, whichever way nodes are added
+    with pytest.raises(sn.UniqueIndexException):
+        graph.add_node({"label": "a"})
+
+    # and the index is rebuilt if it was cleared
+    graph.clear_node_cache()
+    assert graph.upsert_node("b") == b
+
+def test_set_node_key_duplicates(graph):
+    graph.add_node({"label": "a"})
+    graph.add_node({"label": "a"})
+    with pytest.raises(sn.UniqueIndexException):
+        graph.set_node_key("label")
+    with pytest.raises(sn.GraphException):
+        graph.upsert_node("a")
+
+def test_upsert_nodes(graph):
+    graph.set_node_key("label")
+    a = graph.upsert_node("a", {"type": "A"})
+    ids = graph.upsert_nodes([("a", {"type": "X"}), ("b", {"type": "B"}), ("b", {"type": "X"})])
+    assert ids["a"] == a
+    assert len(graph.get_nodes()) == 2
+    assert graph.get_node(ids["b"]) == {"id": ids["b"], "label": "b", "type": "B"}
+
+    ids = graph.upsert_nodes({"b": {"depth": 1}, "c": {}}, update=True)
+    assert graph.get_node(ids["b"])["depth"] == 1
+    assert graph.get_node_by_key("c")["id"] == ids["c"]
+    assert len(graph.get_nodes()) == 3
+
+@pytest.mark.parametrize("backend", ["networkx", "compact"])
+def test_coalesce_edges(backend):
+    g = sn.DiGraph(backend=backend)
+    a = g.add_node({})
+    b = g.add_node({})
+    e = g.add_edge(a, b, {"type": "http", "bytes": 10, "port": 80})
+    g.coalesce_edges(identity=["type"], aggregate=["bytes"])
+    assert g.get_edge(e)["count"] == 1
+
+    assert g.add_edge(a, b, {"type": "http", "bytes": 30, "port": 8080}) == e
+    assert g.add_edge(a, b, {"type": "http", "bytes": 5}) == e
+    assert g.get_edge(e) == {"id": e, "src": a, "dst": b, "type": "http", "port": 80,
+        "count": 3, "bytes": 45, "bytes:min": 5, "bytes:max": 30}
+
+    # other identities, directions and explicit IDs give separate edges
+    dns = g.add_edge(a, b, {"type": "dns", "bytes": 1})
+    assert dns != e and g.get_edge(dns)["count"] == 1
+    assert g.add_edge(b, a, {"type": "http"}) != e
+    assert g.add_edge(a, b, {"type": "http"}, "7eb91be54d3746b89a61a282bcc207bb") != e
+
+    with g.batch() as batch:
+        batch.add_edge(a, b, {"type": "dns", "bytes": 2})
+        batch.add_edge(a, b, {"type": "dns", "bytes": 4})
+    assert g.get_edge(dns)["count"] == 3
+    assert g.get_edge(dns)["bytes"] == 7
+    assert len(g.get_edges()) == 4
+
+    # the attributes of coalesced edges can't be given
+    for data in [{"type": "http", "count": 5}, {"type": "ssh", "count": 7}, {"type": "http", "bytes:max": 1}]:
+        with pytest.raises(sn.ReservedAttributeException):
+            g.add_edge(a, b, data)
+        with pytest.raises(sn.ReservedAttributeException):
+            with g.batch() as batch:
+                batch.add_node({})
+                batch.add_edge(a, b, data)
+    assert g.get_edge(e)["count"] == 3
+    assert len(g.get_edges()) == 4
+    assert g.node_count() == 2
+    with pytest.raises(sn.ReservedAttributeException):
+        g.coalesce_edges(identity=["count"])
+
+def test_coalesce_existing_edges(populated_graph):
+    g = populated_graph
+    a = '3caaa8c09148493dbdf02c574b95526c'
+    b = '2cdfebf3bf9547f19f0412ccdfbe03b7'
+    g.add_edge(b, a, {"type": "normal"})
+    g.add_edge(a, b, {"type": "other"})
+    g.coalesce_edges(identity=["type"])
+    assert len(g.get_edges_between(a, b)) == 2
+    assert sorted(edge["count"] for edge in g.get_edges().values()) == [1, 1, 1, 2]
+
+def test_coalesce_save_json_expand(fixture_dir):
+    g = sn.Graph()
+    a = g.add_node({})
+    b = g.add_node({})
+    g.coalesce_edges(identity=["type"], aggregate=["bytes"])
+    for size in [1, 2, 3, 4, 10]:
+        e = g.add_edge(a, b, {"type": "http", "bytes": size})
+
+    filename = os.path.join(fixture_dir, "test_output_expand.json")
+    g.save_json(filename, expand=True)
+    expanded = sn.Graph(json_file=filename)
+    g.save_json(filename)
+    stored = sn.Graph(json_file=filename)
+    os.remove(filename)
+
+    assert stored.get_edges() == g.get_edges()
+    edges = expanded.get_edges()
+    assert len(edges) == 5
+    assert e in edges
+    values = sorted(edge["bytes"] for edge in edges.values())
+    assert (sum(values), values[0], values[-1]) == (20, 1, 10)
+    assert all(set(edge) == set(["id", "src", "dst", "type", "bytes"]) for edge in edges.values())
+
+def test_intern_attributes(fixture_dir):
+    g = sn.Graph()
+    g.intern_attributes(["type"])
+    # strings built at runtime, like the ones json.load() returns, are distinct objects
+    a = g.add_node({"".join(["ty", "pe"]): u"".join([u"A", u"S"]), "label": "".join(["a", "1"])})
+    b = g.add_node({"".join(["ty", "pe"]): u"".join([u"A", u"S"]), "label": "".join(["a", "1"])})
+    key_a, = [k for k in g.get_node(a) if k == "type"]
+    key_b, = [k for k in g.get_node(b) if k == "type"]
+    assert key_a is key_b
+    assert g.get_node(a)["type"] is g.get_node(b)["type"]
+    assert type(g.get_node(a)["type"]) is unicode
+    assert g.get_node(a)["label"] is not g.get_node(b)["label"]
+
+    g.set_node_attribute(a, "type", u"".join([u"I", u"X"]))
+    g.set_node_attribute(b, "type", u"".join([u"I", u"X"]))
+    assert g.get_node(a)["type"] is g.get_node(b)["type"]
+
+    report = g.memory_report()
+    assert report["type"] > report["label"] > 0
+    assert "id" not in report
+
+    loaded = sn.Graph()
+    loaded.intern_attributes(["type"])
+    loaded.load_json(os.path.join(fixture_dir, "test_output_correct.json"))
+    assert loaded.memory_report()["type"] > sn.Graph(json_file=os.path.join(fixture_dir, "test_output_correct.json")).memory_report()["type"]
+
+@pytest.mark.parametrize("backend", ["networkx", "compact"])
+def test_copy_on_write(backend):
+    g = sn.DiGraph(backend=backend)
+    a = g.add_node({"type": "A"})
+    b = g.add_node({"type": "B"})
+    e = g.add_edge(a, b, {"type": "normal"})
+    g.index_nodes_by("type")
+
+    c = g.copy()
+    # nothing is copied until one of them changes
+    assert c._g is g._g
+    c.set_node_attribute(a, "type", "C")
+    c.set_edge_attribute(e, "weight", 2)
+    d = c.add_node({"type": "D"})
+    c.add_edge(b, d, {})
+    c.remove_edge(e)
+    assert g.get_node(a)["type"] == "A"
+    assert g.get_edge(e) == {"id": e, "src": a, "dst": b, "type": "normal"}
+    assert not g.has_node(d)
+    assert g.neighbors(b) == {}
+    assert g.get_nodes_by_attr("type", "C") == []
+    assert c.get_nodes_by_attr("type", "C") == [c.get_node(a)]
+
+    # the original can change too, without the copy seeing it
+    g.remove_node(b)
+    assert c.has_node(b)
+    assert c.neighbors(b) == {d: c.get_node(d)}
+    if backend == "networkx":
+        # the first change copies the top-level tables, then only what changes is copied
+        h = c.copy()
+        f = h.add_node({"type": "F"})
+        assert h._g.node is not c._g.node and h._edges is not c._edges
+        assert not c.has_node(f)
+        h.set_node_attribute(a, "type", "H")
+        h.add_edge(a, f, {})
+        assert h._g.node[a] is not c._g.node[a]
+        assert h._g.adj[a] is not c._g.adj[a]
+        for id_ in [b, d]:
+            assert h._g.node[id_] is c._g.node[id_]
+            assert h._g.adj[id_] is c._g.adj[id_]
+            assert h._g.pred[id_] is c._g.pred[id_]
+        e2 = c.get_edge_ids()[0]
+        assert h._edges[e2] is c._edges[e2]
+        assert h._g.adj[b][d] is c._g.adj[b][d]
+
+@pytest.mark.parametrize("backend", ["networkx", "compact"])
+def test_freeze(backend, tmpdir):
+    g = sn.DiGraph(backend=backend)
+    a = g.add_node({"type": "A"})
+    b = g.add_node({"type": "B"})
+    e = g.add_edge(a, b, {"type": "normal"})
+    g.index_nodes_by("type")
+
+    frozen = g.freeze()
+    assert isinstance(frozen, sn.FrozenGraph)
+    assert frozen.freeze() is frozen
+    assert frozen.get_nodes() == g.get_nodes()
+    assert frozen.predecessors(b) == {a: g.get_node(a)}
+    assert frozen.find_nodes(type="A").explain() == "index type = 'A'"
+    assert len({frozen: 1}) == 1
+
+    for change in [lambda: frozen.add_node({}), lambda: frozen.add_edge(a, b),
+            lambda: frozen.remove_node(a), lambda: frozen.remove_edge(e),
+            lambda: frozen.set_node_attribute(a, "type", "C"), lambda: frozen.index_edges_by("type"),
+            lambda: frozen.add_nodes([{}]), lambda: frozen.add_event(0, "x", {})]:
+        with pytest.raises(sn.FrozenGraphException):
+            change()
+    assert frozen.get_nodes() == g.get_nodes()
+
+    # failed loads leave the snapshot as it was
+    g.meta["source"] = "test"
+    g.add_event(1, "scan", {})
+    frozen = g.freeze()
+    filename = str(tmpdir.join("graph.json"))
+    g.save_json(filename)
+    for load in [lambda: frozen.load_json({"meta": {"hacked": 1}, "timeline": [[9, "x", {}]], "nodes": [], "edges": []}),
+            lambda: frozen.load_json(filename, trusted=True), lambda: frozen.load_json_stream(filename)]:
+        with pytest.raises(sn.FrozenGraphException):
+            load()
+        assert frozen.meta == {"source": "test"}
+        assert [event.name for event in frozen.timeline] == ["scan"]
+        assert frozen.get_nodes() == g.get_nodes()
+
+    # the graph goes on changing, and the snapshot does not
+    c = g.add_node({"type": "C"})
+    g.add_edge(c, a, {})
+    g.remove_edge(e)
+    assert not frozen.has_node(c)
+    assert frozen.get_edge(e)["type"] == "normal"
+    assert frozen.get_nodes_by_attr("type", "C") == []
+
+    # operators and diff take snapshots, and return mutable graphs
+    diff = sn.diff(frozen, g.freeze())
+    assert type(diff) is sn.DiGraph
+    assert diff.get_node(c)["diffstatus"] == "added"
+    thawed = frozen.copy()
+    assert type(thawed) is sn.DiGraph
+    thawed.add_node({})
+    assert len(frozen.get_nodes()) == 2
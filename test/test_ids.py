@@ -0,0 +1,201 @@
+import os
+import pytest
+import semanticnet as sn
+import uuid
+from semanticnet.ids import IdTable, pack_uuid, unpack_uuid
+
+def test_pack_uuid(uuid_obj):
+    packed = pack_uuid(uuid_obj)
+    assert len(packed) == 16
+    assert packed == uuid_obj.bytes
+    assert unpack_uuid(packed) == uuid_obj
+
+def test_id_table(uuid_obj):
+    table = IdTable()
+    a = table.intern(uuid_obj)
+    b = table.intern('some/path')
+    c = table.intern(42)
+    # a 16-character string must not collide with a packed UUID
+    d = table.intern(uuid_obj.bytes)
+
+    assert [a, b, c, d] == [0, 1, 2, 3]
+    assert table.intern(uuid.UUID(uuid_obj.hex)) == a
+    assert table.lookup('some/path') == b
+    assert table.lookup('missing') is None
+    assert table.external(a) == uuid_obj
+    assert table.external(d) == uuid_obj.bytes
+    assert len(table) == 4
+
+    assert table.discard('some/path') == b
+    assert 'some/path' not in table
+    assert len(table) == 3
+    # handles are never recycled
+    assert table.intern('some/path') == 4
+    assert list(table) == [uuid_obj, 42, uuid_obj.bytes, 'some/path']
+
+    compacted = table.select([c, a])
+    assert compacted.lookup(42) == 0
+    assert compacted.lookup(uuid_obj) == 1
+    assert len(compacted) == 2
+
+def test_node_handles(compact_digraph):
+    a = compact_digraph.get_node_handle('3caaa8c09148493dbdf02c574b95526c')
+    b = compact_digraph.get_node_handle('2cdfebf3bf9547f19f0412ccdfbe03b7')
+    c = compact_digraph.get_node_handle('3cd197c2cf5e42dc9ccd0c2adcaf4bc2')
+    assert compact_digraph.get_node_id(a) == uuid.UUID('3caaa8c09148493dbdf02c574b95526c')
+    assert sorted(compact_digraph.neighbor_handles(a)) == sorted([b, c])
+    assert sorted(compact_digraph.predecessor_handles(c)) == sorted([a, b])
+
+    with pytest.raises(sn.GraphException):
+        compact_digraph.get_node_handle('3caaa8c09148493dbdf02c57deadbeef')
+
+    compact_digraph.remove_node('2cdfebf3bf9547f19f0412ccdfbe03b7')
+    with pytest.raises(sn.GraphException):
+        compact_digraph.get_node_id(b)
+
+def test_add_edge_by_handle(compact_digraph):
+    a = compact_digraph.get_node_handle('3caaa8c09148493dbdf02c574b95526c')
+    c = compact_digraph.get_node_handle('3cd197c2cf5e42dc9ccd0c2adcaf4bc2')
+    eid = compact_digraph.add_edge_by_handle(c, a, {"type": "back"})
+
+    assert compact_digraph.get_edge(eid) == {
+        "id": eid,
+        "src": uuid.UUID('3cd197c2cf5e42dc9ccd0c2adcaf4bc2'),
+        "dst": uuid.UUID('3caaa8c09148493dbdf02c574b95526c'),
+        "type": "back"
+    }
+    assert eid in compact_digraph.get_edges_between('3caaa8c09148493dbdf02c574b95526c',
+        '3cd197c2cf5e42dc9ccd0c2adcaf4bc2')
+
+    with pytest.raises(sn.ReservedAttributeException):
+        compact_digraph.add_edge_by_handle(c, a, {"id": 0})
+    with pytest.raises(sn.GraphException):
+        compact_digraph.add_edge_by_handle(c, 1000, {})
+
+def test_handles_need_compact_backend(populated_graph):
+    with pytest.raises(sn.GraphException):
+        populated_graph.get_node_handle('3caaa8c09148493dbdf02c574b95526c')
+
+def test_unknown_id_kind():
+    with pytest.raises(sn.GraphException):
+        sn.Graph(id_kind="nope")
+
+def test_id_kind_auto(graph, uuid_str, uuid_obj):
+    assert graph._extract_id(uuid_str) == uuid_obj
+    assert graph._extract_id(uuid_obj) is uuid_obj
+    assert graph._extract_id('not-a-uuid') == 'not-a-uuid'
+    assert graph._extract_id(5) == 5
+    for text in [uuid_str.upper(), unicode(uuid_str), str(uuid_obj), "{" + uuid_str + "}"]:
+        assert graph._extract_id(text) == uuid_obj
+    assert graph._extract_id("-" + uuid_str[1:]) == "-" + uuid_str[1:]
+
+def test_id_kind_uuid(uuid_str, uuid_obj):
+    g = sn.DiGraph(id_kind="uuid")
+    assert g.add_node({"type": "A"}, uuid_str) == uuid_obj
+    b = g.add_node({"type": "B"})
+    assert type(b) is uuid.UUID
+    assert g.has_node(uuid_obj.hex)
+    eid = g.add_edge(uuid_str, b.hex, {"type": "normal"})
+    assert type(eid) is uuid.UUID
+    assert g.get_edges_between(uuid_obj, b)[eid]["src"] == uuid_obj
+
+    with pytest.raises(ValueError):
+        g.has_node('not-a-uuid')
+
+def test_id_kind_str(fixture_dir):
+    g = sn.DiGraph(id_kind="str")
+    # a string which happens to look like a UUID stays a string
+    a = g.add_node({"type": "A"}, '3caaa8c09148493dbdf02c574b95526c')
+    b = g.add_node({"type": "B"}, '/var/log')
+    c = g.add_node({"type": "C"})
+    assert a == '3caaa8c09148493dbdf02c574b95526c'
+    assert type(c) is str
+    eid = g.add_edge(a, b)
+    assert type(eid) is str
+
+    filename = os.path.join(fixture_dir, "test_output_str.json")
+    g.save_json(filename)
+    loaded = sn.DiGraph(json_file=filename, id_kind="str")
+    os.remove(filename)
+    assert loaded.get_nodes() == g.get_nodes()
+    assert loaded.get_edges() == g.get_edges()
+
+def test_id_kind_int():
+    g = sn.Graph(id_kind="int")
+    assert g.add_node({"type": "A"}) == 0
+    assert g.add_node({"type": "B"}) == 1
+    a = g.add_node({"type": "C"}, "7")
+    assert a == 7
+    assert g.has_node("7")
+    # generated IDs continue past the ones given explicitly
+    assert g.add_node({"type": "D"}) == 8
+    assert g.add_edge(7, 0) == 9
+
+def test_unknown_id_generator():
+    with pytest.raises(sn.GraphException):
+        sn.Graph(id_generator="nope")
+
+def test_counter_generator():
+    g = sn.Graph(id_generator="counter")
+    assert g.add_node({"type": "A"}) == 0
+    assert g.add_node({"type": "B"}) == 1
+    assert g.add_edge(0, 1) == 2
+
+    g = sn.Graph(id_kind="uuid", id_generator="counter")
+    assert g.add_node({"type": "A"}) == uuid.UUID(int=0)
+
+    g = sn.Graph(id_kind="str", id_generator=sn.CounterIdGenerator(start=10))
+    assert g.add_node({"type": "A"}) == "10"
+
+    # strings of digits given explicitly move the counter past them too
+    g = sn.Graph(id_kind="str", id_generator="counter")
+    assert g.add_node({"x": 1}, "0") == "0"
+    assert g.add_node({"x": 2}, u"5") == "5"
+    assert g.add_node({"x": 3}, "a7") == "a7"
+    assert g.add_node({"x": 4}) == "6"
+    assert g.node_count() == 4
+    assert g.get_node("0")["x"] == 1
+
+def test_ulid_generator():
+    now = [1400000000.0]
+    g = sn.Graph(id_generator=sn.UlidGenerator(clock=lambda: now[0]))
+    ids = [g.add_node({"n": i}) for i in range(5)]
+    now[0] += 1
+    ids.append(g.add_node({"n": 5}))
+
+    assert all(type(id_) is uuid.UUID for id_ in ids)
+    assert ids == sorted(ids)
+    assert [id_.hex for id_ in ids] == sorted(id_.hex for id_ in ids)
+    assert len(set(ids)) == len(ids)
+    assert ids[0].int >> 80 == 1400000000000
+
+def test_content_generator():
+    def build(labels):
+        g = sn.DiGraph(id_generator="content")
+        ids = dict((label, g.add_node({"label": label, "type": "AS"})) for label in labels)
+        g.add_edge(ids["A"], ids["B"], {"type": "peer"})
+        return g
+
+    a = build(["A", "B"])
+    b = build(["B", "A", "C"])
+    assert set(a.get_node_ids()) < set(b.get_node_ids())
+    assert a.get_edge_ids() == b.get_edge_ids()
+
+    # adding the same content again updates the existing node
+    n = a.add_node({"label": "A", "type": "AS"})
+    assert len(a.get_nodes()) == 2
+    assert n in a.get_nodes()
+
+    # other attributes do not take part in the ID
+    g = sn.Graph(id_generator=sn.ContentIdGenerator(node_attrs=["label"], edge_attrs=[]))
+    assert g.add_node({"label": u"A", "cc": "DE"}) == g.add_node({"label": "A", "cc": "FR"})
+
+def test_load_json_rekey(correct_output):
+    g = sn.DiGraph(id_generator=sn.ContentIdGenerator(node_attrs=["label"]))
+    g.load_json(correct_output, rekey=True)
+    generator = sn.ContentIdGenerator(node_attrs=["label"])
+
+    a = generator.node_id(g, {"label": "A"})
+    b = generator.node_id(g, {"label": "B"})
+    assert g.get_node(a)["label"] == "A"
+    assert generator.edge_id(g, a, b, {"type": "belongs"}) in g.get_edges_between(a, b)
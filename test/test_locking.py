@@ -0,0 +1,101 @@
+import pytest
+import threading
+import semanticnet as sn
+
+@pytest.fixture(params=["networkx", "compact"])
+def backend(request):
+    return request.param
+
+def test_read_write_lock():
+    lock = sn.ReadWriteLock()
+    with lock.reading():
+        with lock.reading():
+            pass
+        with pytest.raises(RuntimeError):
+            lock.acquire_write()
+    with lock.writing():
+        with lock.writing():
+            with lock.reading():
+                pass
+
+    # a writer waits for the readers to leave
+    events = []
+    lock.acquire_read()
+    writer = threading.Thread(target=lambda: (lock.acquire_write(), events.append("write"), lock.release_write()))
+    writer.start()
+    writer.join(0.05)
+    events.append("read")
+    lock.release_read()
+    writer.join()
+    assert events == ["read", "write"]
+
+def test_concurrent_graph(backend):
+    g = sn.ConcurrentDiGraph(backend=backend, id_kind="int")
+    root = g.add_node({"type": "root"})
+    errors = []
+
+    def produce(n):
+        for i in range(20):
+            with g.batch() as batch:
+                for j in range(10):
+                    node = batch.add_node({"type": "leaf", "producer": n})
+                    batch.add_edge(root, node, {})
+
+    def read():
+        try:
+            for i in range(50):
+                # every batch adds as many nodes as edges, all at once
+                with g.reading():
+                    assert g.node_count() == g.edge_count() + 1
+                    assert len(g.neighbors(root)) == g.edge_count()
+                assert len(g.get_nodes()) % 10 == 1
+        except AssertionError as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=produce, args=(n,)) for n in range(4)]
+    threads += [threading.Thread(target=read) for n in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert not errors
+    assert g.node_count() == 801
+    assert len(set(g.get_node_ids())) == 801
+    assert len(g.predecessors(max(g.get_node_ids()))) == 1
+    assert type(g.copy()) is sn.ConcurrentDiGraph
+    assert g.freeze().edge_count() == 800
+
+def test_concurrent_graph_compact_reads():
+    g = sn.ConcurrentGraph(backend="compact", id_kind="int")
+    hubs = g.add_nodes([{"type": "hub"} for i in range(10)])
+    edges = []
+    with g.batch() as batch:
+        for i in range(3000):
+            edges.append(batch.add_edge(hubs[i % 10], hubs[(i * 7) % 10], {"n": i}))
+    for id_ in edges[::2]:
+        g.remove_edge(id_)
+    # the tombstones were squeezed out by the removals, so reads change nothing
+    store = g._g
+    esrc = store._esrc
+    assert not store.needs_compact()
+    expected = dict((hub, sorted(g.neighbors(hub))) for hub in hubs)
+    errors = []
+
+    def read():
+        try:
+            for i in range(20):
+                for hub in hubs:
+                    assert sorted(g.neighbors(hub)) == expected[hub]
+                    g.get_edges_between(hub, hubs[0])
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=read) for n in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert not errors
+    assert g._g is store and store._esrc is esrc
+    assert g.edge_count() == 1500
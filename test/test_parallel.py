@@ -0,0 +1,87 @@
+import pytest
+import semanticnet as sn
+
+@pytest.fixture(params=["networkx", "compact"])
+def backend(request):
+    return request.param
+
+def build_log(g, source):
+    '''Adds a host node per host in source, a list of (client, server, port) records,
+    and an edge per record.'''
+    with g.batch() as batch:
+        hosts = {}
+        for client, server, port in source:
+            for host in (client, server):
+                if host not in hosts:
+                    hosts[host] = batch.add_node({"label": host, "seen_in": len(source)})
+            batch.add_edge(hosts[client], hosts[server], {"port": port})
+
+def build_by_label(g, source):
+    for client, server, port in source:
+        for host in (client, server):
+            g.get_or_add_node(host, {"label": host})
+        g.add_edge(client, server, {"port": port})
+
+def logs():
+    return [
+        [("a", "b", 80), ("a", "c", 443)],
+        [("a", "b", 80), ("b", "c", 22)],
+        [("c", "a", 80), ("a", "b", 80), ("d", "d", 53)],
+    ]
+
+def edge_set(g):
+    return sorted((g.get_node_attribute(e["src"], "label"), g.get_node_attribute(e["dst"], "label"), e["port"])
+        for e in g.get_edges().itervalues())
+
+def test_parallel_build(backend):
+    serial = sn.parallel_build(logs(), build_log, workers=1, graph=sn.DiGraph(backend=backend),
+        dedupe_edges=True)
+    parallel = sn.parallel_build(logs(), build_log, workers=2, chunksize=1,
+        graph=sn.DiGraph(backend=backend), dedupe_edges=True)
+    for g in (serial, parallel):
+        assert sorted(g.get_node_attribute_values("label").values()) == ["a", "b", "c", "d"]
+        # the duplicate a -> b edges are merged, c -> a differs from a -> c
+        assert edge_set(g) == [
+            ("a", "b", 80), ("a", "c", 443), ("b", "c", 22), ("c", "a", 80), ("d", "d", 53)]
+        # later sources take precedence
+        assert g.get_node_by_key("a")["seen_in"] == 3
+        assert g.get_node_by_key("b")["seen_in"] == 3
+        assert g.get_node_by_key("c")["seen_in"] == 3
+        assert g.get_node_by_key("d")["seen_in"] == 3
+
+    # merges into what the graph already holds
+    g = sn.Graph(backend=backend)
+    a = g.add_node({"label": "a", "role": "gateway"})
+    c = g.add_node({"label": "c"})
+    g.add_edge(c, a, {"port": 80})
+    sn.parallel_build(logs()[:1], build_log, workers=1, graph=g, dedupe_edges=True)
+    assert g.node_count() == 3
+    assert g.get_node_by_key("a") == {"id": a, "label": "a", "role": "gateway", "seen_in": 2}
+    sn.parallel_build(logs()[2:], build_log, workers=1, graph=g, dedupe_edges=True)
+    # c -> a is the same edge as a -> c in an undirected graph, only if the ports match
+    assert edge_set(g) == [("a", "b", 80), ("a", "c", 443), ("c", "a", 80), ("d", "d", 53)]
+
+def test_parallel_build_by_id():
+    g = sn.parallel_build(logs(), build_by_label, workers=2, chunksize=2,
+        graph=sn.Graph(id_kind="str"), key=None, dedupe_edges=True)
+    assert sorted(g.get_node_ids()) == ["a", "b", "c", "d"]
+    assert g.get_node_attribute("a", "label") == "a"
+    assert edge_set(g) == [("a", "b", 80), ("a", "c", 443), ("b", "c", 22), ("c", "a", 80), ("d", "d", 53)]
+
+    # by default, every edge is kept, as in a serial build
+    serial = sn.Graph(id_kind="str")
+    for source in logs():
+        build_by_label(serial, source)
+    g = sn.parallel_build(logs(), build_by_label, workers=2, chunksize=1, graph=sn.Graph(id_kind="str"),
+        key=None)
+    assert g.edge_count() == serial.edge_count() == 7
+    assert edge_set(g) == edge_set(serial)
+
+def test_parallel_build_coalesced():
+    g = sn.DiGraph()
+    g.coalesce_edges(identity=["port"])
+    sn.parallel_build(logs(), build_log, workers=2, chunksize=1, graph=g)
+    counts = dict(((g.get_node_attribute(e["src"], "label"), g.get_node_attribute(e["dst"], "label")), e["count"])
+        for e in g.get_edges().itervalues())
+    assert counts[("a", "b")] == 3
+    assert counts[("b", "c")] == 1
@@ -0,0 +1,82 @@
+import pytest
+import semanticnet as sn
+
+@pytest.fixture
+def as_graph():
+    g = sn.DiGraph()
+    for i, (cc, year) in enumerate([("DE", 2004), ("DE", 2011), ("FR", 2012), ("DE", 2013), ("US", 1999)]):
+        g.add_node({"type": "AS", "cc": cc, "registration": year}, "as{}".format(i))
+    g.add_node({"type": "IX", "cc": "DE"}, "ix")
+    g.add_edge("as0", "as1", {"type": "peer", "weight": 0.5}, "e0")
+    g.add_edge("as1", "as2", {"type": "peer", "weight": 2.0}, "e1")
+    g.add_edge("as2", "ix", {"type": "member"}, "e2")
+    return g
+
+def ids(query):
+    return sorted(query.ids())
+
+def test_find_nodes_scan(as_graph):
+    query = as_graph.find_nodes(type="AS", cc="DE", registration__gte=2010)
+    assert query.explain() == "scan"
+    assert ids(query) == ["as1", "as3"]
+    assert query.count() == 2
+    assert sorted(attrs["id"] for attrs in query) == ["as1", "as3"]
+
+    assert ids(as_graph.find_nodes(cc__in=["FR", "US"])) == ["as2", "as4"]
+    assert ids(as_graph.find_nodes(cc__ne="DE")) == ["as2", "as4"]
+    assert ids(as_graph.find_nodes(registration__lt=2004)) == ["as4"]
+    # items lacking an attribute never match a condition on it
+    assert ids(as_graph.find_nodes(registration__ne=2004)) == ["as1", "as2", "as3", "as4"]
+    assert as_graph.find_nodes().count() == 6
+
+def test_find_nodes_index(as_graph):
+    g = as_graph
+    g.index_nodes_by("type")
+    g.index_nodes_by("cc")
+    g.index_nodes_by("registration", kind="sorted")
+
+    # the most selective index wins
+    assert g.find_nodes(type="AS", cc="FR").explain() == "index cc = 'FR'"
+    assert g.find_nodes(type="IX", cc="DE").explain() == "index type = 'IX'"
+    assert g.find_nodes(type="AS", registration__gt=2011).explain() == "index registration range"
+
+    query = g.find_nodes(type="AS", cc="DE", registration__gte=2010)
+    assert ids(query) == ["as1", "as3"]
+    assert query.count() == 2
+    assert ids(g.find_nodes(registration__gte=2004, registration__lt=2012)) == ["as0", "as1"]
+    assert g.find_nodes(cc__in=["FR", "US"]).count() == 2
+
+    # the query follows changes to the graph
+    g.set_node_attribute("as2", "cc", "DE")
+    assert query.count() == 3
+
+def test_find_nodes_composite_index(as_graph):
+    as_graph.index_nodes_by(("type", "cc"))
+    query = as_graph.find_nodes(type="AS", cc="DE")
+    assert query.explain() == "index ('type', 'cc') = ('AS', 'DE')"
+    assert ids(query) == ["as0", "as1", "as3"]
+
+def test_find_nodes_incomplete_index(as_graph):
+    as_graph.index_nodes_by("cc", build=False)
+    assert as_graph.find_nodes(cc="DE").explain() == "scan"
+    assert as_graph.find_nodes(cc="DE").count() == 4
+
+def test_find_edges(as_graph):
+    assert ids(as_graph.find_edges(type="peer", weight__gt=1)) == ["e1"]
+    as_graph.index_edges_by("type")
+    assert as_graph.find_edges({"type": "member"}).count() == 1
+    assert ids(as_graph.find_edges(type="peer")) == ["e0", "e1"]
+
+def test_find_nodes_text(as_graph):
+    g = as_graph
+    g.set_node_attribute("as0", "url", "http://example.com/a")
+    g.set_node_attribute("as1", "url", "http://example.org/example")
+    g.set_node_attribute("as2", "url", 42)
+    assert ids(g.find_nodes(url__startswith="http://example.com")) == ["as0"]
+    assert ids(g.find_nodes(url__contains="example")) == ["as0", "as1"]
+
+    g.index_nodes_by("url", kind="text")
+    query = g.find_nodes(url__contains="exam", cc="DE")
+    assert query.explain() == "index url substring 'exam'"
+    assert ids(query) == ["as0", "as1"]
+    assert g.find_nodes(url__startswith="http://example.o").count() == 1
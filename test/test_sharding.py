@@ -0,0 +1,112 @@
+import uuid
+import pytest
+import semanticnet as sn
+
+@pytest.fixture
+def sharded_digraph(request):
+    g = sn.ShardedDiGraph(shards=3, id_kind="int")
+    request.addfinalizer(g.close)
+    return g
+
+def test_sharded_graph(sharded_digraph):
+    g = sharded_digraph
+    with g.batch() as batch:
+        hosts = [batch.add_node({"type": "host", "label": "h{}".format(i)}) for i in range(10)]
+        for i in range(9):
+            batch.add_edge(hosts[i], hosts[i + 1], {"port": i})
+    # the nodes are spread over the shards
+    assert len(set(g._shard_of(id_) for id_ in hosts)) == 3
+    assert g.node_count() == 10
+    assert g.edge_count() == 9
+
+    proxy = g.add_node({"type": "proxy", "label": "p"})
+    e = g.add_edge(proxy, hosts[0], {"port": 8080})
+    assert g.get_edge(e) == {"id": e, "src": proxy, "dst": hosts[0], "port": 8080}
+    assert g.get_node(hosts[3]) == {"id": hosts[3], "type": "host", "label": "h3"}
+    assert g.has_node(proxy)
+    assert not g.has_node(12345)
+    assert g.neighbors(hosts[0]).keys() == [hosts[1]]
+    assert sorted(g.predecessors(hosts[0])) == [proxy]
+    assert g.predecessors(proxy) == {}
+
+    g.index_nodes_by("type")
+    assert sorted(node["label"] for node in g.get_nodes_by_attr("type", "host")) == ["h{}".format(i) for i in range(10)]
+    assert g.get_nodes_by_attr("type", "proxy", nosingleton=True)["id"] == proxy
+    assert sorted(g.get_nodes_by_attr("type")) == ["host", "proxy"]
+
+    # a failed batch writes nothing
+    with pytest.raises(sn.GraphException):
+        with g.batch() as batch:
+            batch.add_node({"label": "x"})
+            batch.add_edge(hosts[0], 12345)
+    with pytest.raises(sn.ReservedAttributeException):
+        g.add_node({"id": 1})
+    assert g.node_count() == 11
+    assert g.edge_count() == 10
+    with pytest.raises(sn.GraphException):
+        g.neighbors(12345)
+
+    assert g.get_nodes_by_id([proxy, hosts[3], 12345]) == {
+        proxy: {"id": proxy, "type": "proxy", "label": "p"}, hosts[3]: g.get_node(hosts[3])}
+    assert sorted(g.get_nodes()) == sorted(hosts + [proxy])
+    assert g.get_edges()[e] == g.get_edge(e)
+
+def test_sharded_graph_changes(sharded_digraph):
+    g = sharded_digraph
+    ids = g.add_nodes([{"label": str(i)} for i in range(6)])
+    edges = dict(((i, j), g.add_edge(ids[i], ids[j], {"type": "t"}))
+        for i, j in [(0, 1), (1, 2), (2, 0), (3, 1), (1, 1), (4, 5)])
+
+    g.set_node_attribute(ids[2], "label", "two")
+    assert g.get_node(ids[2])["label"] == "two"
+    g.set_edge_attribute(edges[0, 1], "weight", 3)
+    assert g.get_edge(edges[0, 1])["weight"] == 3
+    with pytest.raises(sn.ReservedAttributeException):
+        g.set_edge_attribute(edges[0, 1], "src", ids[3])
+    with pytest.raises(sn.GraphException):
+        g.set_edge_attribute(12345, "weight", 1)
+    with pytest.raises(sn.GraphException):
+        g.set_node_attribute(12345, "label", "x")
+
+    g.remove_edge(edges[4, 5])
+    assert g.edge_count() == 5
+    assert g.neighbors(ids[4]) == {}
+    assert g.predecessors(ids[5]) == {}
+    with pytest.raises(sn.GraphException):
+        g.remove_edge(edges[4, 5])
+
+    # removing a node removes the edges leaving and reaching it, in every shard
+    g.remove_node(ids[1])
+    assert not g.has_node(ids[1])
+    assert g.node_count() == 5
+    assert sorted(g.get_edges()) == [edges[2, 0]]
+    assert g.neighbors(ids[0]) == {}
+    assert g.neighbors(ids[3]) == {}
+    assert g.predecessors(ids[2]) == {}
+    with pytest.raises(sn.GraphException):
+        g.remove_node(ids[1])
+
+def test_sharded_graph_undirected():
+    with sn.ShardedGraph(shards=2) as g:
+        a, b, c = g.add_nodes([{"label": "a"}, {"label": "b"}, {"label": "c"}])
+        g.add_edges([(a, b, {}), (c, a, {})])
+        assert sorted(node["label"] for node in g.neighbors(a).itervalues()) == ["b", "c"]
+        assert g.neighbors(b).keys() == [a]
+
+def test_sharded_save_json(sharded_digraph, tmpdir):
+    g = sharded_digraph
+    a = g.add_node({"label": "a"})
+    b = g.add_node({"label": "b"}, id_=100)
+    e = g.add_edge(a, b, {"type": "normal"})
+    g.meta["source"] = "test"
+    ref = uuid.UUID(int=7)
+    g.set_node_attribute(a, "ref", ref)
+    g.add_event(1, "scan", {"id": e, "ref": ref})
+    path = str(tmpdir.join("sharded.json"))
+    g.save_json(path)
+
+    loaded = sn.DiGraph(json_file=path, id_kind="int")
+    assert loaded.meta == {"source": "test"}
+    assert loaded.get_nodes() == {a: {"id": a, "label": "a", "ref": ref.hex}, 100: {"id": 100, "label": "b"}}
+    assert loaded.get_edges() == {e: {"id": e, "src": a, "dst": 100, "type": "normal"}}
+    assert loaded.timeline == [[1, "scan", {"id": e, "ref": ref.hex}]]
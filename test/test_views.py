@@ -0,0 +1,80 @@
+import pytest
+import uuid
+import semanticnet as sn
+
+@pytest.fixture(params=["networkx", "compact"])
+def backend(request):
+    return request.param
+
+def test_node_and_edge_views(backend):
+    g = sn.DiGraph(backend=backend)
+    a = g.add_node({"type": "A"}, '3caaa8c09148493dbdf02c574b95526c')
+    b = g.add_node({"type": "B"})
+    e = g.add_edge(a, b, {"type": "normal"})
+
+    nodes = g.nodes
+    assert len(nodes) == 2
+    assert set(nodes) == set([a, b])
+    assert '3caaa8c09148493dbdf02c574b95526c' in nodes
+    assert nodes['3caaa8c09148493dbdf02c574b95526c'] == {"id": a, "type": "A"}
+    assert uuid.uuid4() not in nodes
+    assert "not an ID" not in nodes
+    assert g.edges[e]["type"] == "normal"
+    assert list(g.edges) == [e]
+
+    # views are live
+    c = g.add_node({"type": "C"})
+    assert c in nodes
+    g.remove_edge(e)
+    assert len(g.edges) == 0
+
+    # and set-like
+    assert nodes & set([a, uuid.uuid4()]) == set([a])
+    assert nodes - set([a]) == set([b, c])
+
+def test_neighbor_views(backend):
+    g = sn.DiGraph(backend=backend)
+    a = g.add_node({"type": "A"})
+    b = g.add_node({"type": "B"})
+    c = g.add_node({"type": "C"})
+    g.add_edge(a, b, {})
+    g.add_edge(a, b, {})
+    g.add_edge(c, a, {})
+
+    successors = g.adj[a]
+    assert set(successors) == set([b])
+    assert len(successors) == 1
+    assert successors[b] == g.get_node(b)
+    assert c not in successors
+    with pytest.raises(KeyError):
+        successors[c]
+    assert dict(g.pred[a].iteritems()) == {c: g.get_node(c)}
+
+    g.add_edge(a, c, {})
+    assert set(successors) == set([b, c])
+    assert dict(g.neighbors(a)) == dict(successors.iteritems())
+    assert g.predecessors(b) == {a: g.get_node(a)}
+
+    with pytest.raises(KeyError):
+        g.adj[uuid.uuid4()]
+
+def test_undirected_neighbor_views(backend):
+    g = sn.Graph(backend=backend)
+    a = g.add_node({})
+    b = g.add_node({})
+    g.add_edge(b, a, {})
+    assert set(g.adj[a]) == set([b])
+    assert set(g.adj[b]) == set([a])
+
+def test_iterators(backend):
+    g = sn.Graph(backend=backend)
+    a = g.add_node({"type": "A"})
+    b = g.add_node({"type": "B"})
+    e = g.add_edge(a, b, {"type": "normal"})
+
+    assert sorted(g.iter_nodes()) == sorted([a, b])
+    assert dict(g.iter_nodes(data=True)) == g.get_nodes()
+    assert list(g.iter_edges()) == [e]
+    assert [(id_, attrs["type"]) for id_, attrs in g.iter_edges(data=True)] == [(e, "normal")]
+    assert g.node_count() == 2
+    assert g.edge_count() == 1